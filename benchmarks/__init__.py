@@ -0,0 +1,21 @@
+"""
+Benchmarks of the pipeline stages on synthetic data (see run.py).
+Benchmarki etapów potoku na danych syntetycznych (patrz run.py).
+
+Usage / Użycie (from the project directory / z katalogu projektu):
+    python -m benchmarks.run --size week
+"""
+
+import os
+import sys
+
+# Pipeline modules live in src/ and import each other by name
+# Moduły potoku są w src/ i importują się nawzajem po nazwie
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SRC_DIR = os.path.join(BASE_DIR, "src")
+if SRC_DIR not in sys.path:
+    sys.path.insert(0, SRC_DIR)
+
+# Benchmark runs are not written to the pipeline metrics log (see instrumentation.py)
+# Przebiegi benchmarku nie są zapisywane w logu metryk potoku (patrz instrumentation.py)
+os.environ.setdefault("METRICS_LOG", "")
@@ -0,0 +1,233 @@
+"""
+Benchmark of the pipeline stages on synthetic data: time and peak RSS of
+  clean   - MQTTDataCleaner.run (filter -> pivot -> 5-min resample -> SF scaling)
+  merge   - DataMerger.match_and_prepare_data
+  predict - Predictor.predict on the whole Solcast series
+  plot    - Visualizer.save_best_day
+Results are saved as JSON; with --baseline the run fails (exit code 1) when a stage is slower than
+the baseline by more than --threshold percent.
+
+Benchmark etapów potoku na danych syntetycznych: czas i szczytowe RSS każdego etapu.
+Wyniki są zapisywane jako JSON; z --baseline uruchomienie kończy się błędem (kod 1), gdy etap jest
+wolniejszy od wyniku bazowego o więcej niż --threshold procent.
+
+Usage / Użycie (from the project directory / z katalogu projektu):
+    python -m benchmarks.run --size week year --output outputs/benchmark.json
+    python -m benchmarks.run --size year --baseline outputs/benchmark.json --threshold 20
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import shutil
+import argparse
+import platform
+import tempfile
+import subprocess
+import contextlib
+import pandas as pd
+
+from benchmarks import BASE_DIR
+from benchmarks.synthetic import generate_solcast, generate_mqtt, write_mqtt
+from instrumentation import PeakRSS
+
+SIZES = {"week": 7, "year": 365, "decade": 3650}
+START = "2025-01-01"
+
+# Differences below this are timer noise and never count as a regression
+# Różnice poniżej tej wartości to szum pomiaru i nigdy nie są liczone jako regresja
+MIN_DELTA_S = 0.05
+
+
+def measure(func, repeat, verbose):
+    # Best time of `repeat` runs and the highest peak RSS; returns the result of the last run
+    # Najlepszy czas z `repeat` uruchomień i najwyższe szczytowe RSS; zwraca wynik ostatniego uruchomienia
+    seconds, peak_mb, result = [], 0.0, None
+    for _ in range(repeat):
+        output = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+        with output, PeakRSS() as rss:
+            start = time.perf_counter()
+            result = func()
+            seconds.append(time.perf_counter() - start)
+        # None where peak memory cannot be measured (Windows) / None, gdy pamięci nie da się zmierzyć (Windows)
+        peak_mb = None if rss.peak_mb is None else max(peak_mb or 0.0, rss.peak_mb)
+    return {"seconds": round(min(seconds), 4), "peak_rss_mb": None if peak_mb is None else round(peak_mb, 1)}, result
+
+
+def benchmark_size(days, workdir, model_path=None, repeat=1, verbose=False, devices=1):
+    from data_cleaner import MQTTDataCleaner
+    from data_merger import DataMerger
+    from predictor import Predictor
+    from visualizer import Visualizer
+    from storage import get_storage, dataset_name
+
+    # Library imports are not part of the stages / Importy bibliotek nie są częścią etapów
+    import matplotlib.figure  # noqa: F401
+    import matplotlib.backends.backend_agg  # noqa: F401
+    import matplotlib.backends.backend_pdf  # noqa: F401
+
+    # Input data (not timed) / Dane wejściowe (bez pomiaru czasu)
+    solcast = generate_solcast(START, days)
+    # Extra inverters get their own seed and topic prefix; the clean stage then runs per device in parallel
+    # Dodatkowe falowniki mają własne ziarno i prefiks tematów; etap clean działa wtedy równolegle per urządzenie
+    mqtt = pd.concat([generate_mqtt(START, days, solcast, seed=i, device=f"if{754 + i:04d}") for i in range(devices)])
+    mqtt = mqtt.sort_values("timestamp", kind="stable")
+    mqtt_file = os.path.join(workdir, "mqtt_data.csv")
+    solcast_file = os.path.join(workdir, "solcast_history.csv")
+    write_mqtt(mqtt, mqtt_file)
+    get_storage().write(solcast, dataset_name(solcast_file), time_column="period_end")
+    inputs = {"days": days, "devices": devices, "mqtt_rows": len(mqtt), "solcast_rows": len(solcast),
+              "mqtt_file_mb": round(os.path.getsize(mqtt_file) / 2 ** 20, 1)}
+    del mqtt
+
+    # All outputs go to the working directory, not to outputs/
+    # Wszystkie wyniki trafiają do katalogu roboczego, a nie do outputs/
+    cleaner = MQTTDataCleaner(mqtt_file)
+    cleaner.final_file = os.path.join(workdir, "inverter_data_plus_power.csv")
+    cleaner.final_dataset = dataset_name(cleaner.final_file)
+    cleaner.devices_dir = os.path.join(workdir, "devices")
+    merger = DataMerger(cleaner.final_file, solcast_file)
+    merger.final_matched_file = os.path.join(workdir, "final_matched.csv")
+    merger.training_data_file = os.path.join(workdir, "training_data.csv")
+
+    stages = {}
+    stages["clean"], _ = measure(cleaner.run, repeat, verbose)
+    stages["merge"], training_data = measure(merger.match_and_prepare_data, repeat, verbose)
+
+    if model_path is None:
+        model_path = fit_linear_model(training_data, workdir)
+    with contextlib.redirect_stdout(io.StringIO()):
+        predictor = Predictor(model_path, None, verbose=False)
+    stages["predict"], forecast = measure(lambda: predictor.predict(solcast.copy()), repeat, verbose)
+
+    pdf_file = os.path.join(workdir, "best_day.pdf")
+    stages["plot"], _ = measure(lambda: Visualizer().save_best_day(forecast.copy(), pdf_file), repeat, verbose)
+
+    inputs["training_rows"] = len(training_data)
+    return {"inputs": inputs, "model": os.path.basename(model_path), "stages": stages}
+
+
+def fit_linear_model(training_data, workdir):
+    # Without a trained model the predict stage uses a linear engine fitted on the synthetic data
+    # Bez wytrenowanego modelu etap predykcji używa silnika liniowego dopasowanego do danych syntetycznych
+    from model_engines import get_engine, FEATURES
+
+    path = os.path.join(workdir, "model_linear.joblib")
+    get_engine("linear").fit(training_data[FEATURES], training_data["energy_15min_kWh"]).save(path)
+    return path
+
+
+def input_mismatch(results, baseline, size):
+    # Reason why a size cannot be compared with the baseline (other storage, days or devices), or None
+    # Powód, dla którego rozmiaru nie można porównać z wynikiem bazowym (inny zapis, dni lub urządzenia), albo None
+    if baseline.get("storage", "csv") != results["storage"]:
+        return f"storage {baseline.get('storage', 'csv')} in the baseline, {results['storage']} now"
+    old = baseline.get("sizes", {}).get(size, {}).get("inputs", {})
+    new = results["sizes"][size]["inputs"]
+    for key, default in (("days", None), ("devices", 1)):
+        if old.get(key, default) != new[key]:
+            return f"{key} {old.get(key, default)} in the baseline, {new[key]} now"
+    return None
+
+
+def compare(results, baseline, threshold):
+    """
+    Prints the change of every stage against the baseline; returns the list of regressions and the number
+    of compared stages. Sizes run with other inputs (storage backend, days, devices) are skipped.
+    Wypisuje zmianę każdego etapu względem wyniku bazowego; zwraca listę regresji i liczbę porównanych etapów.
+    Rozmiary uruchomione z innymi danymi wejściowymi (zapis, dni, urządzenia) są pomijane.
+    """
+    regressions, compared = [], 0
+    print(f"\n {'size':<8}{'stage':<10}{'baseline [s]':>14}{'now [s]':>10}{'change':>10}")
+    for size, result in results["sizes"].items():
+        base_stages = baseline.get("sizes", {}).get(size, {}).get("stages", {})
+        mismatch = input_mismatch(results, baseline, size) if base_stages else None
+        if mismatch:
+            print(f" {size:<8}skipped - different inputs: {mismatch}")  # Pominięto - inne dane wejściowe
+            continue
+        for stage, metrics in result["stages"].items():
+            if stage not in base_stages:
+                continue
+            old, new = base_stages[stage]["seconds"], metrics["seconds"]
+            change = (new / old - 1) * 100 if old > 0 else 0.0
+            regressed = change > threshold and new - old > MIN_DELTA_S
+            print(f" {size:<8}{stage:<10}{old:>14.3f}{new:>10.3f}{change:>+9.1f}%" + ("  REGRESSION" if regressed else ""))
+            compared += 1
+            if regressed:
+                regressions.append(f"{size}/{stage}")
+    return regressions, compared
+
+
+def git_commit():
+    try:
+        return subprocess.run(["git", "rev-parse", "--short", "HEAD"], cwd=BASE_DIR, capture_output=True,
+                              text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark of the pipeline stages / Benchmark etapów potoku")
+    parser.add_argument("--size", nargs="+", choices=list(SIZES), default=["week"],
+                        help="length of the synthetic data: week, year, decade")
+    parser.add_argument("--days", type=int, help="custom length in days (instead of --size)")
+    parser.add_argument("--devices", type=int, default=1, help="number of inverters in the MQTT data")
+    parser.add_argument("--repeat", type=int, default=1, help="runs per stage, the best time is kept")
+    parser.add_argument("--model", help="model file for the predict stage (default: linear model fitted on the data)")
+    parser.add_argument("--output", default=os.path.join(BASE_DIR, "outputs", "benchmark.json"),
+                        help="JSON file with the results")
+    parser.add_argument("--baseline", help="JSON file of an earlier run to compare with")
+    parser.add_argument("--threshold", type=float, default=20.0,
+                        help="allowed slowdown of a stage in percent before the run fails")
+    parser.add_argument("--workdir", help="directory for the generated data (default: temporary, removed)")
+    parser.add_argument("--verbose", action="store_true", help="show the output of the pipeline stages")
+    args = parser.parse_args()
+
+    sizes = {f"{args.days}d": args.days} if args.days else {name: SIZES[name] for name in args.size}
+    results = {
+        "commit": git_commit(),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+        "python": platform.python_version(),
+        "pandas": pd.__version__,
+        "storage": os.getenv("STORAGE_BACKEND", "csv"),
+        "repeat": args.repeat,
+        "sizes": {},
+    }
+
+    for name, days in sizes.items():
+        workdir = args.workdir or tempfile.mkdtemp(prefix="pv_benchmark_")
+        os.makedirs(workdir, exist_ok=True)
+        print(f" Benchmark {name} ({days} days)...")
+        try:
+            result = benchmark_size(days, workdir, args.model, args.repeat, args.verbose, args.devices)
+        finally:
+            if not args.workdir:
+                shutil.rmtree(workdir, ignore_errors=True)
+        results["sizes"][name] = result
+        print(f"   MQTT rows: {result['inputs']['mqtt_rows']}, training rows: {result['inputs']['training_rows']}")
+        for stage, metrics in result["stages"].items():
+            rss = "n/a" if metrics['peak_rss_mb'] is None else f"{metrics['peak_rss_mb']:.1f}"
+            print(f"   {stage:<8} {metrics['seconds']:>8.3f} s   peak RSS {rss:>7} MB")
+
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(results, f, indent=2)
+    print(f" Results saved to {args.output}")  # Wyniki zapisane
+
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions, compared = compare(results, baseline, args.threshold)
+        if not compared:
+            print(f" Nothing to compare: {args.baseline} has no stages run with the same inputs.")
+            sys.exit(1)
+        if regressions:
+            print(f" Stages slower by more than {args.threshold:.0f}%: {', '.join(regressions)}")
+            sys.exit(1)
+        print(f" No stage slower by more than {args.threshold:.0f}%.")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""
+Synthetic input data of any length: raw if0754/* MQTT inverter telemetry and Solcast-shaped weather series.
+Irradiance follows the sun position at the installation with random day-to-day cloudiness; inverter power
+and its energy counter are derived from it, so the merged data looks like real training data.
+
+Syntetyczne dane wejściowe dowolnej długości: surowa telemetria falownika MQTT if0754/* oraz szeregi pogodowe
+w formacie Solcast. Natężenie promieniowania zależy od położenia słońca z losowym zachmurzeniem,
+a moc falownika i licznik energii są z niego wyliczane, więc połączone dane przypominają prawdziwe.
+"""
+
+import numpy as np
+import pandas as pd
+
+LATITUDE = 51.334660
+LONGITUDE = 16.860879
+CAPACITY_KW = 10.0
+
+# Registers m1..m8 in the order used by MQTTDataCleaner.pivot_and_rename
+# Rejestry m1..m8 w kolejności używanej przez MQTTDataCleaner.pivot_and_rename
+TOPICS = [f"if0754/fca/m{i}" for i in range(1, 9)]
+STATUS_TOPICS = ["if0754/connected", "if0754/fca/connected"]
+
+# The inverter reports only in daylight; this also keeps device-local timestamps clear of DST changes (2-3 AM)
+# Falownik raportuje tylko w dzień; dzięki temu lokalne znaczniki czasu omijają zmianę czasu (2-3 w nocy)
+FIRST_HOUR, LAST_HOUR = 4, 22
+
+
+def clear_sky_ghi(times):
+    # Simple clear-sky model: GHI from the solar elevation at the installation
+    # Prosty model bezchmurnego nieba: GHI z wysokości słońca nad instalacją
+    times = pd.DatetimeIndex(times)
+    day = times.dayofyear.to_numpy()
+    solar_hour = times.hour.to_numpy() + times.minute.to_numpy() / 60 + LONGITUDE / 15
+    declination = np.radians(23.45) * np.sin(2 * np.pi * (284 + day) / 365)
+    hour_angle = np.radians(15 * (solar_hour - 12))
+    latitude = np.radians(LATITUDE)
+    cos_zenith = (np.sin(latitude) * np.sin(declination) +
+                  np.cos(latitude) * np.cos(declination) * np.cos(hour_angle))
+    return 1000 * np.clip(cos_zenith, 0, None) ** 1.2
+
+
+def generate_solcast(start, days, seed=0):
+    """
+    Solcast-shaped 15-min series (ghi, air_temp, period_end in UTC, period) covering `days` days.
+    Szereg 15-min w formacie Solcast (ghi, air_temp, period_end w UTC, period) obejmujący `days` dni.
+    """
+    rng = np.random.default_rng(seed)
+    period_end = pd.date_range(pd.Timestamp(start, tz="UTC"), periods=days * 96, freq="15min")
+    n = len(period_end)
+
+    # Cloudiness: one level per day plus smooth noise within the day
+    # Zachmurzenie: jeden poziom na dzień i płynny szum w ciągu dnia
+    daily = rng.uniform(0.2, 1.0, days + 1)[np.arange(n) // 96]
+    noise = np.convolve(rng.normal(0, 0.15, n + 7), np.ones(8) / 8, mode="valid")[:n]
+    ghi = clear_sky_ghi(period_end) * np.clip(daily + noise, 0.05, 1.0)
+
+    day = period_end.dayofyear.to_numpy()
+    hour = period_end.hour.to_numpy() + period_end.minute.to_numpy() / 60
+    air_temp = (9 - 10 * np.cos(2 * np.pi * (day - 15) / 365) - 4 * np.cos(2 * np.pi * (hour - 3) / 24)
+                + rng.normal(0, 1, n))
+
+    return pd.DataFrame({
+        "ghi": np.round(ghi).astype(int),
+        "air_temp": np.round(air_temp).astype(int),
+        "period_end": period_end,
+        "period": "PT15M",
+    })
+
+
+def generate_mqtt(start, days, solcast=None, seed=0, device="if0754"):
+    """
+    Raw MQTT rows (timestamp, topic, value) as written by mqtt_data_collector.py: registers m1..m8 every
+    5 minutes in daylight, timestamps in naive local time. Power follows the Solcast irradiance.
+    `device` replaces the if0754 topic prefix (several inverters on one broker).
+    Surowe wiersze MQTT (timestamp, topic, value) jak z mqtt_data_collector.py: rejestry m1..m8 co 5 minut
+    w ciągu dnia, znaczniki czasu w naiwnym czasie lokalnym. Moc wynika z natężenia promieniowania Solcast.
+    `device` zastępuje prefiks tematów if0754 (kilka falowników na jednym brokerze).
+    """
+    rng = np.random.default_rng(seed + 1)
+    if solcast is None:
+        solcast = generate_solcast(start, days, seed)
+
+    times = pd.date_range(pd.Timestamp(start, tz="UTC"), periods=days * 288, freq="5min")
+    local = times.tz_convert("Europe/Warsaw").tz_localize(None)
+    daylight = (local.hour >= FIRST_HOUR) & (local.hour < LAST_HOUR)
+    times, local = times[daylight], local[daylight]
+    n = len(times)
+
+    # Irradiance interpolated to 5 min, temperature derating of the modules
+    # Natężenie interpolowane do 5 min, spadek sprawności modułów z temperaturą
+    seconds = solcast["period_end"].astype("int64").to_numpy() / 1e9
+    ghi = np.interp(times.astype("int64").to_numpy() / 1e9, seconds, solcast["ghi"].to_numpy())
+    air_temp = np.interp(times.astype("int64").to_numpy() / 1e9, seconds, solcast["air_temp"].to_numpy())
+    power_kw = CAPACITY_KW * ghi / 1000 * (1 - 0.004 * (air_temp + ghi / 40 - 25))
+    power_kw = np.clip(power_kw * rng.normal(1, 0.02, n), 0, None)
+
+    udc = np.where(power_kw > 0, 700 + rng.normal(0, 5, n), 0)
+    registers = np.column_stack([
+        230 + rng.normal(0, 2, (n, 3)),                           # m1-m3: Voltage_Ua/Ub/Uc [V]
+        np.round(np.divide(power_kw * 1e6, udc, out=np.zeros(n), where=udc > 0)),  # m4: Current_Idc [mA]
+        np.round(udc, 1),                                         # m5: Voltage_Udc [V]
+        np.round(power_kw * 1e4),                                 # m6: Instant_Power_Pdc (SF 65535 -> /10) [W]
+        np.round(23000 + np.cumsum(power_kw / 12), 3),            # m7: Total_Power_P_ALL [kWh]
+        np.full(n, 65535.0),                                      # m8: SF
+    ]).round(3)
+
+    # Registers of one reading arrive a few milliseconds apart
+    # Rejestry jednego odczytu przychodzą w odstępie kilku milisekund
+    base = np.asarray(local.strftime("%Y-%m-%dT%H:%M:%S"), dtype=object)
+    suffix = np.array([f".{13144 + 1000 * i:06d}" for i in range(len(TOPICS))], dtype=object)
+    df = pd.DataFrame({
+        "timestamp": np.repeat(base, len(TOPICS)) + np.tile(suffix, n),
+        "topic": np.tile(np.array([t.replace("if0754", device, 1) for t in TOPICS], dtype=object), n),
+        "value": registers.ravel(),
+    })
+
+    # Connection status messages, filtered out by the cleaner
+    # Komunikaty o stanie połączenia, odfiltrowywane przez moduł czyszczący
+    first_of_day = np.flatnonzero(np.r_[True, local.date[1:] != local.date[:-1]])
+    status = pd.DataFrame({
+        "timestamp": np.repeat(base[first_of_day], len(STATUS_TOPICS)) + ".000000",
+        "topic": np.tile(np.array([t.replace("if0754", device, 1) for t in STATUS_TOPICS], dtype=object),
+                         len(first_of_day)),
+        "value": 0.0,
+    })
+    return pd.concat([status, df], ignore_index=True).sort_values("timestamp", kind="stable")
+
+
+def write_mqtt(df, path):
+    # Headerless CSV, the format of data/mqtt_data.csv / CSV bez nagłówka, format data/mqtt_data.csv
+    df.to_csv(path, header=False, index=False)
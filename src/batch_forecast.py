@@ -0,0 +1,162 @@
+"""
+Batch forecast for many PV installations listed in the site registry (sites.json).
+Forecasts for all sites are downloaded, sites sharing a model are predicted together
+in one vectorized model.predict call, and results are saved per site.
+
+Prognoza wsadowa dla wielu instalacji PV z rejestru instalacji (sites.json).
+Prognozy wszystkich instalacji są pobierane, instalacje z tym samym modelem są liczone razem
+w jednym zwektoryzowanym wywołaniu model.predict, a wyniki zapisywane osobno dla każdej instalacji.
+
+Usage / Użycie:
+    python batch_forecast.py [--sites path/to/sites.json] [--force-refresh]
+"""
+
+import os
+import time
+import argparse
+from datetime import datetime
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from predictor import Predictor
+from download_forecast import fetch_solcast_forecast, download_solcast_forecast_demo
+from sites import load_sites, group_by_model, BASE_DIR
+from storage import get_storage
+from instrumentation import instrumented
+
+load_dotenv()  # załaduj zmienne środowiskowe / load environment variables
+
+
+def fetch_forecasts(sites, use_demo, force_refresh=False):
+    """
+    Returns {site_id: forecast DataFrame}; sites without a forecast are skipped.
+    Zwraca {site_id: DataFrame prognozy}; instalacje bez prognozy są pomijane.
+    """
+    if use_demo:
+        # Demo mode: the same local demo forecast for every site
+        # Tryb demo: ta sama lokalna prognoza demo dla każdej instalacji
+        demo = download_solcast_forecast_demo()
+        return {site["site_id"]: demo.copy() for site in sites}
+
+    # Parallel downloads through the shared client (bounded by SOLCAST_MAX_CONCURRENCY, rate-limited)
+    # Równoległe pobieranie przez wspólnego klienta (ograniczone SOLCAST_MAX_CONCURRENCY, z limitem zapytań)
+    from solcast_client import get_client
+    client = get_client()
+    results = client.map(lambda site: fetch_solcast_forecast(site["latitude"], site["longitude"], force_refresh),
+                         sites)
+    forecasts = {site["site_id"]: df for site, df in zip(sites, results)}
+    client.print_stats()
+
+    for site_id, df in forecasts.items():
+        if df is None:
+            print(f" No forecast for site {site_id} - skipping.")  # Brak prognozy dla instalacji - pomijam
+    return {site_id: df for site_id, df in forecasts.items() if df is not None}
+
+
+def predict_group(predictor, sites, forecasts):
+    """
+    Predicts all sites of one model with a single model.predict call and splits the result per site.
+    Liczy predykcję dla wszystkich instalacji jednego modelu jednym wywołaniem model.predict i dzieli wynik.
+    """
+    prepared = []
+    for site in sites:
+        df, features = predictor.prepare_forecast_data(forecasts[site["site_id"]], site["latitude"], site["longitude"])
+        prepared.append((site, df, df[features].to_numpy(dtype=float)))
+
+    y_pred = predictor.predict_features(np.concatenate([X for _, _, X in prepared]))
+
+    results = {}
+    start = 0
+    for site, df, X in prepared:
+        df = df.copy()
+        df["site_id"] = site["site_id"]
+        df["energy_15min_pred_kWh"] = y_pred[start:start + len(X)]
+        start += len(X)
+
+        # Energy in 15 min cannot exceed installed capacity × 0.25 h
+        # Energia w 15 min nie może przekroczyć mocy zainstalowanej × 0,25 h
+        if site["capacity_kW"] is not None:
+            df["energy_15min_pred_kWh"] = df["energy_15min_pred_kWh"].clip(upper=site["capacity_kW"] * 0.25)
+        results[site["site_id"]] = df
+    return results
+
+
+@instrumented("aggregate")
+def aggregate_daily(df, timezone):
+    """
+    Daily energy sums by local date of the site.
+    Dzienne sumy energii według lokalnej daty instalacji.
+    """
+    dates = pd.to_datetime(df["period_end"], utc=True).dt.tz_convert(timezone).dt.date
+    return (
+        df.groupby(dates)["energy_15min_pred_kWh"]
+        .sum()
+        .rename_axis("date")
+        .reset_index()
+        .rename(columns={"energy_15min_pred_kWh": "daily_energy_sum_kWh"})
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Multi-site batch forecast / Prognoza wsadowa dla wielu instalacji")
+    parser.add_argument("--sites", help="site registry file (default: sites.json or SITES_FILE)")
+    parser.add_argument("--force-refresh", action="store_true", help="ignore cached forecasts")
+    parser.add_argument("--plot", action="store_true",
+                        help="one multi-page PDF with every forecast day of every site / wykresy wszystkich instalacji")
+    args = parser.parse_args()
+    run_batch(args.sites, args.force_refresh, args.plot)
+
+
+def run_batch(sites_file=None, force_refresh=False, plot=False):
+    """
+    Forecast for all sites of the registry; also run in-process by scheduler.py.
+    Prognoza dla wszystkich instalacji z rejestru; uruchamiana też w procesie przez scheduler.py.
+    """
+    started = time.perf_counter()
+    use_demo = os.getenv("USE_DEMO", "0") == "1"
+    sites = load_sites(sites_file)
+    print(f" Loaded {len(sites)} sites from registry.")  # Wczytano instalacje z rejestru
+
+    forecasts = fetch_forecasts(sites, use_demo, force_refresh)
+    sites = [site for site in sites if site["site_id"] in forecasts]
+    print(f" Forecasts ready for {len(forecasts)} sites ({time.perf_counter() - started:.1f} s).")
+
+    storage = get_storage()  # CSV lub Parquet / CSV or Parquet
+    sites_dir = os.path.join(BASE_DIR, "predictions", "sites")
+    timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")
+    suffix = "_demo" if use_demo else ""
+
+    predictions = []
+    groups = group_by_model(sites)
+    print(f" {len(groups)} distinct models for {len(sites)} sites.")  # Liczba różnych modeli
+
+    for (model_path, scaler_path), group_sites in groups.items():
+        group_started = time.perf_counter()
+        predictor = Predictor(model_path, scaler_path, verbose=False)
+        results = predict_group(predictor, group_sites, forecasts)
+
+        # Save per-site outputs / Zapisz wyniki osobno dla każdej instalacji
+        for site in group_sites:
+            site_dir = os.path.join(sites_dir, site["site_id"])
+            os.makedirs(site_dir, exist_ok=True)
+            prediction = results[site["site_id"]]
+            storage.write(prediction, os.path.join(site_dir, f"forecast{suffix}_{timestamp}"), time_column="period_end")
+            storage.write(aggregate_daily(prediction, site["timezone"]),
+                          os.path.join(site_dir, f"daily_sum{suffix}_{timestamp}"))
+            if plot:
+                predictions.append(prediction[["period_end", "energy_15min_pred_kWh"]].assign(site_id=site["site_id"]))
+
+        print(f" Model {os.path.basename(model_path)}: {len(group_sites)} sites predicted and saved "
+              f"in {time.perf_counter() - group_started:.2f} s")
+
+    if predictions:
+        from visualizer import Visualizer
+        pdf_plot = os.path.join(sites_dir, f"plots{suffix}_{timestamp}.pdf")
+        Visualizer().save_days(pd.concat(predictions, ignore_index=True), pdf_plot, group_column="site_id")
+
+    print(f" Batch forecast completed in {time.perf_counter() - started:.1f} s. Results in {sites_dir}")
+
+
+if __name__ == "__main__":
+    main()
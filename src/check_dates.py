@@ -1,27 +1,29 @@
-import pandas as pd
 import os
+from storage import get_storage, dataset_name
 
 #  Check if files exist
 #  Sprawdź, czy pliki istnieją
-inverter_file = "outputs/inverter_with_scaled_power.csv"
+inverter_file = "outputs/inverter_data_plus_power.csv"
 solcast_history_file = "data/solcast_history.csv"
 solcast_forecast_file = "data/solcast_forecast.csv"
 
+storage = get_storage()
+
 def check_dates(file_path, time_column, description):
     """
-    Check and print date range and record count for a CSV file.
-    Sprawdź i wyświetl zakres dat oraz liczbę rekordów w pliku CSV.
+    Check and print date range and record count for a CSV file (from its time index).
+    Sprawdź i wyświetl zakres dat oraz liczbę rekordów w pliku CSV (z jego indeksu czasu).
     """
-    if not os.path.isfile(file_path):
+    dataset = dataset_name(file_path)
+    if not storage.exists(dataset) and not os.path.isfile(file_path):
         print(f"❌ File {file_path} does not exist!")
         return
 
     try:
-        df = pd.read_csv(file_path)
-        df[time_column] = pd.to_datetime(df[time_column])
+        min_time, max_time, rows = storage.time_range(dataset, time_column)
         print(f"\n {description} ({file_path}):")
-        print(f" Date range: {df[time_column].min()} → {df[time_column].max()}")
-        print(f" Number of records: {len(df)}")
+        print(f" Date range: {min_time} → {max_time}")
+        print(f" Number of records: {rows}")
     except Exception as e:
         print(f" Error reading {file_path}: {e}")
 
@@ -1,10 +1,143 @@
 import pandas as pd
+import numpy as np
+import json
+import io
 import os
+import re
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from storage import get_storage, dataset_name, read_raw_mqtt
+from mqtt_schema import load_schema, topic_device, topic_suffix
+from instrumentation import instrumented
+
+# Divisor for instant power Pdc for each SF (scaling factor) register value
+# Dzielnik mocy chwilowej Pdc dla każdej wartości rejestru SF (współczynnik skali)
+SF_DIVISORS = {
+    65535.0: 10,
+    65534.0: 100,
+    65533.0: 1000,
+}
+
+# Processes for cleaning several devices (0 = one per CPU core)
+# Liczba procesów przy czyszczeniu wielu urządzeń (0 = jeden na rdzeń CPU)
+CLEAN_WORKERS = int(os.getenv("CLEAN_WORKERS", "0"))
+
+# Rows parsed at once from CSV - bounds the memory of the text columns
+# Liczba wierszy CSV parsowanych naraz - ogranicza pamięć kolumn tekstowych
+PARSE_CHUNK_ROWS = 1_000_000
+
+
+def parse_mqtt(source, schema=None, chunksize=PARSE_CHUNK_ROWS):
+    """
+    Parses raw MQTT records (CSV / Parquet path or a DataFrame) into a compact typed frame:
+    timestamp datetime64[ns] (int64), device categorical (first topic level), channel categorical
+    (codes = channel order of the schema), value float64.
+    Only schema channel topics are kept; the CSV is read in chunks and other topics are dropped per chunk,
+    so the repeated topic and timestamp strings are never held for the whole file. Topics that are
+    neither channels nor excluded are listed in attrs['unknown_topics'].
+    Parsuje surowe rekordy MQTT (ścieżka CSV / Parquet lub DataFrame) do zwartej typowanej ramki:
+    timestamp datetime64[ns] (int64), device kategoryczny (pierwszy poziom tematu), channel kategoryczny
+    (kody = kolejność kanałów schematu), value float64.
+    Zachowywane są tylko tematy kanałów schematu; CSV jest czytany partiami, a pozostałe tematy są
+    odrzucane w każdej partii, więc powtarzające się napisy nigdy nie są trzymane dla całego pliku.
+    Tematy, które nie są kanałami ani nie są wykluczone, trafiają do attrs['unknown_topics'].
+    """
+    schema = schema or load_schema()
+    codes_by_suffix = {channel['suffix']: code for code, channel in enumerate(schema['channels'])}
+    excluded = {topic_suffix(topic) for topic in schema['exclude']}
+    devices = {}  # device -> code, shared by all chunks / urządzenie -> kod, wspólny dla wszystkich partii
+    unknown = set()
+    if isinstance(source, pd.DataFrame):
+        chunks = [source]
+    elif source.endswith(".parquet"):
+        chunks = [read_raw_mqtt(source)]
+    else:
+        chunks = pd.read_csv(source, header=None, names=['timestamp', 'topic', 'value'],
+                             dtype={'timestamp': str, 'topic': 'category'}, chunksize=chunksize)
+
+    times, device_codes, codes, values = [], [], [], []
+    for chunk in chunks:
+        # Strip, split and look up once per distinct topic, not once per row
+        # Usuwanie spacji, podział i wyszukiwanie raz na każdy temat, a nie raz na wiersz
+        topic = chunk['topic'].astype('category')
+        names = topic.cat.categories.astype(str).str.strip()
+        unknown.update(name for name in names
+                       if topic_suffix(name) not in codes_by_suffix and topic_suffix(name) not in excluded)
+        channel_map = np.array([codes_by_suffix.get(topic_suffix(name), -1) for name in names] + [-1], dtype=np.int8)
+        device_map = np.array([devices.setdefault(topic_device(name), len(devices)) for name in names] + [-1])
+        chunk_codes = channel_map[topic.cat.codes.to_numpy()]  # NaN topic has code -1 -> last entry
+
+        timestamp = pd.to_datetime(chunk['timestamp'], format='ISO8601', errors='coerce')
+        keep = (chunk_codes >= 0) & timestamp.notna().to_numpy()
+        times.append(timestamp.to_numpy(dtype='datetime64[ns]')[keep])
+        device_codes.append(device_map[topic.cat.codes.to_numpy()][keep])
+        codes.append(chunk_codes[keep])
+        values.append(pd.to_numeric(chunk['value'], errors='coerce').to_numpy(dtype=np.float64)[keep])
+
+    device_codes = np.concatenate(device_codes) if device_codes else np.array([], dtype=np.int64)
+    df = pd.DataFrame({
+        'timestamp': np.concatenate(times) if times else np.array([], dtype='datetime64[ns]'),
+        'device': pd.Categorical.from_codes(device_codes, categories=list(devices)).remove_unused_categories(),
+        'channel': pd.Categorical.from_codes(np.concatenate(codes) if codes else [],
+                                             categories=[channel['name'] for channel in schema['channels']]),
+        'value': np.concatenate(values) if values else np.array([], dtype=np.float64),
+    })
+    df.attrs['unknown_topics'] = sorted(unknown)
+    return df
+
+
+def burst_rows(stamps, gap, window=np.timedelta64(5, 'm')):
+    """
+    Row index of every message (stamps sorted) and the time of each row: a new row starts when the gap to the
+    previous message exceeds `gap` or a resample window boundary is crossed, so the registers of one publish
+    burst (logged a few ms apart) share one row and a row never spans two 5-min windows.
+    Indeks wiersza każdej wiadomości (stamps posortowane) i czas każdego wiersza: nowy wiersz zaczyna się, gdy
+    przerwa od poprzedniej wiadomości przekracza `gap` lub przekroczona jest granica okna resamplingu, więc
+    rejestry jednej serii publikacji (zapisane w odstępie kilku ms) dzielą jeden wiersz.
+    """
+    if len(stamps) == 0:
+        return np.array([], dtype=np.int64), stamps
+    ticks = stamps.view(np.int64)
+    window_id = ticks // window.astype('timedelta64[ns]').astype(np.int64)
+    new_row = np.empty(len(stamps), dtype=bool)
+    new_row[0] = True
+    new_row[1:] = (np.diff(ticks) > gap.astype('timedelta64[ns]').astype(np.int64)) | (np.diff(window_id) != 0)
+    return np.cumsum(new_row) - 1, stamps[new_row]
+
+
+def _aggregate_runs(values, starts, agg):
+    # One value per contiguous run values[starts[i]:starts[i+1]] / Jedna wartość na każdy ciągły odcinek
+    if agg == 'first':
+        return values[starts]
+    if agg == 'last':
+        return values[np.append(starts[1:], len(values)) - 1]
+    if agg == 'max':
+        return np.maximum.reduceat(values, starts)
+    if agg == 'min':
+        return np.minimum.reduceat(values, starts)
+    return np.add.reduceat(values, starts) / np.diff(np.append(starts, len(values)))
+
+
+def _clean_device(df, schema, dataset, return_result):
+    # Pivot -> resample -> SF scaling of one device in a worker process, written to its own partition
+    # Pivot -> resampling -> skalowanie SF jednego urządzenia w procesie roboczym, zapis do jego partycji
+    cleaner = MQTTDataCleaner(None, schema=schema)
+    result = cleaner._resample(cleaner._pivot_channels(df))
+    cleaner.storage.write(result, dataset, time_column='timestamp')
+    return result if return_result else len(result)
+
 
 class MQTTDataCleaner:
-    def __init__(self, mqtt_csv_file):
+    def __init__(self, mqtt_csv_file, save_intermediate=False, schema=None):
         self.mqtt_csv_file = mqtt_csv_file
 
+        # Topic -> channel mapping (mqtt_schema.json or MQTT_SCHEMA)
+        # Mapowanie temat -> kanał (mqtt_schema.json lub MQTT_SCHEMA)
+        self.schema = schema or load_schema()
+
+        # Save inverter_raw_data.csv and inverter_pivoted.csv only for debugging
+        # Zapisuj inverter_raw_data.csv i inverter_pivoted.csv tylko do debugowania
+        self.save_intermediate = save_intermediate
+
         # Base project directory (one level above src)
         # Bazowy katalog projektu (o poziom wyżej niż src)
         base_dir = os.path.abspath(os.path.join(os.path.dirname(__file__), ".."))
@@ -12,56 +145,175 @@ class MQTTDataCleaner:
         # Paths to outputs folder in base directory
         # Ścieżki do folderu outputs w katalogu głównym
         outputs_dir = os.path.join(base_dir, "outputs")
-        
+
         # Create outputs folder if it does not exist (safety)
         # Utwórz folder outputs, jeśli nie istnieje (zabezpieczenie)
         os.makedirs(outputs_dir, exist_ok=True)
 
+        # Per-device partitions when the data has several devices: outputs/devices/<device>/
+        # Partycje urządzeń, gdy dane zawierają kilka urządzeń: outputs/devices/<urządzenie>/
+        self.devices_dir = os.path.join(outputs_dir, "devices")
+        self.device = self.schema['device']
+
         self.cleaned_file = os.path.join(outputs_dir, "inverter_raw_data.csv")
         self.pivoted_file = os.path.join(outputs_dir, "inverter_pivoted.csv")
         # Zmieniona nazwa pliku finalnego, by była spójna z main.py i DataMerger
         self.final_file = os.path.join(outputs_dir, "inverter_data_plus_power.csv")
+        # Incremental ingest state (byte offsets, last 5-min window)
+        # Stan przyrostowego wczytywania (offsety bajtowe, ostatnie okno 5 min)
+        self.checkpoint_file = os.path.join(outputs_dir, "ingest_checkpoint.json")
+
+        # Storage backend for the final data (CSV or Parquet, see storage.py)
+        # Backend magazynu dla danych końcowych (CSV lub Parquet, patrz storage.py)
+        self.storage = get_storage()
+        self.final_dataset = dataset_name(self.final_file)
+
+    def run(self):
+        """
+        Runs filter -> pivot -> 5-min resample -> SF scaling in memory, without intermediate CSV files.
+        Data of several devices is cleaned per device in parallel (see run_devices).
+        Uruchamia filtr -> pivot -> resampling 5 min -> skalowanie SF w pamięci, bez pośrednich plików CSV.
+        Dane kilku urządzeń są czyszczone osobno dla każdego urządzenia równolegle (patrz run_devices).
+        """
+        df_filtered = self.load_and_clean()
+        if len(df_filtered['device'].cat.categories) > 1:
+            return self.run_devices(df_filtered)
+        df_pivot = self.pivot_and_rename(df_filtered)
+        return self.resample_data(df_pivot)
+
+    def run_devices(self, df, workers=None):
+        """
+        Cleans every device (first topic level) in a process pool and writes each one to
+        outputs/devices/<device>/inverter_data_plus_power; the main device (schema "device" or MQTT_DEVICE)
+        also goes to inverter_data_plus_power as before. A device that fails is reported and skipped,
+        the others are still written. Returns the data of the main device.
+        Czyści każde urządzenie (pierwszy poziom tematu) w puli procesów i zapisuje każde do
+        outputs/devices/<urządzenie>/inverter_data_plus_power; główne urządzenie (schemat "device" lub MQTT_DEVICE)
+        trafia też do inverter_data_plus_power jak wcześniej. Urządzenie z błędem jest zgłaszane i pomijane,
+        pozostałe są nadal zapisywane. Zwraca dane głównego urządzenia.
+        """
+        parts = {device: df.iloc[rows].drop(columns='device')
+                 for device, rows in df.groupby('device', observed=True).indices.items()}
+        workers = workers or min(len(parts), CLEAN_WORKERS or os.cpu_count() or 1)
+        print(f" Cleaning {len(parts)} devices with {workers} worker processes: {', '.join(parts)}")
+
+        results, failed = {}, {}
+        jobs = {device: (part, self.schema, self.device_dataset(device), device == self.device)
+                for device, part in parts.items()}
+        if workers > 1:
+            with ProcessPoolExecutor(max_workers=workers) as pool:
+                futures = {pool.submit(_clean_device, *args): device for device, args in jobs.items()}
+                for future in as_completed(futures):
+                    try:
+                        results[futures[future]] = future.result()
+                    except Exception as e:
+                        failed[futures[future]] = e
+        else:
+            for device, args in jobs.items():
+                try:
+                    results[device] = _clean_device(*args)
+                except Exception as e:
+                    failed[device] = e
+
+        for device in parts:
+            if device in failed:
+                print(f" Device {device} failed: {type(failed[device]).__name__}: {failed[device]}")
+            else:
+                rows = len(results[device]) if device == self.device else results[device]
+                print(f" Device {device}: {rows} 5-min windows -> {self.storage.path(self.device_dataset(device))}")
+
+        if self.device in failed:
+            raise RuntimeError(f" Main device {self.device} failed, other devices were written") from failed[self.device]
+        if self.device not in results:
+            print(f" Main device {self.device} not in the data - {self.final_file} not updated.")
+            return None
+        self.storage.write(results[self.device], self.final_dataset, time_column='timestamp')
+        return results[self.device]
+
+    def device_dataset(self, device):
+        # Device ids come from topics - keep only characters safe in a path
+        # Identyfikatory urządzeń pochodzą z tematów - zostaw tylko znaki bezpieczne w ścieżce
+        safe = re.sub(r'[^A-Za-z0-9_.-]', '_', device).lstrip('.') or '_'
+        return os.path.join(self.devices_dir, safe, "inverter_data_plus_power")
 
-    def load_and_clean(self):
-        # Load raw MQTT CSV without header, assign column names
-        # Wczytaj surowy plik CSV MQTT bez nagłówka, przypisz nazwy kolumn
-        df = pd.read_csv(self.mqtt_csv_file, header=None, names=['timestamp', 'topic', 'value'])
-
-        # Filter out unwanted topics
-        # Filtruj niechciane tematy (topics)
-        exclude_topics = [
-            'if0754/fca/m9', 'if0754/fca/m10', 'if0754/fca/m11',
-            'if0754/fca/connected', 'if0754/fca/m12', 'if0754/connected'
-        ]
-        df['topic'] = df['topic'].astype(str).str.strip()
-        df_filtered = df[~df['topic'].isin(exclude_topics)]
-
-        # Save cleaned data
-        # Zapisz oczyszczone dane
-        df_filtered.to_csv(self.cleaned_file, index=False)
+    @instrumented("clean")
+    def load_and_clean(self, df=None):
+        # Parse raw MQTT CSV (or the given raw rows) into typed columns, dropping unwanted topics on the way
+        # Parsuj surowy plik CSV MQTT (lub podane surowe wiersze) do typowanych kolumn, odrzucając niechciane tematy
+        df_filtered = parse_mqtt(self.mqtt_csv_file if df is None else df, self.schema)
+        if df_filtered.attrs['unknown_topics']:
+            print(f" Ignored topics not in the MQTT schema: {df_filtered.attrs['unknown_topics']}")
+
+        # Save cleaned data (debug only)
+        # Zapisz oczyszczone dane (tylko debug)
+        if self.save_intermediate:
+            df_filtered.to_csv(self.cleaned_file, index=False)
         return df_filtered
 
-    def pivot_and_rename(self):
-        # Load cleaned data and pivot it: topics as columns
-        # Wczytaj oczyszczone dane i przekształć (pivot): tematy jako kolumny
-        df = pd.read_csv(self.cleaned_file)
-        df_pivot = df.pivot(index='timestamp', columns='topic', values='value')
-        df2 = df_pivot.reset_index()
-
-        # Rename columns to meaningful names
-        # Zmień nazwy kolumn na opisowe
-        df2.columns = ['timestamp', 'Voltage_Ua', 'Voltage_Ub', 'Voltage_Uc',
-                       'Current_Idc', 'Voltage_Udc', 'Instant_Power_Pdc', 'Total_Power_P_ALL', 'SF']
-
-        # Save pivoted and renamed data
-        # Zapisz przekształcone i przemianowane dane
-        df2.to_csv(self.pivoted_file, index=False)
+    @instrumented("pivot")
+    def pivot_and_rename(self, df=None):
+        # Pivot cleaned data: one column per schema channel (load from file if no data given)
+        # Przekształć (pivot) oczyszczone dane: jedna kolumna na kanał schematu (wczytaj z pliku, jeśli nie podano danych)
+        if df is None:
+            df = pd.read_csv(self.cleaned_file, parse_dates=['timestamp'])
+        # With several devices only the main one is pivoted here (all of them: run_devices)
+        # Przy kilku urządzeniach tutaj przekształcane jest tylko główne (wszystkie: run_devices)
+        if df['device'].nunique() > 1:
+            df = df[df['device'] == self.device]
+        df2 = self._pivot_channels(df)
+
+        # Save pivoted and renamed data (debug only)
+        # Zapisz przekształcone i przemianowane dane (tylko debug)
+        if self.save_intermediate:
+            df2.to_csv(self.pivoted_file, index=False)
         return df2
 
-    def resample_data(self):
-        # Load pivoted data and resample to 5-minute intervals
-        # Wczytaj dane po pivot i resampluj co 5 minut
-        df = pd.read_csv(self.pivoted_file)
+    def _pivot_channels(self, df):
+        """
+        Vectorized pivot on integer keys: rows are publish bursts (see burst_rows), columns are the schema
+        channels in schema order with their dtype; duplicate values of a channel in one row are combined
+        with the channel's agg. Missing channels give NaN columns, unknown ones never reach this point.
+        Wektorowy pivot na kluczach całkowitych: wiersze to serie publikacji (patrz burst_rows), kolumny to
+        kanały schematu w kolejności schematu z ich typem; powtórzone wartości kanału w jednym wierszu są
+        łączone funkcją agg kanału. Brakujące kanały dają kolumny NaN.
+        """
+        stamps = df['timestamp'].to_numpy(dtype='datetime64[ns]')
+        codes = pd.Categorical(df['channel'], categories=[c['name'] for c in self.schema['channels']]).codes
+        values = df['value'].to_numpy(dtype=np.float64)
+        if len(stamps) and not (stamps[1:] >= stamps[:-1]).all():
+            # Stable, so "last" keeps the arrival order within equal times / Stabilne, więc "last" zachowuje kolejność
+            order = np.argsort(stamps, kind='stable')
+            stamps, codes, values = stamps[order], codes[order], values[order]
+        rows, times = burst_rows(stamps, np.timedelta64(int(self.schema['burst_gap_ms'] * 1000), 'us'))
+
+        df2 = pd.DataFrame({'timestamp': times})
+        for code, channel in enumerate(self.schema['channels']):
+            selected = (codes == code) & ~np.isnan(values)
+            column = np.full(len(times), np.nan, dtype=channel['dtype'])
+            if selected.any():
+                # rows are non-decreasing, so every row's values form one contiguous run
+                # wiersze są niemalejące, więc wartości każdego wiersza tworzą jeden ciągły odcinek
+                channel_rows, channel_values = rows[selected], values[selected]
+                starts = np.flatnonzero(np.concatenate([[True], channel_rows[1:] != channel_rows[:-1]]))
+                column[channel_rows[starts]] = _aggregate_runs(channel_values, starts, channel['agg'])
+            df2[channel['name']] = column
+        return df2
+
+    def resample_data(self, df=None):
+        # Resample pivoted data to 5-minute intervals (load from file if no data given)
+        # Resampluj dane po pivot co 5 minut (wczytaj z pliku, jeśli nie podano danych)
+        if df is None:
+            df = pd.read_csv(self.pivoted_file)
+        df_resampled = self._resample(df)
+
+        # Save final cleaned and resampled data
+        # Zapisz ostateczne dane po przeskalowaniu
+        self.storage.write(df_resampled, self.final_dataset, time_column='timestamp')
+        return df_resampled
+
+    @instrumented("resample")
+    def _resample(self, df, prev_total_power=None):
+        df = df.copy()
         df['timestamp'] = pd.to_datetime(df['timestamp'])
         df.set_index('timestamp', inplace=True)
 
@@ -69,29 +321,126 @@ class MQTTDataCleaner:
         # Resampluj dane wybierając maksymalną wartość co 5 minut
         df_resampled = df.resample('5min').max().reset_index()
 
-        # Calculate energy [kWh] as difference of total power and round to 4 decimals
-        # Oblicz energię [kWh] jako różnicę mocy całkowitej, zaokrągloną do 4 miejsc
-        df_resampled['energy_kWh'] = df_resampled['Total_Power_P_ALL'].diff().round(4)
-        df_resampled['energy_kWh'] = df_resampled['energy_kWh'].fillna(0)
+        # Calculate energy [kWh] as difference of total power and round to 4 decimals.
+        # prev_total_power is the value of the window before the first one (incremental mode)
+        # Oblicz energię [kWh] jako różnicę mocy całkowitej, zaokrągloną do 4 miejsc.
+        # prev_total_power to wartość okna poprzedzającego pierwsze okno (tryb przyrostowy)
+        total_power = df_resampled['Total_Power_P_ALL']
+        if prev_total_power is not None:
+            total_power = pd.concat([pd.Series([prev_total_power]), total_power], ignore_index=True)
+        energy = total_power.diff().round(4).fillna(0)
+        df_resampled['energy_kWh'] = energy.iloc[len(energy) - len(df_resampled):].to_numpy()
 
         # Calculate scaled DC power depending on SF (scaling factor)
         # Oblicz skalowaną moc DC w zależności od współczynnika SF
-        df_resampled["Scaled_P_DC"] = df_resampled.apply(self.scale_power, axis=1)
-
-        # Save final cleaned and resampled data
-        # Zapisz ostateczne dane po przeskalowaniu
-        df_resampled.to_csv(self.final_file, index=False)
+        df_resampled["Scaled_P_DC"] = self.scale_power(df_resampled)
         return df_resampled
 
-    @staticmethod
-    def scale_power(row):
-        # Scale instant power Pdc depending on SF value
-        # Skaluj moc chwilową Pdc w zależności od wartości SF
-        if row["SF"] == 65535.0:
-            return row["Instant_Power_Pdc"] / 10
-        elif row["SF"] == 65534.0:
-            return row["Instant_Power_Pdc"] / 100
-        elif row["SF"] == 65533.0:
-            return row["Instant_Power_Pdc"] / 1000
+    def run_incremental(self):
+        """
+        Processes only the part of the MQTT file appended since the last run and appends
+        the new 5-min windows to inverter_data_plus_power.csv.
+        The last (possibly incomplete) 5-min window is always re-read and rewritten.
+        With several devices in the file only the main device is processed.
+        Przetwarza tylko część pliku MQTT dopisaną od ostatniego uruchomienia i dopisuje
+        nowe okna 5 min do inverter_data_plus_power.csv.
+        Ostatnie (być może niepełne) okno 5 min jest zawsze wczytywane i zapisywane ponownie.
+        Przy kilku urządzeniach w pliku przetwarzane jest tylko urządzenie główne.
+        """
+        checkpoint = self._load_checkpoint()
+        if checkpoint is None:
+            print(" No valid ingest checkpoint - processing the whole MQTT file...")
+            checkpoint = {'mqtt_offset': 0, 'mqtt_size': 0, 'store_offset': 0,
+                          'last_window': None, 'last_timestamp': None, 'prev_total_power': None}
+
+        # Read only complete lines appended after the checkpoint offset
+        # Wczytaj tylko pełne linie dopisane po offsecie z punktu kontrolnego
+        with open(self.mqtt_csv_file, 'rb') as f:
+            f.seek(checkpoint['mqtt_offset'])
+            data = f.read()
+        data = data[:data.rfind(b'\n') + 1]
+        mqtt_size = checkpoint['mqtt_offset'] + len(data)
+
+        if mqtt_size <= checkpoint['mqtt_size']:
+            print(" No new MQTT data since last run.")
+            return None
+
+        # Byte offset of each line, aligned with the parsed rows (blank lines are kept as NaN rows)
+        # Offset bajtowy każdej linii, zgodny z wczytanymi wierszami (puste linie zostają jako wiersze NaN)
+        line_lengths = [len(line) for line in data.splitlines(keepends=True)]
+        line_offsets = checkpoint['mqtt_offset'] + np.cumsum([0] + line_lengths[:-1])
+        raw = pd.read_csv(io.BytesIO(data), header=None, names=['timestamp', 'topic', 'value'],
+                          skip_blank_lines=False)
+        raw_times = pd.to_datetime(raw['timestamp'], errors='coerce')
+        raw = raw[raw_times.notna()]
+
+        df_pivot = self.pivot_and_rename(self.load_and_clean(raw))
+        df_new = self._resample(df_pivot, checkpoint['prev_total_power'])
+
+        # Replace the reopened last window in the store and append the new windows
+        # Zastąp ponownie otwarte ostatnie okno w magazynie i dopisz nowe okna
+        if not self.storage.partitioned:
+            store_offset = self._append_csv(df_new, checkpoint['store_offset'])
+        elif checkpoint['last_window'] is None:
+            self.storage.write(df_new, self.final_dataset, time_column='timestamp')
+            store_offset = 0
+        else:
+            self.storage.replace_from(df_new, self.final_dataset, 'timestamp', df_new['timestamp'].iloc[0])
+            store_offset = 0
+
+        # The next run starts from the first raw line of the last 5-min window
+        # Następne uruchomienie zaczyna od pierwszej surowej linii ostatniego okna 5 min
+        last_window = df_new['timestamp'].iloc[-1]
+        first_in_window = np.argmax((raw_times >= last_window).to_numpy())
+        if len(df_new) > 1:
+            prev_total_power = df_new['Total_Power_P_ALL'].iloc[-2]
+            prev_total_power = None if pd.isna(prev_total_power) else float(prev_total_power)
         else:
-            return row["Instant_Power_Pdc"]
+            prev_total_power = checkpoint['prev_total_power']
+
+        self._save_checkpoint({
+            'mqtt_offset': int(line_offsets[first_in_window]),
+            'mqtt_size': int(mqtt_size),
+            'store_offset': int(store_offset),
+            'last_window': last_window.isoformat(),
+            'last_timestamp': raw_times.max().isoformat(),
+            'prev_total_power': prev_total_power,
+        })
+        print(f" Incremental ingest: {len(raw)} new MQTT rows, {len(df_new)} 5-min windows written.")
+        return df_new
+
+    def _append_csv(self, df_new, store_offset):
+        # Truncate the CSV at the reopened window and append; returns offset of the last row
+        # Obetnij CSV na ponownie otwartym oknie i dopisz; zwraca offset ostatniego wiersza
+        text = df_new.to_csv(index=False, header=store_offset == 0, lineterminator=os.linesep)
+        last_row = text.splitlines(keepends=True)[-1]
+        self.storage.truncate(self.final_dataset, store_offset)
+        with open(self.final_file, 'ab') as f:
+            f.write(text.encode())
+        return store_offset + len(text.encode()) - len(last_row.encode())
+
+    def _load_checkpoint(self):
+        # Checkpoint is valid only if the store exists and both files still have at least the recorded size
+        # Punkt kontrolny jest ważny tylko, jeśli magazyn istnieje, a oba pliki mają co najmniej zapisany rozmiar
+        if not os.path.exists(self.checkpoint_file) or not self.storage.exists(self.final_dataset):
+            return None
+        with open(self.checkpoint_file, encoding='utf-8') as f:
+            checkpoint = json.load(f)
+        if os.path.getsize(self.mqtt_csv_file) < checkpoint['mqtt_size']:
+            return None
+        if not self.storage.partitioned and os.path.getsize(self.final_file) < checkpoint['store_offset']:
+            return None
+        return checkpoint
+
+    def _save_checkpoint(self, checkpoint):
+        tmp_file = self.checkpoint_file + ".tmp"
+        with open(tmp_file, 'w', encoding='utf-8') as f:
+            json.dump(checkpoint, f, indent=2)
+        os.replace(tmp_file, self.checkpoint_file)
+
+    @staticmethod
+    def scale_power(df):
+        # Scale instant power Pdc depending on SF value (unknown SF -> no scaling)
+        # Skaluj moc chwilową Pdc w zależności od wartości SF (nieznany SF -> bez skalowania)
+        divisor = df["SF"].map(SF_DIVISORS).fillna(1)
+        return df["Instant_Power_Pdc"] / divisor
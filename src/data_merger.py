@@ -1,11 +1,27 @@
 import os
 import pandas as pd
-import numpy as np
+from storage import get_storage, dataset_name
+from instrumentation import instrumented
+from solar_features import add_time_features, add_solar_features, LATITUDE, LONGITUDE
+
+
+def local_to_utc(timestamp):
+    # Inverter timestamps are naive local time (Europe/Warsaw)
+    # Znaczniki czasu falownika to naiwny czas lokalny (Europe/Warsaw)
+    return pd.Timestamp(timestamp).tz_localize('Europe/Warsaw').tz_convert('UTC')
+
+
+def utc_to_local(timestamp):
+    return pd.Timestamp(timestamp).tz_convert('Europe/Warsaw').tz_localize(None)
+
 
 class DataMerger:
-    def __init__(self, inverter_file, solcast_file):
+    def __init__(self, inverter_file, solcast_file, latitude=LATITUDE, longitude=LONGITUDE):
         self.inverter_file = inverter_file
         self.solcast_file = solcast_file
+        # Site coordinates for the solar features / Współrzędne instalacji dla cech słonecznych
+        self.latitude = latitude
+        self.longitude = longitude
 
         # Base project directory, one level above this file's folder
         # Bazowy katalog projektu, o poziom wyżej niż folder tego pliku
@@ -21,27 +37,56 @@ class DataMerger:
         self.final_matched_file = os.path.join(self.outputs_dir, "final_matched.csv")
         self.training_data_file = os.path.join(self.outputs_dir, "training_data.csv")
 
+        # Storage backend (CSV or Parquet, see storage.py)
+        # Backend magazynu (CSV lub Parquet, patrz storage.py)
+        self.storage = get_storage()
+
+    @instrumented("merge")
     def match_and_prepare_data(self):
-        # Load data from CSV files
-        # Wczytaj dane z plików CSV
-        inverter_data = pd.read_csv(self.inverter_file)
-        solcast_data = pd.read_csv(self.solcast_file)
+        inverter_dataset = dataset_name(self.inverter_file)
+        solcast_dataset = dataset_name(self.solcast_file)
+
+        # Data ranges from the time index (no data is read here)
+        # Zakresy dat z indeksu czasu (tu nie są czytane żadne dane)
+        min_inverter, max_inverter, _ = self.storage.time_range(inverter_dataset, 'timestamp')
+        min_solcast, max_solcast, _ = self.storage.time_range(solcast_dataset, 'period_end')
+        min_inverter = local_to_utc(min_inverter)
+        max_inverter = local_to_utc(max_inverter)
+        min_solcast = pd.Timestamp(min_solcast).tz_convert('UTC')
+        max_solcast = pd.Timestamp(max_solcast).tz_convert('UTC')
+
+        print("\n=== CHECKING DATE RANGES ===")
+        print(f"Inverter: {min_inverter} → {max_inverter}")
+        print(f"Solcast : {min_solcast} → {max_solcast}")
+
+        # Load only the overlapping window: inverter rows within the Solcast range and
+        # Solcast rows within merge tolerance (3 min) of them (1 h margin for the local time zone)
+        # Wczytaj tylko wspólne okno: wiersze falownika z zakresu Solcast oraz
+        # wiersze Solcast w tolerancji łączenia (3 min) od nich (1 h zapasu na lokalną strefę czasową)
+        margin = pd.Timedelta('1h')
+        inverter_data = self.storage.read(
+            inverter_dataset, time_column='timestamp',
+            start=utc_to_local(min_solcast - margin), end=utc_to_local(max_solcast + margin)
+        )
+        if max(min_inverter, min_solcast) <= min(max_inverter, max_solcast):
+            solcast_data = self.storage.read(
+                solcast_dataset, time_column='period_end',
+                start=max(min_inverter, min_solcast) - pd.Timedelta('3min'),
+                end=min(max_inverter, max_solcast) + pd.Timedelta('3min')
+            )
+        else:
+            solcast_data = self.storage.read(solcast_dataset, time_column='period_end')
 
         # Convert timestamps to datetime and localize/convert timezones
         # Konwersja czasów i zmiana stref czasowych
         inverter_data['timestamp'] = pd.to_datetime(inverter_data['timestamp'])
-        inverter_data['timestamp'] = inverter_data['timestamp'].dt.tz_localize('Europe/Warsaw').dt.tz_convert('UTC')
+        # 5-min windows in the DST gap or the repeated hour (2-3 AM, no production) are dropped
+        # Okna 5 min w przerwie lub powtórzonej godzinie przy zmianie czasu (2-3 w nocy, brak produkcji) są usuwane
+        inverter_data['timestamp'] = inverter_data['timestamp'].dt.tz_localize(
+            'Europe/Warsaw', ambiguous='NaT', nonexistent='NaT').dt.tz_convert('UTC')
+        inverter_data = inverter_data[inverter_data['timestamp'].notna()]
         solcast_data['period_end'] = pd.to_datetime(solcast_data['period_end'], utc=True)
 
-        # Data ranges
-        # Zakresy dat
-        min_solcast = solcast_data['period_end'].min()
-        max_solcast = solcast_data['period_end'].max()
-
-        print("\n=== CHECKING DATE RANGES ===")
-        print(f"Inverter: {inverter_data['timestamp'].min()} → {inverter_data['timestamp'].max()}")
-        print(f"Solcast : {min_solcast} → {max_solcast}")
-
         # Limit inverter data to Solcast date range
         # Ogranicz dane falownika do zakresu dat Solcast
         inverter_data = inverter_data[
@@ -93,16 +138,13 @@ class DataMerger:
         # Dołącz dane o energii do połączonych danych
         merged_data = merged_data.join([energy_15min]).reset_index()
 
-        # Create time-based features
-        # Utwórz cechy czasowe
-        merged_data['hour_decimal'] = merged_data['timestamp'].dt.hour + merged_data['timestamp'].dt.minute / 60
-        merged_data['day_of_year'] = merged_data['timestamp'].dt.dayofyear
-        merged_data['sin_hour'] = np.sin(2 * np.pi * merged_data['hour_decimal'] / 24)
-        merged_data['cos_hour'] = np.cos(2 * np.pi * merged_data['hour_decimal'] / 24)
+        # Create time-based features (the same code as at prediction time, see solar_features.py)
+        # Utwórz cechy czasowe (ten sam kod co przy predykcji, patrz solar_features.py)
+        add_time_features(merged_data, 'timestamp')
 
         # Save full matched data
         # Zapisz pełne dane po dopasowaniu
-        merged_data.to_csv(self.final_matched_file, index=False)
+        self.storage.write(merged_data, dataset_name(self.final_matched_file), time_column='timestamp')
 
         # Create training dataset - only rows with ghi and energy available
         # Stwórz zbiór treningowy - tylko tam, gdzie dostępne są GHI i energia
@@ -111,9 +153,17 @@ class DataMerger:
             (merged_data['energy_15min_kWh'].notna())
         ][[
             'timestamp', 'ghi', 'air_temp', 'sin_hour', 'cos_hour', 'day_of_year', 'energy_15min_kWh'
+        ]].copy()
+
+        # Solar features only for the training rows - final_matched keeps its columns (smaller file to write)
+        # Cechy słoneczne tylko dla wierszy treningowych - final_matched zachowuje swoje kolumny (mniejszy zapis)
+        add_solar_features(training_data, 'timestamp', self.latitude, self.longitude)
+        training_data = training_data[[
+            'timestamp', 'ghi', 'air_temp', 'sin_hour', 'cos_hour', 'day_of_year',
+            'cos_zenith', 'clear_sky_ghi', 'clear_sky_index', 'energy_15min_kWh'
         ]]
 
-        training_data.to_csv(self.training_data_file, index=False)
+        self.storage.write(training_data, dataset_name(self.training_data_file), time_column='timestamp')
 
         print(f" Training data saved: {len(training_data)} records")
 
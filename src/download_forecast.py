@@ -1,76 +1,105 @@
 from dotenv import load_dotenv
 load_dotenv()
 
-import requests
 import pandas as pd
-from datetime import datetime
 import os
+import sys
+from storage import get_storage, dataset_name
+
+# Default installation coordinates (single-site mode); multi-site runs use sites.json (see batch_forecast.py)
+# Domyślne współrzędne instalacji (tryb jednej instalacji); wiele instalacji - sites.json (patrz batch_forecast.py)
+LATITUDE = 51.334660
+LONGITUDE = 16.860879
+OUTPUT_PARAMETERS = "ghi,air_temp"
+PERIOD = "PT15M"
 
-def download_solcast_forecast():
-    """
-    Downloads forecast data from Solcast (online) and saves it to the 'data/' folder
-    in the main project directory.
-    Pobiera dane prognozy z Solcast (online) i zapisuje do folderu 'data/' w katalogu głównym projektu.
-    """
 
-    API_KEY = os.getenv("SOLCAST_API_KEY")
-    if not API_KEY:
-        raise ValueError(" Missing API key. Set the SOLCAST_API_KEY environment variable or create a .env file")
+def site_key(latitude, longitude):
+    # Site identifier in the forecast archive: coordinates rounded to ~10 m
+    # Identyfikator instalacji w archiwum prognoz: współrzędne zaokrąglone do ~10 m
+    return f"{latitude:.4f}_{longitude:.4f}"
 
-    latitude = 51.334660
-    longitude = 16.860879
 
-    url = (
-        f"https://api.solcast.com.au/data/forecast/radiation_and_weather?"
-        f"latitude={latitude}&longitude={longitude}"
-        f"&output_parameters=ghi,air_temp"
-        f"&format=json&period=PT15M"
-    )
+def fetch_solcast_forecast(latitude=LATITUDE, longitude=LONGITUDE, force_refresh=False):
+    """
+    Returns the Solcast forecast for given coordinates as a DataFrame sorted by period_end
+    (None on error or empty response). A cached forecast younger than FORECAST_CACHE_TTL_MIN is reused
+    without a network call unless force_refresh is set; downloaded forecasts are added to the cache.
+    Zwraca prognozę Solcast dla podanych współrzędnych jako DataFrame posortowany po period_end
+    (None przy błędzie lub pustej odpowiedzi). Prognoza z cache młodsza niż FORECAST_CACHE_TTL_MIN jest używana
+    bez zapytania sieciowego, chyba że ustawiono force_refresh; pobrane prognozy trafiają do cache.
+    """
+    from forecast_cache import ForecastCache
+
+    cache = ForecastCache()
+    params = f"{OUTPUT_PARAMETERS}_{PERIOD}"
+    if not force_refresh:
+        df = cache.get(latitude, longitude, params)
+        if df is not None:
+            return df
 
-    headers = {
-        "Authorization": f"Bearer {API_KEY}"
-    }
+    from solcast_client import get_client, SolcastError  # imported only for online mode / tylko w trybie online
 
-    response = requests.get(url, headers=headers)
+    client = get_client()
+    try:
+        forecast = client.forecast(latitude, longitude, OUTPUT_PARAMETERS, PERIOD)
+    except SolcastError as e:
+        print(f"Download error: {e.status}")  # Błąd pobierania
+        print(e.body if e.body is not None else e)
+        return None
 
-    if response.status_code == 200:
-        print("Forecast data downloaded successfully.")  # Prognoza pobrana poprawnie.
-        data = response.json()
-        forecast = data.get("forecasts", [])
+    print("Forecast data downloaded successfully.")  # Prognoza pobrana poprawnie.
+    if forecast:
+        df = pd.DataFrame(forecast)
+        df['period_end'] = pd.to_datetime(df['period_end'])
+        df = df.sort_values("period_end")
+        cache.put(latitude, longitude, params, df)
+
+        # Every downloaded issue also goes to the deduplicated forecast archive (see forecast_archive.py)
+        # Każde pobrane wydanie trafia też do archiwum prognoz bez duplikatów (patrz forecast_archive.py)
+        # An archive failure must not lose the forecast that was just downloaded
+        # Błąd archiwum nie może spowodować utraty właśnie pobranej prognozy
+        from forecast_archive import ForecastArchive
+        try:
+            ForecastArchive().append(df, site_key(latitude, longitude))
+        except Exception as e:
+            print(f" Could not archive the forecast: {type(e).__name__}: {e}")  # Nie udało się zarchiwizować prognozy
+        return df
+    else:
+        print("No forecast data found in response.")  # Brak danych prognozy w odpowiedzi.
+        return None
 
-        if forecast:
-            df = pd.DataFrame(forecast)
-            df['period_end'] = pd.to_datetime(df['period_end'])
-            df = df.sort_values("period_end")
 
-            # Set main project directory (parent of src folder)
-            # Ustal katalog główny projektu (nadrzędny względem folderu src)
-            current_dir = os.path.dirname(os.path.abspath(__file__))
-            parent_dir = os.path.dirname(current_dir)
-            data_dir = os.path.join(parent_dir, "data")
-            os.makedirs(data_dir, exist_ok=True)
+def download_solcast_forecast(force_refresh=False):
+    """
+    Downloads forecast data from Solcast (online, or from the forecast cache when still fresh)
+    and saves it to the 'data/' folder in the main project directory.
+    Pobiera dane prognozy z Solcast (online lub z cache, jeśli jest świeża)
+    i zapisuje do folderu 'data/' w katalogu głównym projektu.
+    """
+    df = fetch_solcast_forecast(force_refresh=force_refresh)
+    if df is None:
+        return None
 
-            main_file = os.path.join(data_dir, "solcast_forecast.csv")
+    # Set main project directory (parent of src folder)
+    # Ustal katalog główny projektu (nadrzędny względem folderu src)
+    current_dir = os.path.dirname(os.path.abspath(__file__))
+    parent_dir = os.path.dirname(current_dir)
+    data_dir = os.path.join(parent_dir, "data")
+    os.makedirs(data_dir, exist_ok=True)
 
-            # Backup path with timestamp (date + hour + minute + second)
-            # Pełna ścieżka kopii zapasowej z timestampem (data + godzina + minuty + sekundy)
-            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-            backup_file = os.path.join(data_dir, f"solcast_forecast_backup_{timestamp}.csv")
+    main_dataset = os.path.join(data_dir, "solcast_forecast")
 
-            df.to_csv(main_file, index=False)
-            df.to_csv(backup_file, index=False)
+    # Save as CSV or Parquet, depending on STORAGE_BACKEND
+    # (earlier forecasts are kept in data/forecast_cache/ instead of timestamped backup files)
+    # Zapisz jako CSV lub Parquet, zależnie od STORAGE_BACKEND
+    # (wcześniejsze prognozy są przechowywane w data/forecast_cache/ zamiast plików kopii z timestampem)
+    storage = get_storage()
+    storage.write(df, main_dataset, time_column='period_end')
 
-            print(f"Data saved to: {main_file}")
-            print(f"Backup saved to: {backup_file}")
+    print(f"Data saved to: {storage.path(main_dataset)}")
 
-            return df
-        else:
-            print("No forecast data found in response.")  # Brak danych prognozy w odpowiedzi.
-            return None
-    else:
-        print(f"Download error: {response.status_code}")  # Błąd pobierania
-        print(response.text)
-        return None
+    return df
 
 def download_solcast_forecast_demo():
     """
@@ -83,10 +112,11 @@ def download_solcast_forecast_demo():
     data_dir = os.path.join(parent_dir, "data")
 
     demo_file = os.path.join(data_dir, "solcast_forecast_2025-07-25_demo.csv")
-    if not os.path.exists(demo_file):
+    storage = get_storage()
+    if not storage.exists(dataset_name(demo_file)) and not os.path.exists(demo_file):
         raise FileNotFoundError(f"Demo file does not exist: {demo_file}")
     print(" [DEMO] Loading data from local demo file...")
-    df = pd.read_csv(demo_file)
+    df = storage.read(dataset_name(demo_file))
     print(f"Loaded {len(df)} records from demo file.")
     return df
 
@@ -96,4 +126,4 @@ if __name__ == "__main__":
     if USE_DEMO:
         download_solcast_forecast_demo()
     else:
-        download_solcast_forecast()
+        download_solcast_forecast(force_refresh="--force-refresh" in sys.argv)
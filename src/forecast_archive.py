@@ -0,0 +1,256 @@
+"""
+Append-only archive of issued Solcast forecasts, keyed by (site, issue_time, period_end).
+Consecutive forecasts overlap by most of their rows, so a row is stored only when its values differ
+from the previous issue for the same period; any issue is reconstructed "as of" its issue time.
+Data is kept as zstd-compressed Parquet, partitioned by issue month: data/forecast_archive/month=YYYY-MM/
+
+Archiwum wydanych prognoz Solcast (tylko dopisywanie), z kluczem (site, issue_time, period_end).
+Kolejne prognozy pokrywają się w większości wierszy, więc wiersz jest zapisywany tylko wtedy, gdy jego wartości
+różnią się od poprzedniego wydania dla tego samego okresu; każde wydanie jest odtwarzane "na chwilę" wydania.
+Dane są przechowywane jako Parquet z kompresją zstd, podzielone według miesiąca wydania.
+
+Usage / Użycie:
+    python forecast_archive.py import "../data/solcast_forecast_backup_*.csv"   # import old backup files
+    python forecast_archive.py compact                                        # merge small part files
+    python forecast_archive.py stats
+"""
+
+import os
+import sys
+import glob
+import threading
+from datetime import datetime
+import pandas as pd
+import pyarrow as pa
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from storage import get_storage, dataset_name, _load_json, _save_json
+
+# Set base directory of the project (parent to src folder)
+# Ustal katalog główny projektu (nadrzędny względem folderu src)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+ARCHIVE_DIR = os.path.join(BASE_DIR, "data", "forecast_archive")
+
+TIMESTAMP_TYPE = pa.timestamp("us", tz="UTC")
+COMPACT_AFTER_PARTS = 48
+
+# Guards the issue list - batch_forecast archives sites from parallel threads
+# Chroni listę wydań - batch_forecast archiwizuje prognozy z równoległych wątków
+_archive_lock = threading.Lock()
+
+
+class ForecastArchive:
+    def __init__(self, archive_dir=ARCHIVE_DIR):
+        self.archive_dir = archive_dir
+        # Files starting with "_" are skipped by Parquet dataset discovery
+        # Pliki zaczynające się od "_" są pomijane przy wykrywaniu plików zbioru Parquet
+        self.issues_file = os.path.join(archive_dir, "_issues.json")
+
+    def append(self, df, site, issue_time=None):
+        """
+        Archives one issued forecast (period_end + value columns). Returns the number of stored rows,
+        i.e. periods that are new or changed since the previous issue for this site.
+        Archiwizuje jedną wydaną prognozę (period_end + kolumny wartości). Zwraca liczbę zapisanych wierszy,
+        czyli okresów nowych lub zmienionych od poprzedniego wydania dla tej instalacji.
+        """
+        issue_time = _utc(issue_time if issue_time is not None else pd.Timestamp.now(tz="UTC"))
+        df = _normalize(df)
+        if df.empty:
+            return 0
+        value_columns = [c for c in df.columns if c != "period_end"]
+        first_period, last_period = df["period_end"].min(), df["period_end"].max()
+
+        with _archive_lock:
+            issues = self._load_issues()
+            site_issues = [pd.Timestamp(i["issue_time"]) for i in issues if i["site"] == site]
+            if site_issues and issue_time <= max(site_issues):
+                if issue_time in site_issues:
+                    return 0  # already archived / już zarchiwizowane
+                raise ValueError(f" Archive is append-only: issue {issue_time} is older than the last one for {site}")
+
+            # Keep only periods that are new or whose values changed since the previous issue
+            # Zostaw tylko okresy nowe lub te, których wartości zmieniły się od poprzedniego wydania
+            previous = self._as_of(site, issue_time, first_period, last_period)
+            if not previous.empty:
+                merged = df.merge(previous, on="period_end", how="left", suffixes=("", "_prev"), indicator=True)
+                changed = merged["_merge"] == "left_only"
+                for column in value_columns:
+                    if column + "_prev" not in merged:
+                        changed[:] = True
+                        break
+                    new, old = merged[column], merged[column + "_prev"]
+                    changed |= (new != old) & ~(new.isna() & old.isna())
+                df = df[changed.to_numpy()]
+
+            if not df.empty:
+                self._write_part(df, site, issue_time)
+
+            issues.append({
+                "site": site,
+                "issue_time": issue_time.isoformat(),
+                "first_period": first_period.isoformat(),
+                "last_period": last_period.isoformat(),
+                "stored_rows": int(len(df)),
+            })
+            _save_json(self.issues_file, issues)
+        return len(df)
+
+    def issued_at(self, issue_time, site):
+        """
+        Forecast as it was issued at (or last before) issue_time - "what did we know at T".
+        Prognoza w postaci wydanej o issue_time (lub ostatnio przed nim) - "co wiedzieliśmy w chwili T".
+        """
+        issue_time = _utc(issue_time)
+        candidates = [i for i in self._load_issues() if i["site"] == site and pd.Timestamp(i["issue_time"]) <= issue_time]
+        if not candidates:
+            return pd.DataFrame()
+        issue = max(candidates, key=lambda i: pd.Timestamp(i["issue_time"]))
+        df = self._as_of(site, pd.Timestamp(issue["issue_time"]), pd.Timestamp(issue["first_period"]),
+                         pd.Timestamp(issue["last_period"]))
+        df["issue_time"] = pd.Timestamp(issue["issue_time"])
+        return df
+
+    def latest(self, site, start, end=None):
+        """
+        Latest forecast for period(s) start..end (end defaults to start). The returned issue_time is
+        the issue in which the value was first published.
+        Najnowsza prognoza dla okresu (okresów) start..end. Zwrócony issue_time to wydanie,
+        w którym wartość została opublikowana po raz pierwszy.
+        """
+        start = _utc(start)
+        end = _utc(end) if end is not None else start
+        return self._as_of(site, None, start, end, keep_issue_time=True)
+
+    def issues(self, site=None):
+        issues = pd.DataFrame(self._load_issues())
+        if site is not None and not issues.empty:
+            issues = issues[issues["site"] == site]
+        return issues
+
+    def compact(self):
+        """
+        Merges part files of each month into one sorted file (fewer files, better compression and pruning).
+        Łączy pliki części każdego miesiąca w jeden posortowany plik (mniej plików, lepsza kompresja i filtrowanie).
+        """
+        with _archive_lock:
+            for month_dir in sorted(glob.glob(os.path.join(self.archive_dir, "month=*"))):
+                self._compact_month(month_dir)
+
+    def stats(self):
+        issues = self.issues()
+        files = glob.glob(os.path.join(self.archive_dir, "month=*", "*.parquet"))
+        return {
+            "issues": len(issues),
+            "sites": int(issues["site"].nunique()) if len(issues) else 0,
+            "stored_rows": int(issues["stored_rows"].sum()) if len(issues) else 0,
+            "files": len(files),
+            "size_kB": round(sum(os.path.getsize(f) for f in files) / 1024, 1),
+        }
+
+    def _as_of(self, site, issue_time, start, end, keep_issue_time=False):
+        # Newest stored value per period among issues up to issue_time (None = all issues)
+        # Najnowsza zapisana wartość dla każdego okresu spośród wydań do issue_time (None = wszystkie)
+        if not glob.glob(os.path.join(self.archive_dir, "month=*", "*.parquet")):
+            return pd.DataFrame(columns=["period_end"])
+        condition = ((ds.field("site") == site) &
+                     (ds.field("period_end") >= _scalar(start)) & (ds.field("period_end") <= _scalar(end)))
+        if issue_time is not None:
+            condition &= ds.field("issue_time") <= _scalar(issue_time)
+        dataset = ds.dataset(self.archive_dir, format="parquet", partitioning="hive")
+        df = dataset.to_table(filter=condition).to_pandas()
+        df = df.drop(columns=["site", "month"]).sort_values(["period_end", "issue_time"], kind="stable")
+        df = df.drop_duplicates("period_end", keep="last").reset_index(drop=True)
+        if not keep_issue_time:
+            df = df.drop(columns=["issue_time"])
+        return df
+
+    def _compact_month(self, month_dir):
+        parts = sorted(glob.glob(os.path.join(month_dir, "*.parquet")))
+        if len(parts) < 2:
+            return
+        table = pa.concat_tables([pq.read_table(p) for p in parts], promote_options="default")
+        table = table.sort_by([("site", "ascending"), ("period_end", "ascending"), ("issue_time", "ascending")])
+        target = os.path.join(month_dir, "compacted.parquet")
+        pq.write_table(table, target + ".tmp", compression="zstd", row_group_size=100_000)
+        for p in parts:
+            os.remove(p)
+        os.replace(target + ".tmp", target)
+        print(f" Compacted {len(parts)} files in {os.path.basename(month_dir)}")  # Połączono pliki
+
+    def _write_part(self, df, site, issue_time):
+        month_dir = os.path.join(self.archive_dir, f"month={issue_time.strftime('%Y-%m')}")
+        os.makedirs(month_dir, exist_ok=True)
+        df = df.assign(site=site, issue_time=issue_time)
+        table = pa.Table.from_pandas(df[["site", "issue_time"] + list(df.columns[:-2])], preserve_index=False)
+        table = table.cast(table.schema.set(1, pa.field("issue_time", TIMESTAMP_TYPE))
+                           .set(2, pa.field("period_end", TIMESTAMP_TYPE)))
+        part = os.path.join(month_dir, f"part-{site}-{issue_time.strftime('%Y%m%dT%H%M%S')}.parquet")
+        pq.write_table(table, part, compression="zstd")
+
+        # Merge small part files regularly, so reads do not have to open hundreds of files
+        # Regularnie łącz małe pliki części, aby odczyt nie musiał otwierać setek plików
+        if len(glob.glob(os.path.join(month_dir, "*.parquet"))) >= COMPACT_AFTER_PARTS:
+            self._compact_month(month_dir)
+
+    def _load_issues(self):
+        return _load_json(self.issues_file) or []
+
+
+def _utc(timestamp):
+    timestamp = pd.Timestamp(timestamp)
+    return timestamp.tz_localize("UTC") if timestamp.tzinfo is None else timestamp.tz_convert("UTC")
+
+
+def _scalar(timestamp):
+    return pa.scalar(_utc(timestamp), type=TIMESTAMP_TYPE)
+
+
+def _normalize(df):
+    # period_end in UTC plus numeric value columns as float32; the constant "period" column is dropped
+    # period_end w UTC i numeryczne kolumny wartości jako float32; stała kolumna "period" jest usuwana
+    df = df.drop(columns=["period"], errors="ignore").copy()
+    df["period_end"] = pd.to_datetime(df["period_end"], utc=True)
+    value_columns = [c for c in df.columns if c != "period_end"]
+    df[value_columns] = df[value_columns].apply(pd.to_numeric, errors="coerce").astype("float32")
+    df = df.sort_values("period_end").drop_duplicates("period_end", keep="last")
+    return df[["period_end"] + value_columns].reset_index(drop=True)
+
+
+def import_backups(pattern, site):
+    """
+    Imports old solcast_forecast_backup_<YYYY-MM-DD_HH-MM-SS> files (CSV or Parquet) in issue order.
+    Importuje stare pliki solcast_forecast_backup_<RRRR-MM-DD_GG-MM-SS> (CSV lub Parquet) w kolejności wydań.
+    """
+    archive = ForecastArchive()
+    storage = get_storage()
+    files = []
+    for path in glob.glob(pattern):
+        stamp = os.path.basename(dataset_name(path)).replace("solcast_forecast_backup_", "")
+        try:
+            issued = datetime.strptime(stamp, "%Y-%m-%d_%H-%M-%S")
+        except ValueError:
+            print(f" Skipping {path}: no issue time in file name")  # Pomijam plik bez czasu wydania w nazwie
+            continue
+        # Backup names use local time / Nazwy kopii używają czasu lokalnego
+        files.append((pd.Timestamp(issued).tz_localize("Europe/Warsaw", ambiguous=True), path))
+
+    raw_rows = stored_rows = 0
+    for issued, path in sorted(files):
+        df = storage.read(dataset_name(path))
+        raw_rows += len(df)
+        stored_rows += archive.append(df, site, issued)
+    print(f" Imported {len(files)} forecasts: {raw_rows} rows, {stored_rows} stored after deduplication")
+
+
+if __name__ == "__main__":
+    from download_forecast import LATITUDE, LONGITUDE, site_key
+
+    command = sys.argv[1] if len(sys.argv) > 1 else "stats"
+    if command == "import" and len(sys.argv) == 3:
+        import_backups(sys.argv[2], site_key(LATITUDE, LONGITUDE))
+    elif command == "compact":
+        ForecastArchive().compact()
+    elif command == "stats":
+        print(ForecastArchive().stats())
+    else:
+        print(__doc__)
@@ -0,0 +1,111 @@
+"""
+Local cache of downloaded Solcast forecasts.
+Entries are keyed by site (coordinates), request parameters and issue time (download time);
+a forecast younger than the TTL is reused without a network call. Old entries are evicted by age
+and, above the entry limit, least recently used first.
+
+Lokalna pamięć podręczna pobranych prognoz Solcast.
+Wpisy są identyfikowane przez instalację (współrzędne), parametry zapytania i czas wydania (pobrania);
+prognoza młodsza niż TTL jest używana ponownie bez zapytania sieciowego. Stare wpisy są usuwane według wieku,
+a po przekroczeniu limitu wpisów - najdawniej używane jako pierwsze.
+"""
+
+import os
+import time
+import threading
+import pandas as pd
+from storage import get_storage, _load_json, _save_json
+
+# Set base directory of the project (parent to src folder)
+# Ustal katalog główny projektu (nadrzędny względem folderu src)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CACHE_DIR = os.path.join(BASE_DIR, "data", "forecast_cache")
+
+TTL_MINUTES = float(os.getenv("FORECAST_CACHE_TTL_MIN", "30"))
+MAX_AGE_HOURS = float(os.getenv("FORECAST_CACHE_MAX_AGE_H", "72"))
+MAX_ENTRIES = int(os.getenv("FORECAST_CACHE_MAX_ENTRIES", "100"))
+
+# Guards the index file - batch_forecast fetches sites in parallel threads
+# Chroni plik indeksu - batch_forecast pobiera prognozy w równoległych wątkach
+_index_lock = threading.Lock()
+
+
+class ForecastCache:
+    def __init__(self, cache_dir=CACHE_DIR, ttl_minutes=TTL_MINUTES, max_age_hours=MAX_AGE_HOURS,
+                 max_entries=MAX_ENTRIES):
+        self.cache_dir = cache_dir
+        self.index_file = os.path.join(cache_dir, "index.json")
+        self.ttl = ttl_minutes * 60
+        self.max_age = max_age_hours * 3600
+        self.max_entries = max_entries
+        self.storage = get_storage()
+
+    def get(self, latitude, longitude, params):
+        """
+        Returns the newest cached forecast younger than the TTL, or None.
+        Zwraca najnowszą prognozę z pamięci podręcznej młodszą niż TTL albo None.
+        """
+        site = _site_key(latitude, longitude, params)
+        now = time.time()
+        with _index_lock:
+            index = self._load_index()
+            fresh = [e for e in index.values() if e["site"] == site and now - e["issued_at"] < self.ttl]
+            if not fresh:
+                return None
+            entry = max(fresh, key=lambda e: e["issued_at"])
+            entry["last_used"] = now
+            _save_json(self.index_file, index)
+
+        path = os.path.join(self.cache_dir, entry["dataset"])
+        try:
+            df = self.storage.read(path, time_column="period_end")
+            df["period_end"] = pd.to_datetime(df["period_end"], utc=True)
+        except (OSError, ValueError, KeyError) as e:
+            # A missing or damaged dataset is a cache miss - its entry is dropped and the forecast downloaded again
+            # Brakujący lub uszkodzony zbiór to brak trafienia - wpis jest usuwany, a prognoza pobierana ponownie
+            print(f" Cached forecast {entry['dataset']} is unreadable ({e}) - dropping it.")
+            with _index_lock:
+                index = self._load_index()
+                index.pop(entry["dataset"], None)
+                _save_json(self.index_file, index)
+            self.storage.delete(path)
+            return None
+        age_min = (now - entry["issued_at"]) / 60
+        print(f" Using cached forecast issued {age_min:.0f} min ago ({entry['dataset']}).")  # Prognoza z cache
+        return df
+
+    def put(self, latitude, longitude, params, df):
+        site = _site_key(latitude, longitude, params)
+        now = time.time()
+        dataset = f"forecast_{site}_{time.strftime('%Y-%m-%d_%H-%M-%S', time.localtime(now))}"
+        os.makedirs(self.cache_dir, exist_ok=True)
+        self.storage.write(df, os.path.join(self.cache_dir, dataset), time_column="period_end")
+
+        with _index_lock:
+            index = self._load_index()
+            index[dataset] = {
+                "dataset": dataset, "site": site, "latitude": latitude, "longitude": longitude,
+                "params": params, "issued_at": now, "last_used": now,
+            }
+            self._evict(index, now)
+            _save_json(self.index_file, index)
+
+    def _evict(self, index, now):
+        # Drop entries older than max age, then least recently used ones above the entry limit
+        # Usuń wpisy starsze niż maksymalny wiek, a potem najdawniej używane ponad limit wpisów
+        expired = [key for key, e in index.items() if now - e["issued_at"] > self.max_age]
+        by_use = sorted((key for key in index if key not in expired), key=lambda key: index[key]["last_used"])
+        expired += by_use[:max(0, len(by_use) - self.max_entries)]
+        for key in expired:
+            self.storage.delete(os.path.join(self.cache_dir, index.pop(key)["dataset"]))
+        if expired:
+            print(f" Evicted {len(expired)} old forecasts from cache.")  # Usunięto stare prognozy z cache
+
+    def _load_index(self):
+        return _load_json(self.index_file) or {}
+
+
+def _site_key(latitude, longitude, params):
+    # Readable key: coordinates rounded to ~10 m plus request parameters
+    # Czytelny klucz: współrzędne zaokrąglone do ~10 m i parametry zapytania
+    return f"{latitude:.4f}_{longitude:.4f}_{params.replace(',', '-')}"
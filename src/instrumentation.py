@@ -0,0 +1,211 @@
+"""
+Lightweight per-stage instrumentation of the pipeline: wall time, CPU time, peak memory (RSS) and
+input/output row counts of every stage (clean, pivot, resample, merge, train, predict, aggregate, plot).
+Each finished stage is appended as one JSON line to METRICS_LOG; with PROMETHEUS_FILE set, the latest
+values per stage are also written in the Prometheus text format (node_exporter textfile collector).
+
+Lekka instrumentacja etapów potoku: czas rzeczywisty, czas CPU, szczytowa pamięć (RSS) oraz liczba
+wierszy wejściowych/wyjściowych każdego etapu. Każdy zakończony etap jest dopisywany jako jedna linia JSON
+do METRICS_LOG; przy ustawionym PROMETHEUS_FILE ostatnie wartości każdego etapu są też zapisywane
+w formacie tekstowym Prometheus (kolektor plików tekstowych node_exporter).
+
+Usage / Użycie:
+    @instrumented("predict")
+    def predict(self, forecast_df): ...
+
+    with stage("download") as s:
+        df = ...
+        s.rows_out = len(df)
+"""
+
+import os
+import sys
+import json
+import time
+import threading
+import functools
+from datetime import datetime, timezone
+from dotenv import load_dotenv
+
+try:
+    import resource  # Unix only / tylko Unix
+except ImportError:
+    resource = None
+
+load_dotenv()  # załaduj zmienne środowiskowe / load environment variables
+
+# Set base directory of the project (parent to src folder)
+# Ustal katalog główny projektu (nadrzędny względem folderu src)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Empty METRICS_LOG disables the JSON log / Pusty METRICS_LOG wyłącza log JSON
+METRICS_LOG = os.getenv("METRICS_LOG", os.path.join(BASE_DIR, "outputs", "pipeline_metrics.jsonl"))
+PROMETHEUS_FILE = os.getenv("PROMETHEUS_FILE", "")
+
+# One id per process run, to group the stages of one pipeline run in the log
+# Jeden identyfikator na uruchomienie procesu, grupujący etapy jednego przebiegu w logu
+RUN_ID = f"{datetime.now().strftime('%Y%m%d-%H%M%S')}-{os.getpid()}"
+
+PROMETHEUS_METRICS = {
+    "wall_seconds": "Wall time of the last run of the pipeline stage",
+    "cpu_seconds": "CPU time of the last run of the pipeline stage",
+    "peak_rss_mb": "Peak resident memory during the last run of the pipeline stage",
+    "rows_in": "Input rows of the last run of the pipeline stage",
+    "rows_out": "Output rows of the last run of the pipeline stage",
+}
+
+# Guards the log and Prometheus files - batch_forecast runs stages in parallel threads
+# Chroni pliki logu i Prometheus - batch_forecast uruchamia etapy w równoległych wątkach
+_write_lock = threading.Lock()
+
+
+class PeakRSS:
+    """
+    Peak resident memory while the block runs, sampled from /proc/self/statm (Linux); elsewhere
+    the process-wide peak from getrusage is reported, and None where neither exists (Windows).
+    Szczytowa pamięć rezydentna podczas wykonywania bloku, próbkowana z /proc/self/statm (Linux);
+    w innych systemach podawane jest szczytowe RSS całego procesu z getrusage, a None, gdy brak obu (Windows).
+    """
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.start_mb = 0.0
+        self.peak_mb = 0.0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def __enter__(self):
+        if os.path.exists("/proc/self/statm"):
+            self._page_mb = os.sysconf("SC_PAGE_SIZE") / 2 ** 20
+            self._sample()
+            self.start_mb = self.peak_mb
+            self._thread = threading.Thread(target=self._run, daemon=True)
+            self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        if self._thread is not None:
+            self._stop.set()
+            self._thread.join()
+            self._sample()
+        elif resource is None:
+            self.start_mb = self.peak_mb = None
+        else:
+            # ru_maxrss is in kB on Linux and bytes on macOS / ru_maxrss jest w kB na Linuksie, w bajtach na macOS
+            scale = 2 ** 20 if sys.platform == "darwin" else 2 ** 10
+            self.peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self._sample()
+
+    def _sample(self):
+        with open("/proc/self/statm") as f:
+            self.peak_mb = max(self.peak_mb, int(f.read().split()[1]) * self._page_mb)
+
+
+class stage:
+    """
+    Context manager measuring one pipeline stage; set rows_in / rows_out inside the block.
+    Menedżer kontekstu mierzący jeden etap potoku; rows_in / rows_out ustaw wewnątrz bloku.
+    """
+
+    def __init__(self, name, rows_in=None, **labels):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.labels = labels
+        self.record = None
+
+    def __enter__(self):
+        self._rss = PeakRSS().__enter__()
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        wall = time.perf_counter() - self._wall
+        cpu = time.process_time() - self._cpu
+        self._rss.__exit__(exc_type, exc, tb)
+        self.record = {
+            "time": datetime.now(timezone.utc).isoformat(timespec="milliseconds"),
+            "run_id": RUN_ID,
+            "stage": self.name,
+            **self.labels,
+            "wall_seconds": round(wall, 4),
+            "cpu_seconds": round(cpu, 4),
+            "peak_rss_mb": None if self._rss.peak_mb is None else round(self._rss.peak_mb, 1),
+            "rss_delta_mb": None if self._rss.peak_mb is None else round(self._rss.peak_mb - self._rss.start_mb, 1),
+            "rows_in": self.rows_in,
+            "rows_out": self.rows_out,
+            "status": "ok" if exc_type is None else "error",
+        }
+        _write(self.record)
+        return False
+
+
+def instrumented(name, rows_in=None):
+    """
+    Decorator measuring every call of the function as stage `name`. Row counts are taken from
+    the first DataFrame argument and a DataFrame result; rows_in(*args, **kwargs) can supply the input count.
+    Dekorator mierzący każde wywołanie funkcji jako etap `name`. Liczba wierszy pochodzi z pierwszego
+    argumentu DataFrame i wyniku DataFrame; rows_in(*args, **kwargs) może podać liczbę wierszy wejściowych.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            count = rows_in(*args, **kwargs) if rows_in else _rows(next(
+                (a for a in (*args, *kwargs.values()) if _rows(a) is not None), None))
+            with stage(name, rows_in=count) as s:
+                result = func(*args, **kwargs)
+                s.rows_out = _rows(result)
+            return result
+        return wrapper
+    return decorator
+
+
+def _rows(value):
+    # Row count of a DataFrame / Series / array, otherwise None
+    # Liczba wierszy DataFrame / Series / tablicy, w przeciwnym razie None
+    shape = getattr(value, "shape", None)
+    return int(shape[0]) if shape else None
+
+
+def _write(record):
+    with _write_lock:
+        if METRICS_LOG:
+            os.makedirs(os.path.dirname(os.path.abspath(METRICS_LOG)), exist_ok=True)
+            with open(METRICS_LOG, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        if PROMETHEUS_FILE:
+            _write_prometheus(record)
+
+
+def _write_prometheus(record):
+    # Keep the values of other stages already in the file and replace those of this stage
+    # Zachowaj wartości innych etapów zapisane w pliku i zastąp wartości tego etapu
+    values = {}
+    if os.path.exists(PROMETHEUS_FILE):
+        with open(PROMETHEUS_FILE, encoding="utf-8") as f:
+            for line in f:
+                if line.startswith("pv_pipeline_") and "{" in line:
+                    key, value = line.rsplit(" ", 1)
+                    values[key] = value.strip()
+    for metric in PROMETHEUS_METRICS:
+        if record[metric] is not None:
+            values[f'pv_pipeline_{metric}{{stage="{record["stage"]}"}}'] = str(record[metric])
+    values[f'pv_pipeline_last_run_timestamp_seconds{{stage="{record["stage"]}"}}'] = f"{time.time():.0f}"
+
+    lines = []
+    help_texts = {**PROMETHEUS_METRICS, "last_run_timestamp_seconds": "Unix time of the last run of the pipeline stage"}
+    for metric, help_text in help_texts.items():
+        lines += [f"# HELP pv_pipeline_{metric} {help_text}", f"# TYPE pv_pipeline_{metric} gauge"]
+        lines += [f"{key} {value}" for key, value in sorted(values.items())
+                  if key.startswith(f"pv_pipeline_{metric}{{")]
+
+    # Written atomically, so the collector never reads a half-written file
+    # Zapis atomowy, aby kolektor nigdy nie odczytał częściowo zapisanego pliku
+    os.makedirs(os.path.dirname(os.path.abspath(PROMETHEUS_FILE)), exist_ok=True)
+    with open(PROMETHEUS_FILE + ".tmp", "w", encoding="utf-8") as f:
+        f.write("\n".join(lines) + "\n")
+    os.replace(PROMETHEUS_FILE + ".tmp", PROMETHEUS_FILE)
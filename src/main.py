@@ -1,5 +1,12 @@
+import sys
+
+# --profile-startup prints per-module import times (must run before other imports)
+# --profile-startup wypisuje czasy importu modułów (musi działać przed innymi importami)
+if "--profile-startup" in sys.argv:
+    import startup_profile
+    startup_profile.enable()
+
 import os
-import pandas as pd
 from data_cleaner import MQTTDataCleaner
 from data_merger import DataMerger
 from model_trainer import ModelTrainer
@@ -8,6 +15,8 @@ from visualizer import Visualizer
 from datetime import datetime
 from dotenv import load_dotenv
 from download_forecast import download_solcast_forecast, download_solcast_forecast_demo  # <-- import
+from storage import CSVStorage, get_storage, dataset_name
+from numpy_model import resolve_model_path
 
 load_dotenv()  # załaduj zmienne środowiskowe, w tym USE_DEMO / load environment variables, including USE_DEMO
 
@@ -20,37 +29,48 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 mqtt_path = os.path.join(BASE_DIR, "data", "mqtt_data.csv")
 solcast_path = os.path.join(BASE_DIR, "data", "solcast_history.csv")
 inverter_output_path = os.path.join(BASE_DIR, "outputs", "inverter_data_plus_power.csv")
-model_path = os.path.join(BASE_DIR, "models", "model_trained.keras")
+models_dir = os.path.join(BASE_DIR, "models")
 scaler_path = os.path.join(BASE_DIR, "models", "production_scaler.pkl")
 
-print("\n===========================")
-print(" SPRAWDZAMY ZAKRESY DAT")  # Checking date ranges
-print("===========================\n")
 
-# Load MQTT data without header, assign column names, convert timestamps to datetime
-# Wczytaj dane MQTT bez nagłówka, nadaj nazwy kolumn, konwertuj timestamp na datetime
-mqtt = pd.read_csv(mqtt_path, header=None, names=['timestamp', 'topic', 'value'])
-mqtt['timestamp'] = pd.to_datetime(mqtt['timestamp'])
-print(f"MQTT: from {mqtt['timestamp'].min()} to {mqtt['timestamp'].max()}")
+def print_date_ranges():
+    """
+    Prints date ranges of the raw MQTT data and Solcast history (from their time indexes).
+    Wyświetla zakresy dat surowych danych MQTT i historii Solcast (z ich indeksów czasu).
+    """
+    print("\n===========================")
+    print(" SPRAWDZAMY ZAKRESY DAT")  # Checking date ranges
+    print("===========================\n")
+
+    # MQTT file has no header - assign column names
+    # Plik MQTT nie ma nagłówka - nadaj nazwy kolumn
+    mqtt_min, mqtt_max, _ = CSVStorage().time_range(dataset_name(mqtt_path), 'timestamp',
+                                               names=['timestamp', 'topic', 'value'])
+    print(f"MQTT: from {mqtt_min} to {mqtt_max}")
 
-# Load Solcast historical data and convert period_end to datetime
-# Wczytaj dane historyczne Solcast i konwertuj kolumnę period_end na datetime
-solcast = pd.read_csv(solcast_path)
-solcast['period_end'] = pd.to_datetime(solcast['period_end'])
-print(f"Solcast: from {solcast['period_end'].min()} to {solcast['period_end'].max()}\n")
+    solcast_min, solcast_max, _ = get_storage().time_range(dataset_name(solcast_path), 'period_end')
+    print(f"Solcast: from {solcast_min} to {solcast_max}\n")
 
-print("===========================\n")
+    print("===========================\n")
 
 
 def main():
+    # Incremental mode processes only MQTT data appended since the last run
+    # Tryb przyrostowy przetwarza tylko dane MQTT dopisane od ostatniego uruchomienia
+    use_incremental = os.getenv("USE_INCREMENTAL", "0") == "1"
+    if not use_incremental:
+        print_date_ranges()
+
     print(" Starting process...")  # Start procesu...
 
     # 1. Cleaning MQTT data: load, clean, pivot, rename, and resample
     # 1. Czyszczenie danych MQTT: wczytanie, oczyszczenie, przekształcenie i próbkowanie
+    # Filter, pivot, resample and scale in memory / Filtruj, przekształć, resampluj i skaluj w pamięci
     cleaner = MQTTDataCleaner(mqtt_path)
-    cleaner.load_and_clean()       # Load and clean raw MQTT data / Wczytaj i oczyść surowe dane MQTT
-    cleaner.pivot_and_rename()     # Pivot table and rename columns / Przekształć dane i zmień nazwy kolumn
-    cleaner.resample_data()        # Resample data to regular intervals / Próbkuj dane do regularnych interwałów
+    if use_incremental:
+        cleaner.run_incremental()
+    else:
+        cleaner.run()
 
     # 2. Merge inverter output data with Solcast forecast data
     # 2. Połączenie danych wyjściowych z falownika z prognozą Solcast
@@ -60,7 +80,10 @@ def main():
     # 3. Train the machine learning model using the prepared training data
     # 3. Trenowanie modelu ML na przygotowanych danych treningowych
     trainer = ModelTrainer(training_data)
-    trainer.train()  # Run the training / Uruchom trenowanie modelu
+    if os.getenv("WARM_START", "0") == "1":
+        trainer.retrain()  # Fine-tune on new data only / Douczanie tylko na nowych danych
+    else:
+        trainer.train()  # Run the training / Uruchom trenowanie modelu
 
     # --- Download Solcast forecast, either demo or online based on USE_DEMO environment variable ---
     # --- Pobieranie prognozy Solcast - demo lub online w zależności od zmiennej środowiskowej USE_DEMO ---
@@ -70,13 +93,15 @@ def main():
         forecast = download_solcast_forecast_demo()
     else:
         print(" ONLINE mode - downloading latest forecast...")  # Tryb online - pobieranie najnowszej prognozy
-        download_solcast_forecast()
+        # --force-refresh skips the forecast cache / --force-refresh pomija cache prognoz
+        download_solcast_forecast(force_refresh="--force-refresh" in sys.argv)
         forecast_path = os.path.join(BASE_DIR, "data", "solcast_forecast.csv")
-        forecast = pd.read_csv(forecast_path)
+        forecast = get_storage().read(dataset_name(forecast_path))
 
     # 4. Use the trained model to predict energy production based on forecast data
     # 4. Użycie wytrenowanego modelu do predykcji produkcji energii na podstawie prognozy
-    predictor = Predictor(model_path, scaler_path)
+    # Exported NumPy model (.npz) is used when available / Używany jest wyeksportowany model NumPy (.npz), jeśli istnieje
+    predictor = Predictor(resolve_model_path(models_dir), scaler_path)
     prediction = predictor.predict(forecast)  # Perform prediction / Wykonaj predykcję
 
     # Prepare directory to save prediction results, create if missing
@@ -87,18 +112,19 @@ def main():
     suffix = "_demo" if use_demo == "1" else ""  # Suffix for demo or live run
     timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M")  # Timestamp for filenames
 
-    # Save prediction results as CSV file
-    # Zapisz wyniki predykcji do pliku CSV
-    csv_pred = os.path.join(predictions_dir, f"forecast{suffix}_{timestamp}.csv")
-    prediction.to_csv(csv_pred, index=False)
-    print(f" Saved forecast to {csv_pred}")
+    # Save prediction results (CSV or Parquet, depending on STORAGE_BACKEND)
+    # Zapisz wyniki predykcji (CSV lub Parquet, zależnie od STORAGE_BACKEND)
+    storage = get_storage()
+    pred_dataset = os.path.join(predictions_dir, f"forecast{suffix}_{timestamp}")
+    storage.write(prediction, pred_dataset, time_column='period_end')
+    print(f" Saved forecast to {storage.path(pred_dataset)}")
 
     # Aggregate prediction to daily sums and save
     # Agreguj wyniki do sum dziennych i zapisz
     df_sum = predictor.aggregate_daily(prediction)
-    csv_sum = os.path.join(predictions_dir, f"daily_sum{suffix}_{timestamp}.csv")
-    df_sum.to_csv(csv_sum, index=False)
-    print(f" Saved daily sum to {csv_sum}")
+    sum_dataset = os.path.join(predictions_dir, f"daily_sum{suffix}_{timestamp}")
+    storage.write(df_sum, sum_dataset)
+    print(f" Saved daily sum to {storage.path(sum_dataset)}")
 
     # Generate plot for the best prediction day and save as PDF
     # Wygeneruj wykres dla najlepszego dnia prognozy i zapisz jako PDF
@@ -0,0 +1,164 @@
+"""
+Interchangeable model engines with a common interface: fit / predict / save / load.
+  keras  - MLP trained with TensorFlow, served by the NumPy forward pass (numpy_model.py)
+  hgb    - sklearn HistGradientBoostingRegressor
+  linear - ridge regression on simple physics features (irradiance × temperature derating, sun position)
+All engines take raw (unscaled) features in FEATURES order; predict returns a 1-D array.
+
+Wymienne silniki modeli ze wspólnym interfejsem: fit / predict / save / load.
+Wszystkie przyjmują surowe (nieskalowane) cechy w kolejności FEATURES; predict zwraca tablicę 1-D.
+"""
+
+import os
+from abc import ABC, abstractmethod
+import numpy as np
+import joblib
+from numpy_model import NumpyMLP, export_numpy_model
+from solar_features import FEATURES
+
+# Model file of each engine in models/ (used by numpy_model.resolve_model_path and MODEL_ENGINE)
+# Plik modelu każdego silnika w models/ (używany przez numpy_model.resolve_model_path i MODEL_ENGINE)
+MODEL_FILES = {
+    "keras": "model_trained.npz",
+    "hgb": "model_hgb.joblib",
+    "linear": "model_linear.joblib",
+}
+
+
+class ModelEngine(ABC):
+    name = None
+
+    @abstractmethod
+    def fit(self, X, y):
+        ...
+
+    @abstractmethod
+    def predict(self, X, verbose=0):
+        # verbose is accepted for compatibility with keras Model.predict
+        # verbose jest przyjmowany dla zgodności z keras Model.predict
+        ...
+
+    def save(self, path):
+        joblib.dump(self, path)
+
+    @classmethod
+    def load(cls, path):
+        return joblib.load(path)
+
+
+class KerasEngine(ModelEngine):
+    name = "keras"
+
+    def __init__(self, params=None, fast=False):
+        self.params = params
+        self.fast = fast
+        self.model = None
+        self.scaler = None
+        self.mlp = None
+
+    def fit(self, X, y):
+        from sklearn.preprocessing import StandardScaler
+        from model_trainer import ModelTrainer, DEFAULT_PARAMS, FAST_PARAMS
+
+        # Last 10% of the training rows are held out for early stopping
+        # Ostatnie 10% wierszy treningowych jest odkładane do wczesnego zatrzymania
+        X, y = np.asarray(X, dtype=float), np.asarray(y, dtype=float)
+        n_val = max(1, len(X) // 10)
+        self.scaler = StandardScaler().fit(X[:-n_val])
+        params = {**DEFAULT_PARAMS, **(FAST_PARAMS if self.fast else {}), **(self.params or {})}
+        self.model, _, _ = ModelTrainer.fit_model(
+            self.scaler.transform(X[:-n_val]), y[:-n_val], self.scaler.transform(X[-n_val:]), y[-n_val:],
+            params, self.fast, verbose=0
+        )
+        self.mlp = NumpyMLP.from_keras(self.model, self.scaler)
+        return self
+
+    def predict(self, X, verbose=0):
+        return self.mlp.predict(X).ravel()
+
+    def save(self, path):
+        # TensorFlow-free .npz (used for prediction) plus the .keras model next to it
+        # Plik .npz bez TensorFlow (używany do predykcji) oraz model .keras obok
+        export_numpy_model(self.model, self.scaler, path)
+        self.model.save(os.path.splitext(path)[0] + ".keras")
+
+    @classmethod
+    def load(cls, path):
+        engine = cls()
+        engine.mlp = NumpyMLP.load(path)
+        return engine
+
+
+class HistGBMEngine(ModelEngine):
+    name = "hgb"
+
+    def __init__(self, **params):
+        from sklearn.ensemble import HistGradientBoostingRegressor
+
+        params = {"max_iter": 300, "learning_rate": 0.05, "random_state": 42, **params}
+        self.model = HistGradientBoostingRegressor(**params)
+
+    def fit(self, X, y):
+        self.model.fit(np.asarray(X, dtype=float), np.asarray(y, dtype=float))
+        self.n_features_in_ = self.model.n_features_in_
+        return self
+
+    def predict(self, X, verbose=0):
+        return self.model.predict(np.asarray(X, dtype=float))
+
+
+class LinearEngine(ModelEngine):
+    name = "linear"
+
+    def __init__(self, alpha=1.0):
+        from sklearn.linear_model import Ridge
+        from sklearn.pipeline import make_pipeline
+        from sklearn.preprocessing import StandardScaler
+
+        self.model = make_pipeline(StandardScaler(), Ridge(alpha=alpha))
+
+    def fit(self, X, y):
+        self.n_features_in_ = np.shape(X)[1]
+        self.model.fit(physics_features(X), np.asarray(y, dtype=float))
+
+        # Scaler fused into the ridge coefficients - prediction is one dot product, without sklearn overhead
+        # Skaler wbudowany we współczynniki - predykcja to jeden iloczyn skalarny, bez narzutu sklearn
+        scaler, ridge = self.model[0], self.model[-1]
+        self.coef = ridge.coef_ / scaler.scale_
+        self.intercept = ridge.intercept_ - scaler.mean_ @ self.coef
+        return self
+
+    def predict(self, X, verbose=0):
+        return physics_features(X) @ self.coef + self.intercept
+
+
+def physics_features(X):
+    """
+    PV output is roughly proportional to irradiance, reduced at high module temperature
+    and shaped by the sun position during the day. Solar features (cos_zenith, clear_sky_ghi,
+    clear_sky_index - see solar_features.py), when present, are appended as they are.
+    Produkcja PV jest w przybliżeniu proporcjonalna do natężenia promieniowania, maleje przy wysokiej
+    temperaturze modułów i zależy od położenia słońca w ciągu dnia. Cechy słoneczne (patrz
+    solar_features.py), jeśli są, są dołączane bez zmian.
+    """
+    X = np.asarray(X, dtype=float)
+    ghi, air_temp, sin_hour, cos_hour = X[:, 0], X[:, 1], X[:, 2], X[:, 3]
+    return np.column_stack([
+        ghi,
+        ghi * air_temp,   # temperature derating / spadek sprawności z temperaturą
+        ghi * sin_hour,   # sun position / położenie słońca
+        ghi * cos_hour,
+        sin_hour,
+        cos_hour,
+        air_temp,
+        X[:, 4:],
+    ])
+
+
+ENGINES = {engine.name: engine for engine in (KerasEngine, HistGBMEngine, LinearEngine)}
+
+
+def get_engine(name, **params):
+    if name not in ENGINES:
+        raise ValueError(f" Unknown model engine: {name} (available: {', '.join(ENGINES)})")
+    return ENGINES[name](**params)
@@ -1,18 +1,50 @@
 import os
+import json
+import time
+import random
+import itertools
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
 import pandas as pd
 import numpy as np
-from sklearn.model_selection import train_test_split
-from sklearn.preprocessing import StandardScaler
-from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
-from tensorflow.keras.models import Sequential
-from tensorflow.keras.layers import Dense
-from tensorflow.keras.callbacks import EarlyStopping
 import joblib
-import matplotlib.pyplot as plt
+from numpy_model import export_numpy_model
+from instrumentation import instrumented
+from solar_features import FEATURES, features_for_inputs
+
+# TensorFlow, sklearn i matplotlib są importowane leniwie w metodach,
+# aby import tego modułu (np. przez main.py) nie spowalniał startu
+
+# Cechy wejściowe (FEATURES) pochodzą z solar_features.py - SOLAR_FEATURES=1 dodaje cechy słoneczne
+
+# Domyślne hiperparametry (dotychczasowy model 64/32, Adam, batch 16)
+DEFAULT_PARAMS = {"layers": [64, 32], "learning_rate": 0.001, "batch_size": 16}
+
+# Tryb szybkiego treningu (FAST_TRAINING=1 lub train.py --fast): duże batche, potok tf.data,
+# harmonogram learning rate (rozgrzewka + cosine decay) i kontrola wątków CPU
+FAST_PARAMS = {"batch_size": int(os.getenv("FAST_BATCH_SIZE", "256"))}
+FAST_EPOCHS = 400
+WARMUP_EPOCHS = 5
+
+# Douczanie (warm start): tylko nowe dane + próbka starszych danych ("replay")
+REPLAY_RATIO = float(os.getenv("REPLAY_RATIO", "1.0"))   # liczba starszych wierszy na jeden nowy wiersz
+FINE_TUNE_LR = 0.0002
+FINE_TUNE_EPOCHS = 50
+DRIFT_THRESHOLD = 1.5      # MAE starego modelu na nowych danych / MAE z ostatniego treningu
+ACCEPT_TOLERANCE = 0.02    # douczony model może być najwyżej o 2% gorszy od poprzedniego
+
+# Siatka przeszukiwania hiperparametrów (tryb search)
+SEARCH_GRID = {
+    "layers": [[32, 16], [64, 32], [128, 64], [64, 32, 16]],
+    "learning_rate": [0.0003, 0.001, 0.003],
+    "batch_size": [16, 64],
+}
 
 
 class ModelTrainer:
     def __init__(self, df):
+        from sklearn.preprocessing import StandardScaler
+
         self.df = df
         self.scaler = StandardScaler()
         self.model = None
@@ -24,45 +56,32 @@ class ModelTrainer:
 
     def prepare_data(self):
         # Przygotuj cechy (X) i etykiety (y) do treningu
-        X = self.df[['ghi', 'air_temp', 'sin_hour', 'cos_hour']]
+        X = self.df[FEATURES]
         y = self.df['energy_15min_kWh']
         return X, y
 
-    def build_model(self, input_dim):
-        # Buduj prostą sieć neuronową MLP
-        model = Sequential([
-            Dense(64, activation='relu', input_dim=input_dim),
-            Dense(32, activation='relu'),
-            Dense(1, activation='linear')
-        ])
-        model.compile(optimizer='adam', loss='mse')
-        return model
-
-    def train(self):
-        print(" Przygotowuję dane do treningu...")
+    def build_model(self, input_dim, layers=(64, 32), learning_rate=0.001):
+        return build_mlp(input_dim, layers, learning_rate)
+
+    def split_data(self):
+        from sklearn.model_selection import train_test_split
 
         X, y = self.prepare_data()
-        X_train, X_test, y_train, y_test = train_test_split(
-            X, y, test_size=0.2, random_state=42
-        )
+        return train_test_split(X, y, test_size=0.2, random_state=42)
 
-        X_train_scaled = self.scaler.fit_transform(X_train)
-        X_test_scaled = self.scaler.transform(X_test)
+    @instrumented("train", rows_in=lambda trainer, *args, **kwargs: len(trainer.df))
+    def train(self, params=None, fast=None):
+        fast = os.getenv("FAST_TRAINING", "0") == "1" if fast is None else fast
+        params = {**DEFAULT_PARAMS, **(FAST_PARAMS if fast else {}), **(params or {})}
+        print(" Przygotowuję dane do treningu...")
 
-        print(" Buduję model...")
-        self.model = self.build_model(input_dim=X_train_scaled.shape[1])
+        X_train, X_test, y_train, y_test = self.split_data()
 
-        print(" Start treningu...")
-        early_stop = EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True)
+        X_train_scaled = self.scaler.fit_transform(X_train)
+        X_test_scaled = self.scaler.transform(X_test)
 
-        history = self.model.fit(
-            X_train_scaled, y_train,
-            validation_data=(X_test_scaled, y_test),
-            epochs=200,
-            batch_size=16,
-            callbacks=[early_stop],
-            verbose=1
-        )
+        print(" Buduję model i startuję trening" + (" (tryb szybki)..." if fast else "..."))
+        self.model, history, _ = self.fit_model(X_train_scaled, y_train, X_test_scaled, y_test, params, fast)
 
         print(" Zapisuję model i scaler...")
         model_path = os.path.join(self.models_dir, "model_trained.keras")
@@ -73,10 +92,349 @@ class ModelTrainer:
         joblib.dump(self.scaler, scaler_path)
         print(f" Model zapisany do {model_path}")
 
+        # Eksport wag i skalera do .npz (predykcja bez TensorFlow), opcjonalnie ONNX
+        self.export_numpy()
+
         self.plot_training_history(history)
-        self.evaluate_model(X_test_scaled, y_test)
+        metrics = self.evaluate_model(X_test_scaled, y_test)
+        self.save_checkpoint(metrics["mae"], mode="full")
+
+    @instrumented("retrain", rows_in=lambda trainer, *args, **kwargs: len(trainer.df))
+    def retrain(self, replay_ratio=REPLAY_RATIO):
+        """
+        Douczanie (warm start): wczytuje model_trained.keras i skaler, douczanie tylko na danych nowszych
+        niż ostatni punkt kontrolny treningu (models/training_checkpoint.json) oraz losowej próbce
+        starszych danych (replay_ratio starszych wierszy na jeden nowy), więc koszt rośnie z ilością nowych danych.
+        Kontrola dryfu: MAE poprzedniego modelu na nowych danych jest porównywany z MAE z ostatniego treningu,
+        a douczony model zastępuje poprzedni tylko wtedy, gdy nie jest gorszy na zbiorze walidacyjnym.
+        Bez punktu kontrolnego lub modelu wykonywany jest pełny trening.
+        """
+        checkpoint = self.load_checkpoint()
+        model_path = os.path.join(self.models_dir, "model_trained.keras")
+        scaler_path = os.path.join(self.models_dir, "production_scaler.pkl")
+        if checkpoint is None or not os.path.exists(model_path) or 'timestamp' not in self.df.columns:
+            print(" Brak punktu kontrolnego lub modelu - pełny trening...")
+            return self.train()
+
+        times = pd.to_datetime(self.df['timestamp'], utc=True)
+        last_timestamp = pd.Timestamp(checkpoint['last_timestamp'])
+        is_new = times > last_timestamp
+        if not is_new.any():
+            print(f" Brak nowych danych od {last_timestamp} - model bez zmian.")
+            return
+        new = self.df[is_new].iloc[np.argsort(times[is_new].to_numpy(), kind='stable')]
+        old = self.df[~is_new]
+
+        import tensorflow as tf
+        from tensorflow.keras.callbacks import EarlyStopping
+        from tensorflow.keras.optimizers import Adam
+
+        # Skaler pozostaje bez zmian - wagi modelu są do niego dopasowane
+        self.scaler = joblib.load(scaler_path)
+        previous = tf.keras.models.load_model(model_path)
+
+        # Walidacja: najnowsze 20% nowych danych oraz 20% próbki starszych danych
+        n_val = len(new) // 5
+        replay = old.sample(n=min(len(old), int(np.ceil(len(new) * replay_ratio))), random_state=42)
+        replay_val = replay.sample(frac=0.2, random_state=42)
+        train_df = pd.concat([new.iloc[:len(new) - n_val], replay.drop(replay_val.index)])
+        val_df = pd.concat([new.iloc[len(new) - n_val:], replay_val])
+        if val_df.empty:
+            val_df = train_df
+        print(f" Douczanie: {len(new)} nowych wierszy + {len(replay)} starszych (replay), "
+              f"walidacja {len(val_df)} wierszy")
+
+        # Cechy zgodne z wczytanym skalerem (model mógł być wytrenowany z innym SOLAR_FEATURES)
+        features = features_for_inputs(self.scaler.n_features_in_)
+
+        def scaled(df):
+            return self.scaler.transform(df[features]), df['energy_15min_kWh'].to_numpy()
+
+        def mae(model, X, y):
+            return float(np.mean(np.abs(model.predict(X, verbose=0).flatten() - y)))
+
+        X_new, y_new = scaled(new)
+        X_train, y_train = scaled(train_df)
+        X_val, y_val = scaled(val_df)
+
+        # Kontrola dryfu: jak poprzedni model radzi sobie z nowymi danymi
+        drift = mae(previous, X_new, y_new) / max(checkpoint['mae'], 1e-9)
+        print(f" Dryf: MAE poprzedniego modelu na nowych danych = {drift:.2f} × MAE z ostatniego treningu")
+        if drift > DRIFT_THRESHOLD:
+            print(f" UWAGA: wykryto dryf danych (> {DRIFT_THRESHOLD}×) - rozważ pełny trening (train.py)")
+
+        model = tf.keras.models.clone_model(previous)
+        model.set_weights(previous.get_weights())
+        model.compile(optimizer=Adam(learning_rate=FINE_TUNE_LR), loss='mse')
+        started = time.perf_counter()
+        model.fit(
+            X_train, y_train,
+            validation_data=(X_val, y_val),
+            epochs=FINE_TUNE_EPOCHS,
+            batch_size=DEFAULT_PARAMS["batch_size"],
+            callbacks=[EarlyStopping(monitor='val_loss', patience=5, restore_best_weights=True)],
+            verbose=2
+        )
+        print(f" Douczanie trwało {time.perf_counter() - started:.1f} s")
+
+        previous_mae, new_mae = mae(previous, X_val, y_val), mae(model, X_val, y_val)
+        print(f" MAE walidacji: poprzedni model {previous_mae:.4f}, douczony {new_mae:.4f}")
+        if new_mae > previous_mae * (1 + ACCEPT_TOLERANCE):
+            print(" Douczony model jest gorszy - pozostaje poprzedni model.")
+            return
+
+        self.model = model
+        self.model.save(model_path)
+        print(f" Model zapisany do {model_path}")
+        self.export_numpy()
+        self.save_checkpoint(new_mae, mode="warm_start")
+
+    def load_checkpoint(self):
+        path = os.path.join(self.models_dir, "training_checkpoint.json")
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding="utf-8") as f:
+            return json.load(f)
+
+    def save_checkpoint(self, mae, mode):
+        # Punkt kontrolny: do jakiego momentu dane zostały użyte w treningu i jaki był wtedy MAE
+        if 'timestamp' not in self.df.columns:
+            return
+        checkpoint = {
+            "last_timestamp": pd.to_datetime(self.df['timestamp'], utc=True).max().isoformat(),
+            "rows": int(len(self.df)),
+            "mae": float(mae),
+            "mode": mode,
+            "trained_at": time.strftime("%Y-%m-%d %H:%M:%S"),
+        }
+        with open(os.path.join(self.models_dir, "training_checkpoint.json"), "w", encoding="utf-8") as f:
+            json.dump(checkpoint, f, indent=2)
+
+    @staticmethod
+    def fit_model(X_train, y_train, X_val, y_val, params, fast=False, verbose=1):
+        """
+        Buduje i trenuje model. Tryb standardowy: tablice NumPy, stały learning rate.
+        Tryb szybki: potok tf.data (cache + shuffle + batch + prefetch), większy batch, learning rate
+        skalowany pierwiastkiem z rozmiaru batcha z rozgrzewką i cosine decay, raport próbek/s dla każdej epoki.
+        Zwraca (model, historia, czas treningu w sekundach).
+        """
+        from tensorflow.keras.callbacks import EarlyStopping
+
+        configure_threads()
+        if not fast:
+            model = build_mlp(X_train.shape[1], params["layers"], params["learning_rate"])
+            early_stop = EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True)
+            started = time.perf_counter()
+            history = model.fit(
+                X_train, y_train,
+                validation_data=(X_val, y_val),
+                epochs=200,
+                batch_size=params["batch_size"],
+                callbacks=[early_stop],
+                verbose=verbose
+            )
+            return model, history, time.perf_counter() - started
+
+        import tensorflow as tf
+
+        batch_size = params["batch_size"]
+        steps = int(np.ceil(len(X_train) / batch_size))
+        # Reguła pierwiastka: większy batch → proporcjonalnie do sqrt większy szczytowy learning rate
+        peak_lr = params["learning_rate"] * np.sqrt(batch_size / DEFAULT_PARAMS["batch_size"])
+        schedule = tf.keras.optimizers.schedules.CosineDecay(
+            initial_learning_rate=params["learning_rate"],
+            decay_steps=steps * FAST_EPOCHS,
+            alpha=0.05,
+            warmup_target=float(peak_lr),
+            warmup_steps=steps * WARMUP_EPOCHS,
+        )
+        model = build_mlp(X_train.shape[1], params["layers"], schedule)
+
+        X_train = np.asarray(X_train, dtype=np.float32)
+        y_train = np.asarray(y_train, dtype=np.float32)
+        train_ds = (tf.data.Dataset.from_tensor_slices((X_train, y_train))
+                    .cache()
+                    .shuffle(len(X_train), seed=42, reshuffle_each_iteration=True)
+                    .batch(batch_size)
+                    .prefetch(tf.data.AUTOTUNE))
+        val_ds = (tf.data.Dataset.from_tensor_slices((np.asarray(X_val, dtype=np.float32),
+                                                      np.asarray(y_val, dtype=np.float32)))
+                  .batch(4096)
+                  .cache()
+                  .prefetch(tf.data.AUTOTUNE))
+
+        callbacks = [EarlyStopping(monitor='val_loss', patience=20, restore_best_weights=True)]
+        if verbose:
+            callbacks.append(throughput_callback(len(X_train)))
+        started = time.perf_counter()
+        # shuffle=False - tasowanie odbywa się już w potoku tf.data
+        history = model.fit(train_ds, validation_data=val_ds, epochs=FAST_EPOCHS, callbacks=callbacks,
+                            shuffle=False, verbose=0)
+        return model, history, time.perf_counter() - started
+
+    def compare_fast(self, params=None):
+        """
+        Porównanie: trening standardowy vs szybki na tym samym podziale danych (bez zapisu modelu).
+        Wypisuje czas, próbki/s, R² i MAE obu wariantów oraz przyspieszenie.
+        """
+        from sklearn.metrics import mean_absolute_error, r2_score
+
+        X_train, X_test, y_train, y_test = self.split_data()
+        X_train_scaled = self.scaler.fit_transform(X_train)
+        X_test_scaled = self.scaler.transform(X_test)
+
+        rows = []
+        for fast in (False, True):
+            run_params = {**DEFAULT_PARAMS, **(FAST_PARAMS if fast else {}), **(params or {})}
+            model, history, seconds = self.fit_model(X_train_scaled, y_train, X_test_scaled, y_test,
+                                                     run_params, fast, verbose=0)
+            y_pred = model.predict(X_test_scaled, verbose=0).flatten()
+            epochs = len(history.history['loss'])
+            rows.append({
+                "mode": "fast" if fast else "standard",
+                "batch_size": run_params["batch_size"],
+                "epochs": epochs,
+                "seconds": round(seconds, 1),
+                "samples_per_s": round(epochs * len(X_train_scaled) / seconds),
+                "r2": round(r2_score(y_test, y_pred), 4),
+                "mae": round(mean_absolute_error(y_test, y_pred), 4),
+            })
+
+        table = pd.DataFrame(rows)
+        print("\n Porównanie trybów treningu:")
+        print(table.to_string(index=False))
+        print(f" Przyspieszenie: {rows[0]['seconds'] / rows[1]['seconds']:.1f}×")
+        return table
+
+    def train_engine(self, name):
+        """
+        Trening wybranego silnika (model_engines.py): keras - jak dotychczas przez train(),
+        hgb / linear - dopasowanie na tym samym podziale 80/20, ocena i zapis do models/model_<silnik>.joblib.
+        """
+        if name == "keras":
+            return self.train()
+
+        from model_engines import get_engine, MODEL_FILES
+
+        X_train, X_test, y_train, y_test = self.split_data()
+        print(f" Trening silnika {name}...")
+        engine = get_engine(name).fit(X_train, y_train)
+        self.model = engine
+
+        path = os.path.join(self.models_dir, MODEL_FILES[name])
+        engine.save(path)
+        print(f" Model zapisany do {path} (użyj MODEL_ENGINE={name} do predykcji)")
+        self.evaluate_model(X_test, y_test)
+
+    def compare_engines(self, names=("keras", "hgb", "linear")):
+        """
+        Raport porównawczy silników na tym samym podziale danych: czas treningu, opóźnienie predykcji
+        (pojedynczy wiersz i partia) oraz MAE / RMSE / R². Zapis do models/engine_report.csv (bez zapisu modeli).
+        """
+        from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+        from model_engines import get_engine
+
+        X_train, X_test, y_train, y_test = self.split_data()
+        X_train, X_test = X_train.to_numpy(dtype=float), X_test.to_numpy(dtype=float)
+        X_batch = np.resize(X_test, (10_000, X_test.shape[1]))
+
+        rows = []
+        for name in names:
+            print(f" Silnik {name}...")
+            started = time.perf_counter()
+            engine = get_engine(name).fit(X_train, y_train)
+            fit_seconds = time.perf_counter() - started
+
+            y_pred = engine.predict(X_test)
+
+            # Opóźnienie pojedynczego wiersza (mediana z 200 wywołań) i partii 10 000 wierszy
+            single = []
+            for i in range(200):
+                started = time.perf_counter()
+                engine.predict(X_test[i % len(X_test)][None, :])
+                single.append(time.perf_counter() - started)
+            started = time.perf_counter()
+            engine.predict(X_batch)
+            batch_seconds = time.perf_counter() - started
+
+            rows.append({
+                "engine": name,
+                "fit_s": round(fit_seconds, 3),
+                "predict_1_row_us": round(np.median(single) * 1e6, 1),
+                "predict_10k_rows_ms": round(batch_seconds * 1000, 2),
+                "mae": round(mean_absolute_error(y_test, y_pred), 4),
+                "rmse": round(float(np.sqrt(mean_squared_error(y_test, y_pred))), 4),
+                "r2": round(r2_score(y_test, y_pred), 4),
+            })
+
+        table = pd.DataFrame(rows)
+        report_path = os.path.join(self.models_dir, "engine_report.csv")
+        table.to_csv(report_path, index=False)
+        print("\n Porównanie silników modeli:")
+        print(table.to_string(index=False))
+        print(f" Raport zapisany do {report_path}")
+        return table
+
+    def search(self, grid=None, n_trials=None, n_splits=5, workers=None, threads_per_worker=None):
+        """
+        Przeszukiwanie hiperparametrów (siatka lub losowe n_trials z siatki) z walidacją krzyżową
+        TimeSeriesSplit (foldy w kolejności czasu, walidacja zawsze po treningu).
+        Próby są wykonywane równolegle w puli procesów, każdy proces z ograniczoną liczbą wątków CPU.
+        Wyniki trafiają do models/search_results.csv, najlepsze parametry do models/best_params.json,
+        a model z najlepszymi parametrami jest trenowany i zapisywany jak w train().
+        """
+        grid = grid or SEARCH_GRID
+        trials = [dict(zip(grid, values)) for values in itertools.product(*grid.values())]
+        if n_trials is not None and n_trials < len(trials):
+            trials = random.Random(42).sample(trials, n_trials)
+
+        cpus = os.cpu_count() or 1
+        workers = workers or min(len(trials), cpus)
+        threads_per_worker = threads_per_worker or max(1, cpus // workers)
+
+        # Dane posortowane po czasie, aby foldy TimeSeriesSplit odpowiadały kolejnym okresom
+        df = self.df.sort_values('timestamp') if 'timestamp' in self.df.columns else self.df
+        X = df[FEATURES].to_numpy(dtype=np.float32)
+        y = df['energy_15min_kWh'].to_numpy(dtype=np.float32)
+
+        print(f" Przeszukiwanie: {len(trials)} prób × {n_splits} foldów, "
+              f"{workers} procesów × {threads_per_worker} wątków")
+        started = time.perf_counter()
+
+        # "spawn" - TensorFlow nie działa poprawnie w procesach utworzonych przez fork
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context("spawn"),
+                                 initializer=_init_search_worker,
+                                 initargs=(X, y, n_splits, threads_per_worker)) as pool:
+            results = []
+            for result in pool.map(_run_trial, trials):
+                results.append(result)
+                print(f"  {result['layers']} lr={result['learning_rate']} batch={result['batch_size']}: "
+                      f"RMSE {result['cv_rmse']:.4f} ± {result['cv_rmse_std']:.4f} ({result['seconds']:.0f} s)")
+
+        table = pd.DataFrame(results).sort_values('cv_rmse').reset_index(drop=True)
+        table['layers'] = table['layers'].map(lambda layers: "-".join(map(str, layers)))
+        table.to_csv(os.path.join(self.models_dir, "search_results.csv"), index=False)
+        print(f" Przeszukiwanie zakończone w {time.perf_counter() - started:.0f} s. "
+              f"Wyniki: {os.path.join(self.models_dir, 'search_results.csv')}")
+
+        best = min(results, key=lambda r: r['cv_rmse'])
+        best_params = {key: best[key] for key in DEFAULT_PARAMS}
+        with open(os.path.join(self.models_dir, "best_params.json"), "w", encoding="utf-8") as f:
+            json.dump(best_params, f, indent=2)
+        print(f" Najlepsze parametry: {best_params}")
+
+        # Zwycięzca: trening modelu produkcyjnego z najlepszymi parametrami
+        self.train(best_params)
+        return table
+
+    def export_numpy(self):
+        npz_path = os.path.join(self.models_dir, "model_trained.npz")
+        onnx_path = os.path.join(self.models_dir, "model_trained.onnx") if os.getenv("EXPORT_ONNX", "0") == "1" else None
+        export_numpy_model(self.model, self.scaler, npz_path, onnx_path)
 
     def plot_training_history(self, history):
+        import matplotlib.pyplot as plt
+
         plt.figure(figsize=(8, 5))
         plt.plot(history.history['loss'], label='Train Loss')
         plt.plot(history.history['val_loss'], label='Validation Loss')
@@ -89,9 +447,11 @@ class ModelTrainer:
         plt.show()
 
     def evaluate_model(self, X_test, y_test):
+        from sklearn.metrics import mean_absolute_error, mean_squared_error, r2_score
+
         print("\n Wyniki na danych testowych:")
 
-        y_pred = self.model.predict(X_test).flatten()
+        y_pred = np.asarray(self.model.predict(X_test)).flatten()
 
         r2 = r2_score(y_test, y_pred)
         mae = mean_absolute_error(y_test, y_pred)
@@ -100,3 +460,104 @@ class ModelTrainer:
         print(f" R² Score       : {r2:.4f}")
         print(f" MAE (kWh)      : {mae:.4f}")
         print(f" RMSE (kWh)     : {rmse:.4f}")
+        return {"r2": r2, "mae": mae, "rmse": rmse}
+
+
+def configure_threads():
+    # Liczba wątków TensorFlow z .env (0 = automatycznie); musi być ustawiona przed pierwszą operacją TF
+    import tensorflow as tf
+
+    intra = int(os.getenv("TF_INTRA_OP_THREADS", "0"))
+    inter = int(os.getenv("TF_INTER_OP_THREADS", "0"))
+    if (intra, inter) == (tf.config.threading.get_intra_op_parallelism_threads(),
+                          tf.config.threading.get_inter_op_parallelism_threads()):
+        return
+    try:
+        tf.config.threading.set_intra_op_parallelism_threads(intra)
+        tf.config.threading.set_inter_op_parallelism_threads(inter)
+    except RuntimeError:
+        print(" Wątki TensorFlow już zainicjalizowane - pomijam ustawienia TF_*_OP_THREADS")
+
+
+def throughput_callback(n_samples):
+    from tensorflow.keras.callbacks import Callback
+
+    # Raport po każdej epoce: próbki/s oraz strata treningowa i walidacyjna
+    class Throughput(Callback):
+        def on_epoch_begin(self, epoch, logs=None):
+            self.started = time.perf_counter()
+
+        def on_epoch_end(self, epoch, logs=None):
+            rate = n_samples / (time.perf_counter() - self.started)
+            print(f" Epoka {epoch + 1}: {rate:,.0f} próbek/s, loss {logs['loss']:.5f}, "
+                  f"val_loss {logs['val_loss']:.5f}")
+
+    return Throughput()
+
+
+def build_mlp(input_dim, layers=(64, 32), learning_rate=0.001):
+    from tensorflow.keras.models import Sequential
+    from tensorflow.keras.layers import Dense, Input
+    from tensorflow.keras.optimizers import Adam
+
+    # Buduj prostą sieć neuronową MLP
+    model = Sequential(
+        [Input(shape=(input_dim,))] +
+        [Dense(units, activation='relu') for units in layers] +
+        [Dense(1, activation='linear')]
+    )
+    model.compile(optimizer=Adam(learning_rate=learning_rate), loss='mse')
+    return model
+
+
+# Stan procesu roboczego przeszukiwania (ustawiany raz na proces, nie przy każdej próbie)
+_search_data = {}
+
+
+def _init_search_worker(X, y, n_splits, threads):
+    # Ogranicz wątki CPU, aby równoległe procesy nie konkurowały o rdzenie
+    for var in ("OMP_NUM_THREADS", "TF_NUM_INTRAOP_THREADS", "TF_NUM_INTEROP_THREADS"):
+        os.environ[var] = str(threads)
+    os.environ.setdefault("TF_CPP_MIN_LOG_LEVEL", "2")
+    import tensorflow as tf
+    tf.config.threading.set_intra_op_parallelism_threads(threads)
+    tf.config.threading.set_inter_op_parallelism_threads(1)
+    _search_data.update(X=X, y=y, n_splits=n_splits)
+
+
+def _run_trial(params):
+    import tensorflow as tf
+    from sklearn.model_selection import TimeSeriesSplit
+    from sklearn.preprocessing import StandardScaler
+    from tensorflow.keras.callbacks import EarlyStopping
+
+    X, y = _search_data["X"], _search_data["y"]
+    started = time.perf_counter()
+    rmse, mae, epochs = [], [], []
+    for train_idx, val_idx in TimeSeriesSplit(n_splits=_search_data["n_splits"]).split(X):
+        tf.keras.utils.set_random_seed(42)
+        scaler = StandardScaler().fit(X[train_idx])
+        X_train, X_val = scaler.transform(X[train_idx]), scaler.transform(X[val_idx])
+
+        model = build_mlp(X.shape[1], params["layers"], params["learning_rate"])
+        history = model.fit(
+            X_train, y[train_idx],
+            validation_data=(X_val, y[val_idx]),
+            epochs=200,
+            batch_size=params["batch_size"],
+            callbacks=[EarlyStopping(monitor='val_loss', patience=10, restore_best_weights=True)],
+            verbose=0
+        )
+        y_pred = model.predict(X_val, verbose=0).flatten()
+        rmse.append(float(np.sqrt(np.mean((y[val_idx] - y_pred) ** 2))))
+        mae.append(float(np.mean(np.abs(y[val_idx] - y_pred))))
+        epochs.append(len(history.history['loss']))
+
+    return {
+        **params,
+        "cv_rmse": float(np.mean(rmse)),
+        "cv_rmse_std": float(np.std(rmse)),
+        "cv_mae": float(np.mean(mae)),
+        "mean_epochs": float(np.mean(epochs)),
+        "seconds": time.perf_counter() - started,
+    }
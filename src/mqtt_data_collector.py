@@ -4,6 +4,10 @@
 
 import paho.mqtt.client as mqtt
 import csv
+import os
+import queue
+import threading
+import time
 from datetime import datetime
 
 #  MQTT connection details / Dane dostepowe do serwera MQTT
@@ -16,6 +20,151 @@ TOPIC = "if0754/#"                   # topic pattern to subscribe, e.g. "if0754/
 #  Output CSV file name / Nazwa pliku CSV do zapisu
 CSV_FILE = "mqtt_data_new.csv"
 
+#  Buffered mode: messages are queued and written in batches by a background thread
+#  Tryb buforowany: wiadomości trafiają do kolejki i są zapisywane partiami przez wątek w tle
+BUFFERED = True
+BATCH_SIZE = 500                     # flush after this many messages / zapis po tylu wiadomościach
+FLUSH_INTERVAL = 2.0                 # ... or after this many seconds / ... lub po tylu sekundach
+FSYNC_INTERVAL = 30.0                # fsync to disk every N seconds / fsync na dysk co N sekund
+MAX_QUEUE = 100000                   # messages above this are dropped / nadmiarowe wiadomości są odrzucane
+# Daily rotation is opt-in: the cleaner, incremental ingest and nowcast replay read one headerless CSV file
+# Rotacja dzienna jest opcjonalna: cleaner, wczytywanie przyrostowe i odtwarzanie nowcastu czytają jeden plik CSV
+ROTATE_DAILY = False                 # True = one file per day, e.g. mqtt_data_new_2025-07-26.csv
+STATS_INTERVAL = 60                  # log writer statistics every N seconds / statystyki co N sekund
+
+
+class BufferedCSVWriter:
+    """
+    Writes (timestamp, topic, value) rows to CSV from a background thread, in batches.
+    Zapisuje wiersze (timestamp, topic, value) do CSV partiami, z wątku w tle.
+    """
+
+    def __init__(self, csv_file, batch_size=BATCH_SIZE, flush_interval=FLUSH_INTERVAL,
+                 fsync_interval=FSYNC_INTERVAL, max_queue=MAX_QUEUE, rotate_daily=ROTATE_DAILY):
+        self.csv_file = csv_file
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.fsync_interval = fsync_interval
+        self.rotate_daily = rotate_daily
+
+        self._queue = queue.Queue(maxsize=max_queue)
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="mqtt-csv-writer", daemon=True)
+        self._file = None
+        self._file_path = None
+        self._last_fsync = time.monotonic()
+
+        # Counters / Liczniki
+        self.written = 0
+        self.dropped = 0
+        self.flushes = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def put(self, timestamp, topic, value):
+        # Never blocks the MQTT network thread - drop the message if the queue is full
+        # Nigdy nie blokuje wątku sieciowego MQTT - odrzuć wiadomość, jeśli kolejka jest pełna
+        try:
+            self._queue.put_nowait((timestamp, topic, value))
+            return True
+        except queue.Full:
+            self.dropped += 1
+            return False
+
+    def stop(self):
+        # Flush everything still queued, fsync and close the file
+        # Zapisz wszystko, co zostało w kolejce, wykonaj fsync i zamknij plik
+        self._stop.set()
+        if self._thread.is_alive():
+            self._thread.join()
+        self._close()
+
+    def stats(self):
+        return {
+            "queue_depth": self._queue.qsize(),
+            "written": self.written,
+            "dropped": self.dropped,
+            "flushes": self.flushes,
+            "last_flush_latency_s": round(self.last_flush_latency, 4),
+            "max_flush_latency_s": round(self.max_flush_latency, 4),
+        }
+
+    def _run(self):
+        batch = []
+        batch_started = time.monotonic()
+        while not (self._stop.is_set() and self._queue.empty()):
+            timeout = max(0.0, self.flush_interval - (time.monotonic() - batch_started))
+            try:
+                row = self._queue.get(timeout=min(timeout, 0.5) if batch else 0.5)
+                if not batch:
+                    batch_started = time.monotonic()
+                batch.append(row)
+            except queue.Empty:
+                pass
+
+            if batch and (len(batch) >= self.batch_size or
+                          time.monotonic() - batch_started >= self.flush_interval or
+                          (self._stop.is_set() and self._queue.empty())):
+                self._write_batch(batch)
+                batch = []
+        if batch:
+            self._write_batch(batch)
+
+    def _write_batch(self, batch):
+        started = time.monotonic()
+        for path, rows in self._group_by_file(batch):
+            writer = csv.writer(self._open(path))
+            writer.writerows(rows)
+        self._file.flush()
+
+        if time.monotonic() - self._last_fsync >= self.fsync_interval:
+            os.fsync(self._file.fileno())
+            self._last_fsync = time.monotonic()
+
+        self.written += len(batch)
+        self.flushes += 1
+        self.last_flush_latency = time.monotonic() - started
+        self.max_flush_latency = max(self.max_flush_latency, self.last_flush_latency)
+
+    def _group_by_file(self, batch):
+        # Split a batch at day boundaries when daily rotation is on (rows are in time order)
+        # Podziel partię na granicy dni przy dziennej rotacji (wiersze są w kolejności czasu)
+        if not self.rotate_daily:
+            return [(self.csv_file, batch)]
+        groups = []
+        for row in batch:
+            path = self._daily_path(row[0][:10])
+            if not groups or groups[-1][0] != path:
+                groups.append((path, []))
+            groups[-1][1].append(row)
+        return groups
+
+    def _daily_path(self, day):
+        root, ext = os.path.splitext(self.csv_file)
+        return f"{root}_{day}{ext}"
+
+    def _open(self, path):
+        if path != self._file_path:
+            self._close()
+            self._file = open(path, mode="a", newline="")
+            self._file_path = path
+        return self._file
+
+    def _close(self):
+        if self._file is not None:
+            self._file.flush()
+            os.fsync(self._file.fileno())
+            self._file.close()
+            self._file = None
+            self._file_path = None
+
+
+writer = None
+
 # Callback when connected to MQTT broker
 def on_connect(client, userdata, flags, rc):
     print("Connected to MQTT with code: " + str(rc))
@@ -27,24 +176,47 @@ def on_message(client, userdata, msg):
     topic = msg.topic
     value = msg.payload.decode(errors="ignore")
 
+    # Buffered mode: only enqueue, the writer thread does the I/O
+    # Tryb buforowany: tylko dodaj do kolejki, zapis wykonuje wątek zapisujący
+    if writer is not None:
+        writer.put(timestamp, topic, value)
+        return
+
     print(f"{timestamp} | {topic}  {value}")
 
     # Append message to CSV file
     with open(CSV_FILE, mode="a", newline="") as file:
-        writer = csv.writer(file)
-        writer.writerow([timestamp, topic, value])
+        csv_writer = csv.writer(file)
+        csv_writer.writerow([timestamp, topic, value])
+
 
-# Create MQTT client and configure callbacks
-client = mqtt.Client()
-client.username_pw_set(USERNAME, PASSWORD)
-client.on_connect = on_connect
-client.on_message = on_message
+if __name__ == "__main__":
+    if BUFFERED:
+        writer = BufferedCSVWriter(CSV_FILE).start()
 
-# Connect to broker and start listening
-client.connect(BROKER, PORT, 60)
-client.loop_start()
+    # Create MQTT client and configure callbacks
+    client = mqtt.Client()
+    client.username_pw_set(USERNAME, PASSWORD)
+    client.on_connect = on_connect
+    client.on_message = on_message
 
-# Now the script will run in background and save incoming MQTT messages to CSV
-# You can also manually send commands, for example:
-# client.publish("if0754/fca/cmd", "out3=1")
+    # Connect to broker and start listening
+    client.connect(BROKER, PORT, 60)
+    client.loop_start()
 
+    # Now the script will run in background and save incoming MQTT messages to CSV
+    # You can also manually send commands, for example:
+    # client.publish("if0754/fca/cmd", "out3=1")
+    try:
+        while True:
+            time.sleep(STATS_INTERVAL)
+            if writer is not None:
+                print(f"{datetime.now().isoformat()} | writer stats: {writer.stats()}")
+    except KeyboardInterrupt:
+        print("Stopping MQTT collector...")
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        if writer is not None:
+            writer.stop()
+            print(f"Writer stopped: {writer.stats()}")
@@ -0,0 +1,83 @@
+import os
+import json
+import numpy as np
+
+# Set base directory of the project (parent to src folder)
+# Ustal katalog główny projektu (nadrzędny względem folderu src)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCHEMA_FILE = os.path.join(BASE_DIR, "mqtt_schema.json")
+
+# How duplicate values of one channel in one row are combined
+# Sposób łączenia powtórzonych wartości jednego kanału w jednym wierszu
+AGGREGATIONS = ("last", "first", "max", "min", "mean")
+
+# Channels needed by the energy and SF scaling steps / Kanały potrzebne do obliczenia energii i skalowania SF
+REQUIRED_CHANNELS = ("Instant_Power_Pdc", "Total_Power_P_ALL", "SF")
+
+
+def load_schema(schema_file=None):
+    """
+    Loads the MQTT schema: which topic feeds which named, typed channel, how duplicates are aggregated,
+    which topics are excluded and the gap (ms) that separates two publish bursts.
+    The first topic level is the device (inverter) id: the schema topics describe the default device
+    and their "suffix" (topic without the device) is matched for every device on the broker.
+    Topics that are neither channels nor excluded are ignored by the cleaner and reported.
+    Wczytuje schemat MQTT: który temat zasila który nazwany, typowany kanał, jak agregowane są duplikaty,
+    które tematy są wykluczone oraz przerwę (ms) oddzielającą dwie serie publikacji.
+    Pierwszy poziom tematu to identyfikator urządzenia (falownika): tematy schematu opisują urządzenie
+    domyślne, a ich "suffix" (temat bez urządzenia) jest dopasowywany dla każdego urządzenia na brokerze.
+    Tematy, które nie są kanałami ani nie są wykluczone, są pomijane przez cleaner i zgłaszane.
+    """
+    schema_file = schema_file or os.getenv("MQTT_SCHEMA", SCHEMA_FILE)
+    if not os.path.exists(schema_file):
+        raise FileNotFoundError(f" MQTT schema not found: {schema_file}")
+
+    with open(schema_file, encoding="utf-8") as f:
+        entries = json.load(f)
+
+    channels = []
+    topics, names = set(), set()
+    for entry in entries.get("channels", []):
+        missing = [field for field in ("topic", "name") if field not in entry]
+        if missing:
+            raise ValueError(f" Schema channel {entry} is missing fields: {missing}")
+        # Topics are matched without the device, so the suffix must be unique
+        # Tematy są dopasowywane bez urządzenia, więc suffix musi być unikalny
+        if topic_suffix(entry["topic"]) in topics or entry["name"] in names:
+            raise ValueError(f" Duplicate topic or channel name in schema: {entry['topic']} / {entry['name']}")
+        topics.add(topic_suffix(entry["topic"]))
+        names.add(entry["name"])
+
+        # Channels hold NaN for missing values, so only float types are allowed
+        # Kanały przechowują NaN dla brakujących wartości, więc dozwolone są tylko typy zmiennoprzecinkowe
+        dtype = np.dtype(entry.get("dtype", "float64"))
+        if dtype.kind != "f":
+            raise ValueError(f" Channel {entry['name']}: dtype must be a float type, got {dtype}")
+        agg = entry.get("agg", "last")
+        if agg not in AGGREGATIONS:
+            raise ValueError(f" Channel {entry['name']}: unknown agg {agg} (use {', '.join(AGGREGATIONS)})")
+        channels.append({"topic": str(entry["topic"]), "suffix": topic_suffix(entry["topic"]),
+                         "name": str(entry["name"]), "dtype": dtype, "agg": agg})
+
+    missing = [name for name in REQUIRED_CHANNELS if name not in names]
+    if missing:
+        raise ValueError(f" MQTT schema {schema_file} is missing channels: {missing}")
+
+    return {
+        "channels": channels,
+        "exclude": [str(topic) for topic in entries.get("exclude", [])],
+        "burst_gap_ms": float(entries.get("burst_gap_ms", 500)),
+        # Device whose data goes to the main pipeline files / Urządzenie, którego dane trafiają do głównych plików potoku
+        "device": os.getenv("MQTT_DEVICE") or entries.get("device") or topic_device(channels[0]["topic"]),
+    }
+
+
+def topic_device(topic):
+    # First topic level, e.g. if0754/fca/m1 -> if0754 / Pierwszy poziom tematu
+    return topic.split("/", 1)[0]
+
+
+def topic_suffix(topic):
+    # Topic without the device, e.g. if0754/fca/m1 -> fca/m1 / Temat bez urządzenia
+    parts = topic.split("/", 1)
+    return parts[1] if len(parts) > 1 else ""
@@ -0,0 +1,412 @@
+"""
+Streaming nowcast fed directly from the MQTT stream: every message updates the current 5-min window
+in O(1) (per-register max, as in MQTTDataCleaner), closed windows go to fixed-size ring buffers
+together with the Total_Power_P_ALL diff (energy_kWh) and SF-scaled Pdc, and the energy of the current
+15-min interval is compared live with energy_15min_pred_kWh of the newest prediction file.
+Memory stays constant however long it runs: the ring buffers have fixed size and the prediction
+lookup keeps only the last day.
+
+Nowcast strumieniowy zasilany bezpośrednio ze strumienia MQTT: każda wiadomość aktualizuje bieżące okno
+5 min w czasie O(1) (maksimum rejestru, jak w MQTTDataCleaner), zamknięte okna trafiają do buforów
+cyklicznych o stałym rozmiarze razem z różnicą Total_Power_P_ALL (energy_kWh) i mocą Pdc przeskalowaną
+przez SF, a energia bieżącego przedziału 15 min jest na bieżąco porównywana z energy_15min_pred_kWh
+z najnowszego pliku predykcji. Zużycie pamięci jest stałe niezależnie od czasu działania.
+
+Usage / Użycie:
+    python src/nowcast_stream.py                                   # live, MQTT broker from mqtt_data_collector.py
+    python src/nowcast_stream.py --replay data/mqtt_data.csv       # replay of a collected file / odtworzenie pliku
+"""
+
+import os
+import glob
+import json
+import math
+import time
+import argparse
+import threading
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+from data_cleaner import SF_DIVISORS
+from storage import get_storage, dataset_name
+from mqtt_schema import load_schema, REQUIRED_CHANNELS
+
+load_dotenv()  # załaduj zmienne środowiskowe / load environment variables
+
+# Set base directory of the project (parent to src folder)
+# Ustal katalog główny projektu (nadrzędny względem folderu src)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+PREDICTIONS_DIR = os.path.join(BASE_DIR, "predictions")
+
+# Empty NOWCAST_LOG disables the JSON log / Pusty NOWCAST_LOG wyłącza log JSON
+NOWCAST_LOG = os.getenv("NOWCAST_LOG", os.path.join(BASE_DIR, "outputs", "nowcast.jsonl"))
+RING_5MIN = int(os.getenv("NOWCAST_RING_5MIN", "288"))      # 24 h of 5-min windows / 24 h okien 5 min
+RING_15MIN = int(os.getenv("NOWCAST_RING_15MIN", "96"))     # 24 h of 15-min intervals / 24 h przedziałów 15 min
+REFRESH_SECONDS = 300        # check for a newer prediction file / sprawdzanie nowszego pliku predykcji
+STATS_INTERVAL = 60          # log statistics every N seconds / statystyki co N sekund
+
+WINDOW = 300                 # 5 min
+INTERVAL = 900               # 15 min
+
+# Channels of the MQTT schema (mqtt_schema.json) for the main device, as in MQTTDataCleaner; other topics are ignored
+# Kanały schematu MQTT (mqtt_schema.json) dla urządzenia głównego, jak w MQTTDataCleaner; pozostałe tematy są pomijane
+SCHEMA = load_schema()
+CHANNELS = {f"{SCHEMA['device']}/{channel['suffix']}": channel['name'] for channel in SCHEMA['channels']}
+TOPIC_INDEX = {topic: i for i, topic in enumerate(CHANNELS)}
+PDC, TOTAL, SF = (list(CHANNELS.values()).index(name) for name in REQUIRED_CHANNELS)
+
+
+class RingBuffer:
+    """
+    Fixed-size buffer of the last `capacity` rows (epoch seconds + float columns); the oldest row is overwritten.
+    Bufor o stałym rozmiarze z ostatnimi `capacity` wierszami (sekundy epoki + kolumny float); najstarszy wiersz jest nadpisywany.
+    """
+
+    def __init__(self, capacity, columns):
+        self.capacity = capacity
+        self.columns = list(columns)
+        self.times = np.zeros(capacity, dtype=np.int64)
+        self.values = np.full((capacity, len(self.columns)), np.nan)
+        self.count = 0
+
+    def append(self, time_s, values):
+        i = self.count % self.capacity
+        self.times[i] = time_s
+        self.values[i] = values
+        self.count += 1
+
+    def __len__(self):
+        return min(self.count, self.capacity)
+
+    def to_frame(self):
+        # Rows in time order, timestamps in UTC / Wiersze w kolejności czasu, znaczniki czasu w UTC
+        order = (np.arange(len(self)) + max(0, self.count - self.capacity)) % self.capacity
+        df = pd.DataFrame(self.values[order], columns=self.columns)
+        df.insert(0, 'timestamp', pd.to_datetime(self.times[order], unit='s', utc=True))
+        return df
+
+
+class PredictionLookup:
+    """
+    energy_15min_pred_kWh by period_end (epoch seconds) from the newest predictions/forecast_* file;
+    refresh() reloads it only when a newer file appears and drops values older than one day.
+    energy_15min_pred_kWh według period_end (sekundy epoki) z najnowszego pliku predictions/forecast_*;
+    refresh() wczytuje go ponownie tylko, gdy pojawi się nowszy plik, i usuwa wartości starsze niż dzień.
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.loaded_file = None
+        self.loaded_mtime = None
+        self.values = {}
+
+    def latest_file(self):
+        if self.path:
+            return self.path
+        files = [f for f in glob.glob(os.path.join(PREDICTIONS_DIR, "forecast*"))
+                 if f.endswith((".csv", ".parquet"))]
+        return max(files, key=os.path.getmtime) if files else None
+
+    def refresh(self, now_s=None):
+        path = self.latest_file()
+        if path is None or not os.path.exists(path):
+            return False
+        mtime = os.path.getmtime(path)
+        if (path, mtime) == (self.loaded_file, self.loaded_mtime):
+            return False
+
+        backend = "parquet" if path.endswith(".parquet") else "csv"
+        df = get_storage(backend).read(dataset_name(path), time_column='period_end')
+        seconds = _epoch_seconds(pd.to_datetime(df['period_end'], utc=True))
+
+        # Newer values replace older ones; intervals older than one day are dropped (constant memory)
+        # Nowsze wartości zastępują starsze; przedziały starsze niż dzień są usuwane (stała pamięć)
+        values = dict(self.values)
+        values.update(zip(seconds.tolist(), df['energy_15min_pred_kWh'].astype(float).tolist()))
+        oldest = (now_s if now_s is not None else time.time()) - 86400
+        self.values = {t: v for t, v in values.items() if t >= oldest}
+        self.loaded_file, self.loaded_mtime = path, mtime
+        print(f" Nowcast: predictions loaded from {path}")
+        return True
+
+    def get(self, interval_start):
+        # The model predicts the energy of the 15-min interval starting at period_end (see DataMerger)
+        # Model przewiduje energię przedziału 15 min zaczynającego się w period_end (patrz DataMerger)
+        return self.values.get(interval_start)
+
+
+class StreamAggregator:
+    """
+    Rolling 5-min and 15-min aggregates of the inverter stream, with the same values as the batch path:
+    5-min window = max of every register, energy_kWh = diff of Total_Power_P_ALL to the previous window
+    (0 after a gap), Scaled_P_DC = Pdc / SF divisor; 15-min energy = sum of its windows, clipped to
+    [0, 2] kWh as in DataMerger. on_value() is the only per-message work and is O(1).
+    Kroczące agregaty 5 min i 15 min strumienia falownika, o tych samych wartościach co ścieżka wsadowa:
+    okno 5 min = maksimum każdego rejestru, energy_kWh = różnica Total_Power_P_ALL względem poprzedniego
+    okna (0 po przerwie), Scaled_P_DC = Pdc / dzielnik SF; energia 15 min = suma jej okien, ograniczona
+    do [0, 2] kWh jak w DataMerger. on_value() to jedyna praca na wiadomość i ma koszt O(1).
+    """
+
+    def __init__(self, predictions=None, log_file=NOWCAST_LOG, verbose=True):
+        self.predictions = predictions or PredictionLookup()
+        self.log_file = log_file
+        self.verbose = verbose
+        self.windows = RingBuffer(RING_5MIN, list(CHANNELS.values()) + ['energy_kWh', 'Scaled_P_DC'])
+        self.intervals = RingBuffer(RING_15MIN, ['actual_kWh', 'predicted_kWh'])
+
+        # Callbacks (MQTT network thread) and the main loop (advance) share the state
+        # Callbacki (wątek sieciowy MQTT) i pętla główna (advance) współdzielą stan
+        self._lock = threading.Lock()
+        self._window_start = None
+        self._window_max = [-math.inf] * len(CHANNELS)
+        self._prev_start = None
+        self._prev_total = math.nan
+        self._interval_start = None
+        self._interval_energy = 0.0
+        self._interval_windows = 0
+
+        # Counters / Liczniki
+        self.messages = 0
+        self.ignored = 0
+        self.late = 0
+        self.total_latency = 0.0
+        self.max_latency = 0.0
+
+    def on_value(self, time_s, topic, value):
+        """
+        Adds one MQTT value (time in epoch seconds); closes the current window first when the value is past its end.
+        Dodaje jedną wartość MQTT (czas w sekundach epoki); najpierw zamyka bieżące okno, gdy wartość jest po jego końcu.
+        """
+        started = time.perf_counter()
+        index = TOPIC_INDEX.get(topic)
+        if index is None:
+            self.ignored += 1
+            return
+        try:
+            value = float(value)
+        except (TypeError, ValueError):
+            self.ignored += 1
+            return
+
+        with self._lock:
+            window_start = int(time_s) - int(time_s) % WINDOW
+            if self._window_start is None:
+                self._window_start = window_start
+            elif window_start > self._window_start:
+                self._close_window()
+                self._window_start = window_start
+            elif window_start < self._window_start:
+                # Out-of-order value of an already closed window / Wartość spoza kolejności z zamkniętego okna
+                self.late += 1
+                return
+            # NaN never wins the comparison, so it is skipped like in resample().max()
+            # NaN nigdy nie wygrywa porównania, więc jest pomijany jak w resample().max()
+            if value > self._window_max[index]:
+                self._window_max[index] = value
+
+        latency = time.perf_counter() - started
+        self.messages += 1
+        self.total_latency += latency
+        self.max_latency = max(self.max_latency, latency)
+
+    def advance(self, now_s):
+        """
+        Closes the current window once its end has passed, also when no message arrives (e.g. at night).
+        Zamyka bieżące okno po upływie jego końca, także gdy nie przychodzą wiadomości (np. w nocy).
+        """
+        with self._lock:
+            if self._window_start is not None and now_s >= self._window_start + WINDOW:
+                self._close_window()
+                self._window_start = None
+
+    def flush(self):
+        """
+        Closes the open window and 15-min interval (end of a replay or shutdown).
+        Zamyka otwarte okno i przedział 15 min (koniec odtwarzania lub zatrzymanie).
+        """
+        with self._lock:
+            if self._window_start is not None:
+                self._close_window()
+                self._window_start = None
+            if self._interval_start is not None:
+                self._close_interval()
+                self._interval_start = None
+
+    def _close_window(self):
+        start = self._window_start
+        m = [v if v > -math.inf else math.nan for v in self._window_max]
+        self._window_max = [-math.inf] * len(CHANNELS)
+
+        # Energy is the diff to the directly preceding window; after a gap or a missing value it is 0
+        # Energia to różnica względem bezpośrednio poprzedniego okna; po przerwie lub braku wartości wynosi 0
+        total = m[TOTAL]
+        if self._prev_start == start - WINDOW and not math.isnan(total - self._prev_total):
+            energy = round(total - self._prev_total, 4)
+        else:
+            energy = 0.0
+        self._prev_start, self._prev_total = start, total
+        scaled_pdc = m[PDC] / SF_DIVISORS.get(m[SF], 1)
+        self.windows.append(start, m + [energy, scaled_pdc])
+
+        interval_start = start - start % INTERVAL
+        if interval_start != self._interval_start:
+            if self._interval_start is not None:
+                self._close_interval()
+            self._interval_start = interval_start
+            self._interval_energy = 0.0
+            self._interval_windows = 0
+        self._interval_energy += energy
+        self._interval_windows += 1
+        self._emit(start + WINDOW, final=False)
+
+    def _close_interval(self):
+        record = self._emit(self._interval_start + INTERVAL, final=True)
+        self.intervals.append(self._interval_start, [record['actual_kWh'], record['predicted_kWh']])
+
+    def _emit(self, time_s, final):
+        actual = _clip_energy(round(self._interval_energy, 4))
+        predicted = self.predictions.get(self._interval_start)
+        progress = self._interval_windows / (INTERVAL // WINDOW)
+        record = {
+            "time": _iso(time_s),
+            "interval_start": _iso(self._interval_start),
+            "final": final,
+            "windows": self._interval_windows,
+            "actual_kWh": actual,
+            # Linear extrapolation of the open interval / Ekstrapolacja liniowa otwartego przedziału
+            "projected_kWh": round(actual / progress, 4) if not final else actual,
+            "predicted_kWh": None if predicted is None else round(predicted, 4),
+        }
+        if predicted is not None:
+            record["error_kWh"] = round(record["projected_kWh"] - predicted, 4)
+        if not final:
+            return record
+
+        if self.verbose:
+            pred_text = "n/a" if predicted is None else f"{predicted:.3f} kWh"
+            print(f" {record['interval_start']} | actual {actual:.3f} kWh | predicted {pred_text}")
+        if self.log_file:
+            os.makedirs(os.path.dirname(os.path.abspath(self.log_file)), exist_ok=True)
+            with open(self.log_file, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record) + "\n")
+        return record
+
+    def current(self):
+        """
+        Live nowcast of the open 15-min interval (actual so far, projected and predicted energy).
+        Bieżący nowcast otwartego przedziału 15 min (dotychczasowa, prognozowana i przewidziana energia).
+        """
+        with self._lock:
+            if self._interval_start is None:
+                return None
+            return self._emit(self._interval_start + self._interval_windows * WINDOW, final=False)
+
+    def stats(self):
+        return {
+            "messages": self.messages,
+            "ignored": self.ignored,
+            "late": self.late,
+            "windows": self.windows.count,
+            "intervals": self.intervals.count,
+            "mean_latency_us": round(self.total_latency / self.messages * 1e6, 1) if self.messages else None,
+            "max_latency_us": round(self.max_latency * 1e6, 1),
+        }
+
+
+def _clip_energy(energy):
+    # Same outlier rule as DataMerger: negative -> 0, above 2 kWh -> 0
+    # Ta sama reguła odrzucania co w DataMerger: ujemne -> 0, powyżej 2 kWh -> 0
+    return 0.0 if energy < 0 or energy > 2.0 else energy
+
+
+def _epoch_seconds(times):
+    # Timezone-aware datetimes -> int epoch seconds, whatever the datetime unit
+    # Daty ze strefą czasową -> sekundy epoki (int), niezależnie od jednostki czasu
+    return ((times - pd.Timestamp(0, tz='UTC')) // pd.Timedelta(seconds=1)).to_numpy(dtype=np.int64)
+
+
+def _iso(time_s):
+    return datetime.fromtimestamp(time_s, tz=timezone.utc).isoformat()
+
+
+def replay(aggregator, mqtt_file, chunksize=100000):
+    """
+    Feeds a collected MQTT CSV (local timestamps, as written by mqtt_data_collector.py) through the
+    aggregator in chunks, so the memory use is the same as in live mode.
+    Przepuszcza zebrany plik CSV MQTT (czas lokalny, jak zapisuje mqtt_data_collector.py) przez agregator
+    partiami, więc zużycie pamięci jest takie samo jak w trybie na żywo.
+    """
+    aggregator.predictions.refresh(now_s=0)
+    for chunk in pd.read_csv(mqtt_file, header=None, names=['timestamp', 'topic', 'value'], chunksize=chunksize):
+        times = pd.to_datetime(chunk['timestamp'], errors='coerce').dt.tz_localize(
+            'Europe/Warsaw', ambiguous='NaT', nonexistent='NaT')
+        valid = times.notna().to_numpy()
+        seconds = _epoch_seconds(times[valid])
+        for time_s, topic, value in zip(seconds.tolist(), chunk['topic'][valid].astype(str).str.strip().tolist(),
+                                        chunk['value'][valid].tolist()):
+            aggregator.on_value(time_s, topic, value)
+    aggregator.flush()
+
+
+def run_live(aggregator):
+    # paho is needed only in live mode / paho jest potrzebne tylko w trybie na żywo
+    import paho.mqtt.client as mqtt
+    from mqtt_data_collector import BROKER, PORT, USERNAME, PASSWORD, TOPIC
+
+    def on_connect(client, userdata, flags, rc):
+        print(" Connected to MQTT with code: " + str(rc))
+        client.subscribe(TOPIC)
+
+    def on_message(client, userdata, msg):
+        aggregator.on_value(time.time(), msg.topic, msg.payload.decode(errors="ignore"))
+
+    aggregator.predictions.refresh()
+    client = mqtt.Client()
+    client.username_pw_set(USERNAME, PASSWORD)
+    client.on_connect = on_connect
+    client.on_message = on_message
+    client.connect(BROKER, PORT, 60)
+    client.loop_start()
+
+    # The main loop closes windows on time, reloads predictions and prints statistics
+    # Pętla główna zamyka okna na czas, wczytuje predykcje ponownie i wypisuje statystyki
+    last_refresh = last_stats = time.monotonic()
+    try:
+        while True:
+            time.sleep(1)
+            aggregator.advance(time.time())
+            if time.monotonic() - last_refresh >= REFRESH_SECONDS:
+                last_refresh = time.monotonic()
+                aggregator.predictions.refresh()
+            if time.monotonic() - last_stats >= STATS_INTERVAL:
+                last_stats = time.monotonic()
+                print(f" {datetime.now().isoformat()} | nowcast: {aggregator.current()} | stats: {aggregator.stats()}")
+    except KeyboardInterrupt:
+        print(" Stopping nowcast stream...")
+    finally:
+        client.loop_stop()
+        client.disconnect()
+        aggregator.flush()
+        print(f" Nowcast stopped: {aggregator.stats()}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Streaming nowcast from MQTT / Nowcast strumieniowy z MQTT")
+    parser.add_argument("--replay", help="MQTT CSV file to replay instead of the live broker")
+    parser.add_argument("--predictions", help="prediction file (default: newest predictions/forecast_*)")
+    parser.add_argument("--quiet", action="store_true", help="do not print every 15-min interval")
+    args = parser.parse_args()
+
+    aggregator = StreamAggregator(PredictionLookup(args.predictions), verbose=not args.quiet)
+    if args.replay:
+        replay(aggregator, args.replay)
+        print(f" Replay finished: {aggregator.stats()}")
+    else:
+        run_live(aggregator)
+
+
+if __name__ == "__main__":
+    main()
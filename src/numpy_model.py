@@ -0,0 +1,120 @@
+import os
+import numpy as np
+
+# Activations supported by the NumPy forward pass
+# Funkcje aktywacji obsługiwane przez przejście w przód w NumPy
+ACTIVATIONS = {
+    "relu": lambda x: np.maximum(x, 0),
+    "linear": lambda x: x,
+}
+
+
+def export_numpy_model(model, scaler, npz_path, onnx_path=None):
+    """
+    Exports Dense layer weights of a Keras MLP and StandardScaler parameters to a compact .npz file.
+    Optionally writes an ONNX file as well (requires tf2onnx).
+    Eksportuje wagi warstw Dense sieci MLP z Keras i parametry StandardScaler do zwartego pliku .npz.
+    Opcjonalnie zapisuje również plik ONNX (wymaga tf2onnx).
+    """
+    arrays = _keras_arrays(model, scaler)
+    np.savez_compressed(npz_path, **arrays)
+    print(f" NumPy model exported to {npz_path}")  # Model NumPy wyeksportowany
+
+    if onnx_path is not None:
+        try:
+            import tf2onnx
+            import tensorflow as tf
+        except ImportError:
+            print(" tf2onnx not installed - skipping ONNX export.")  # Brak tf2onnx - pomijam eksport ONNX
+            return
+        spec = (tf.TensorSpec((None, model.input_shape[-1]), tf.float32, name="input"),)
+        tf2onnx.convert.from_keras(model, input_signature=spec, output_path=onnx_path)
+        print(f" ONNX model exported to {onnx_path}")  # Model ONNX wyeksportowany
+
+
+def _keras_arrays(model, scaler):
+    arrays = {"scaler_mean": scaler.mean_, "scaler_scale": scaler.scale_}
+    activations = []
+    for i, layer in enumerate(model.layers):
+        kernel, bias = layer.get_weights()
+        activation = layer.get_config()["activation"]
+        if activation not in ACTIVATIONS:
+            raise ValueError(f" Unsupported activation for NumPy export: {activation}")
+        arrays[f"kernel_{i}"] = kernel
+        arrays[f"bias_{i}"] = bias
+        activations.append(activation)
+    arrays["activations"] = np.array(activations)
+    return arrays
+
+
+class NumpyMLP:
+    """
+    TensorFlow-free MLP forward pass; the StandardScaler is fused into the first layer:
+    ((x - mean) / scale) @ W + b  ==  x @ (W / scale[:, None]) + (b - (mean / scale) @ W)
+    Przejście w przód MLP bez TensorFlow; StandardScaler jest wbudowany w pierwszą warstwę.
+    """
+
+    def __init__(self, kernels, biases, activations, scaler_mean, scaler_scale):
+        kernels = [np.asarray(k, dtype=np.float64) for k in kernels]
+        biases = [np.asarray(b, dtype=np.float64) for b in biases]
+        mean = np.asarray(scaler_mean, dtype=np.float64)
+        scale = np.asarray(scaler_scale, dtype=np.float64)
+
+        biases[0] = biases[0] - (mean / scale) @ kernels[0]
+        kernels[0] = kernels[0] / scale[:, None]
+
+        self.kernels = kernels
+        self.biases = biases
+        self.activations = [ACTIVATIONS[a] for a in activations]
+
+    @property
+    def n_features_in_(self):
+        # Number of input features (as in sklearn) / Liczba cech wejściowych (jak w sklearn)
+        return self.kernels[0].shape[0]
+
+    @classmethod
+    def load(cls, npz_path):
+        with np.load(npz_path) as data:
+            return cls._from_arrays(data)
+
+    @classmethod
+    def from_keras(cls, model, scaler):
+        return cls._from_arrays(_keras_arrays(model, scaler))
+
+    @classmethod
+    def _from_arrays(cls, data):
+        n_layers = len(data["activations"])
+        return cls(
+            [data[f"kernel_{i}"] for i in range(n_layers)],
+            [data[f"bias_{i}"] for i in range(n_layers)],
+            [str(a) for a in data["activations"]],
+            data["scaler_mean"],
+            data["scaler_scale"],
+        )
+
+    def predict(self, X, verbose=0):
+        # Same output shape as keras Model.predict: (n_samples, 1); X is unscaled
+        # Ten sam kształt wyniku co keras Model.predict: (n_próbek, 1); X nie jest skalowane
+        out = np.asarray(X, dtype=np.float64)
+        for kernel, bias, activation in zip(self.kernels, self.biases, self.activations):
+            out = activation(out @ kernel + bias)
+        return out
+
+
+def resolve_model_path(models_dir):
+    """
+    Returns the exported .npz model if it is at least as new as the Keras model, otherwise the .keras file.
+    With MODEL_ENGINE=hgb or linear the model of that engine is returned (see model_engines.py).
+    Zwraca wyeksportowany model .npz, jeśli jest co najmniej tak nowy jak model Keras, w przeciwnym razie plik .keras.
+    Przy MODEL_ENGINE=hgb lub linear zwracany jest model tego silnika (patrz model_engines.py).
+    """
+    engine = os.getenv("MODEL_ENGINE", "keras")
+    if engine != "keras":
+        return os.path.join(models_dir, f"model_{engine}.joblib")
+
+    keras_path = os.path.join(models_dir, "model_trained.keras")
+    npz_path = os.path.join(models_dir, "model_trained.npz")
+    if os.path.exists(npz_path) and (not os.path.exists(keras_path) or
+                                     os.path.getmtime(npz_path) >= os.path.getmtime(keras_path)):
+        return npz_path
+    return keras_path
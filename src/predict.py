@@ -1,8 +1,13 @@
+import sys
+
+# --profile-startup prints per-module import times (must run before other imports)
+# --profile-startup wypisuje czasy importu modułów (musi działać przed innymi importami)
+if "--profile-startup" in sys.argv:
+    import startup_profile
+    startup_profile.enable()
+
 from predictor import Predictor
-from visualizer import Visualizer
-import pandas as pd
 from datetime import datetime
-import sys
 import os
 
 from dotenv import load_dotenv
@@ -23,32 +28,49 @@ sys.path.append(data_dir)  # dodaj katalog z danymi do ścieżki importu / add d
 # Import forecast download function
 # Import funkcji pobierania prognozy
 from download_forecast import download_solcast_forecast
+from storage import get_storage, dataset_name
+from numpy_model import resolve_model_path
 
-def main():
+def load_predictor():
+    # Load model and scaler paths
+    # Wczytaj ścieżki do modelu i skalera
+    # (exported NumPy model .npz is preferred - no TensorFlow needed)
+    # (preferowany jest wyeksportowany model NumPy .npz - bez TensorFlow)
+    model_path = resolve_model_path(models_dir)
+    scaler_path = os.path.join(models_dir, "production_scaler.pkl")
+    return Predictor(model_path, scaler_path)  # utwórz obiekt Predictor / create Predictor object
+
+
+def run_prediction(predictor=None, force_refresh=False, plot=True, all_days=False):
+    """
+    One prediction run: download (or demo) forecast, predict, save results, daily sums and plot.
+    A loaded predictor can be passed in, so a long-running process (scheduler.py) keeps the model warm.
+    Jedno uruchomienie predykcji: pobranie (lub demo) prognozy, predykcja, zapis wyników, sum dziennych i wykresu.
+    Można przekazać wczytany predyktor, aby długo działający proces (scheduler.py) trzymał model w pamięci.
+    """
     print(" Start predykcji...")  # Start prediction...
 
     use_demo = os.getenv("USE_DEMO", "0")  # tryb DEMO lub ONLINE / demo or online mode
+    storage = get_storage()  # CSV lub Parquet / CSV or Parquet
 
     if use_demo == "1":
         print(" Tryb DEMO - wczytuję dane z lokalnego pliku demo...")  # Demo mode - loading local demo file
         forecast_file = os.path.join(data_dir, "solcast_forecast_2025-07-25_demo.csv")
-        forecast = pd.read_csv(forecast_file)
+        forecast = storage.read(dataset_name(forecast_file))
     else:
         print(" Tryb ONLINE - pobieram i wczytuję najnowszy forecast...")  # Online mode - download and load latest forecast
-        download_solcast_forecast()
+        # --force-refresh skips the forecast cache / --force-refresh pomija cache prognoz
+        download_solcast_forecast(force_refresh=force_refresh)
         forecast_file = os.path.join(data_dir, "solcast_forecast.csv")
-        forecast = pd.read_csv(forecast_file)
+        forecast = storage.read(dataset_name(forecast_file))
 
     # Prepare folder to save results in parent directory relative to src
     # Przygotuj katalog do zapisu wyników w katalogu nadrzędnym względem src
     predictions_dir = os.path.join(parent_dir, "predictions")
     os.makedirs(predictions_dir, exist_ok=True)
 
-    # Load model and scaler paths
-    # Wczytaj ścieżki do modelu i skalera
-    model_path = os.path.join(models_dir, "model_trained.keras")
-    scaler_path = os.path.join(models_dir, "production_scaler.pkl")
-    predictor = Predictor(model_path, scaler_path)  # utwórz obiekt Predictor / create Predictor object
+    if predictor is None:
+        predictor = load_predictor()
 
     # Perform prediction
     # Wykonaj predykcję
@@ -62,27 +84,41 @@ def main():
     # Sufiks plików wynikowych zależny od trybu DEMO lub LIVE
     suffix = "_demo" if use_demo == "1" else ""
 
-    # Save prediction to CSV
-    # Zapisz predykcję do pliku CSV
-    csv_pred = os.path.join(predictions_dir, f"forecast{suffix}_{timestamp}.csv")
-    prediction.to_csv(csv_pred, index=False)
-    print(f" Saved forecast to {csv_pred}")
+    # Save prediction (CSV or Parquet, depending on STORAGE_BACKEND)
+    # Zapisz predykcję (CSV lub Parquet, zależnie od STORAGE_BACKEND)
+    pred_dataset = os.path.join(predictions_dir, f"forecast{suffix}_{timestamp}")
+    storage.write(prediction, pred_dataset, time_column='period_end')
+    print(f" Saved forecast to {storage.path(pred_dataset)}")
 
-    # Aggregate daily sums and save to CSV
-    # Agreguj sumy dzienne i zapisz do pliku CSV
+    # Aggregate daily sums and save
+    # Agreguj sumy dzienne i zapisz
     df_sum = predictor.aggregate_daily(prediction)
-    csv_sum = os.path.join(predictions_dir, f"daily_sum{suffix}_{timestamp}.csv")
-    df_sum.to_csv(csv_sum, index=False)
-    print(f" Saved daily sum to {csv_sum}")
+    sum_dataset = os.path.join(predictions_dir, f"daily_sum{suffix}_{timestamp}")
+    storage.write(df_sum, sum_dataset)
+    print(f" Saved daily sum to {storage.path(sum_dataset)}")
 
-    # Generate plot and save as PDF
-    # Wygeneruj wykres i zapisz jako PDF
+    # Generate plot and save as PDF (skipped with --no-plot - matplotlib is then never imported)
+    # Wygeneruj wykres i zapisz jako PDF (pomijane z --no-plot - matplotlib nie jest wtedy importowany)
+    if not plot:
+        print(" Prediction completed successfully.")  # Predykcja zakończona pomyślnie.
+        return
+
+    from visualizer import Visualizer
     viz = Visualizer()
     pdf_plot = os.path.join(predictions_dir, f"plot{suffix}_{timestamp}.pdf")
-    viz.save_best_day(prediction, pdf_plot)
+    if all_days:
+        viz.save_days(prediction, pdf_plot)  # one page per forecast day / jedna strona na dzień prognozy
+    else:
+        viz.save_best_day(prediction, pdf_plot)
     print(f" Plot saved as {pdf_plot}")
 
     print(" Prediction completed successfully.")  # Predykcja zakończona pomyślnie.
 
+
+def main():
+    run_prediction(force_refresh="--force-refresh" in sys.argv, plot="--no-plot" not in sys.argv,
+                   all_days="--plot-all-days" in sys.argv)
+
+
 if __name__ == "__main__":
     main()
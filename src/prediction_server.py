@@ -0,0 +1,258 @@
+# prediction_server.py
+# Długo działający serwer predykcji - model i skaler pozostają w pamięci
+# Long-running prediction server - model and scaler stay resident in memory
+#
+# Usage / Użycie:
+#   python prediction_server.py                              # HTTP on 127.0.0.1:8765
+#   python prediction_server.py --unix-socket /tmp/pv.sock   # Unix socket
+#
+#   curl -X POST localhost:8765/predict -H "Content-Type: application/json" \
+#        -d '[{"period_end": "2025-07-26T10:15:00Z", "ghi": 540, "air_temp": 24}]'
+
+import os
+import io
+import json
+import time
+import queue
+import socket
+import argparse
+import threading
+import socketserver
+import numpy as np
+import pandas as pd
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from predictor import Predictor
+from numpy_model import resolve_model_path
+
+# Set base directory of the project (parent to src folder)
+# Ustal katalog główny projektu (nadrzędny względem folderu src)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODEL_PATH = resolve_model_path(os.path.join(BASE_DIR, "models"))
+SCALER_PATH = os.path.join(BASE_DIR, "models", "production_scaler.pkl")
+
+ARROW_CONTENT_TYPE = "application/vnd.apache.arrow.stream"
+
+
+class BatchingPredictor:
+    """
+    Collects concurrent requests into a single model.predict call and reloads the model when its file changes.
+    Łączy równoczesne żądania w jedno wywołanie model.predict i przeładowuje model, gdy zmieni się jego plik.
+    """
+
+    def __init__(self, model_path, scaler_path, max_batch_rows=4096, max_wait_ms=5, reload_interval=2.0):
+        self.model_path = model_path
+        self.scaler_path = scaler_path
+        self.max_batch_rows = max_batch_rows
+        self.max_wait = max_wait_ms / 1000
+        self.reload_interval = reload_interval
+
+        self._queue = queue.Queue()
+        self._lock = threading.Lock()
+        self._load()
+
+        # Counters / Liczniki
+        self.requests = 0
+        self.batches = 0
+        self.rows = 0
+        self.reloads = 0
+
+        threading.Thread(target=self._run, name="predict-batcher", daemon=True).start()
+        threading.Thread(target=self._watch_model, name="model-watcher", daemon=True).start()
+
+    def predict(self, forecast_df):
+        """
+        Returns energy_15min_pred_kWh for forecast rows (period_end, ghi, air_temp); blocks until the batch is done.
+        Zwraca energy_15min_pred_kWh dla wierszy prognozy (period_end, ghi, air_temp); czeka na wykonanie partii.
+        """
+        # The job keeps the predictor its features were prepared with - after a hot reload the new model
+        # may expect different inputs, so the batcher runs each job on its own predictor
+        # Zadanie zachowuje predyktor, którym przygotowano cechy - po przeładowaniu nowy model
+        # może oczekiwać innych wejść, więc każde zadanie jest liczone swoim predyktorem
+        with self._lock:
+            predictor = self.predictor
+        df, features = predictor.prepare_forecast_data(forecast_df)
+        job = {"X": df[features].to_numpy(dtype=float), "predictor": predictor,
+               "done": threading.Event(), "result": None, "error": None}
+        self._queue.put(job)
+        job["done"].wait()
+        if job["error"] is not None:
+            raise job["error"]
+        return job["result"]
+
+    def stats(self):
+        return {
+            "requests": self.requests,
+            "batches": self.batches,
+            "rows": self.rows,
+            "reloads": self.reloads,
+            "queue_depth": self._queue.qsize(),
+            "model_mtime": self._model_mtime,
+        }
+
+    def _load(self):
+        predictor = Predictor(self.model_path, self.scaler_path, verbose=False)
+        with self._lock:
+            self.predictor = predictor
+            self._model_mtime = self._mtime()
+
+    def _mtime(self):
+        # The scaler file is watched only by the keras backend - .npz and .joblib models have no scaler
+        # Plik skalera jest obserwowany tylko dla backendu keras - modele .npz i .joblib nie mają skalera
+        paths = [self.model_path] if self.predictor.scaler is None else [self.model_path, self.scaler_path]
+        return max(os.path.getmtime(path) for path in paths)
+
+    def _watch_model(self):
+        # Hot reload: swap in a new Predictor when model or scaler file changes
+        # Przeładowanie w locie: podmień Predictor, gdy zmieni się plik modelu lub skalera
+        while True:
+            time.sleep(self.reload_interval)
+            try:
+                if self._mtime() != self._model_mtime:
+                    print(" Model file changed - reloading...")  # Plik modelu zmieniony - przeładowuję...
+                    self._load()
+                    self.reloads += 1
+            except Exception as e:
+                print(f" Model reload failed, keeping previous model: {e}")
+
+    def _run(self):
+        while True:
+            jobs = [self._queue.get()]
+            rows = len(jobs[0]["X"])
+
+            # Wait a few milliseconds for more requests to join the batch
+            # Poczekaj kilka milisekund, aż do partii dołączą kolejne żądania
+            deadline = time.monotonic() + self.max_wait
+            while rows < self.max_batch_rows and time.monotonic() < deadline:
+                try:
+                    job = self._queue.get(timeout=max(0.0, deadline - time.monotonic()))
+                except queue.Empty:
+                    break
+                jobs.append(job)
+                rows += len(job["X"])
+
+            # One model.predict call per predictor (normally one; two right after a hot reload)
+            # Jedno wywołanie model.predict na predyktor (zwykle jeden; dwa zaraz po przeładowaniu)
+            groups = {}
+            for job in jobs:
+                groups.setdefault(id(job["predictor"]), []).append(job)
+            for group in groups.values():
+                try:
+                    y_pred = group[0]["predictor"].predict_features(np.concatenate([job["X"] for job in group]))
+                    start = 0
+                    for job in group:
+                        job["result"] = y_pred[start:start + len(job["X"])]
+                        start += len(job["X"])
+                except Exception as e:
+                    for job in group:
+                        job["error"] = e
+
+            self.requests += len(jobs)
+            self.batches += len(groups)
+            self.rows += rows
+            for job in jobs:
+                job["predictor"] = None  # nie trzymaj starego modelu w pamięci / do not keep the old model alive
+                job["done"].set()
+
+
+class PredictionHandler(BaseHTTPRequestHandler):
+    batcher = None
+
+    def do_GET(self):
+        if self.path == "/health":
+            self._send(200, "application/json", json.dumps(self.batcher.stats()).encode())
+        else:
+            self._send(404, "application/json", b'{"error": "not found"}')
+
+    def do_POST(self):
+        if self.path != "/predict":
+            self._send(404, "application/json", b'{"error": "not found"}')
+            return
+
+        body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        content_type = self.headers.get("Content-Type", "application/json")
+        try:
+            if content_type == ARROW_CONTENT_TYPE:
+                import pyarrow as pa
+                forecast = pa.ipc.open_stream(body).read_pandas()
+            else:
+                payload = json.loads(body)
+                # Accept a list of rows or {"forecasts": [...]} as returned by Solcast
+                # Akceptuj listę wierszy lub {"forecasts": [...]} jak w odpowiedzi Solcast
+                forecast = pd.DataFrame(payload["forecasts"] if isinstance(payload, dict) else payload)
+            y_pred = self.batcher.predict(forecast)
+        except (ValueError, KeyError) as e:
+            self._send(400, "application/json", json.dumps({"error": str(e)}).encode())
+            return
+        except Exception as e:
+            self._send(500, "application/json", json.dumps({"error": str(e)}).encode())
+            return
+
+        if content_type == ARROW_CONTENT_TYPE:
+            import pyarrow as pa
+            table = pa.table({"energy_15min_pred_kWh": y_pred})
+            sink = io.BytesIO()
+            with pa.ipc.new_stream(sink, table.schema) as writer:
+                writer.write_table(table)
+            self._send(200, ARROW_CONTENT_TYPE, sink.getvalue())
+        else:
+            self._send(200, "application/json",
+                       json.dumps({"energy_15min_pred_kWh": y_pred.tolist()}).encode())
+
+    def _send(self, status, content_type, body):
+        self.send_response(status)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def address_string(self):
+        # Unix socket clients have no address
+        # Klienci gniazda Unix nie mają adresu
+        return self.client_address[0] if self.client_address else "unix"
+
+
+class UnixHTTPServer(ThreadingHTTPServer):
+    address_family = socket.AF_UNIX
+
+    def server_bind(self):
+        socketserver.TCPServer.server_bind(self)
+        self.server_name = "localhost"
+        self.server_port = 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="PV prediction server / Serwer predykcji PV")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--unix-socket", help="listen on a Unix socket instead of TCP")
+    parser.add_argument("--model", default=MODEL_PATH)
+    parser.add_argument("--scaler", default=SCALER_PATH)
+    parser.add_argument("--max-batch-rows", type=int, default=4096)
+    parser.add_argument("--max-wait-ms", type=float, default=5)
+    parser.add_argument("--reload-interval", type=float, default=2.0, help="seconds between model file checks")
+    args = parser.parse_args()
+
+    PredictionHandler.batcher = BatchingPredictor(args.model, args.scaler, args.max_batch_rows,
+                                                  args.max_wait_ms, args.reload_interval)
+
+    if args.unix_socket:
+        if os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+        server = UnixHTTPServer(args.unix_socket, PredictionHandler)
+        print(f" Prediction server listening on unix:{args.unix_socket}")
+    else:
+        server = ThreadingHTTPServer((args.host, args.port), PredictionHandler)
+        print(f" Prediction server listening on http://{args.host}:{args.port}")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print(" Stopping prediction server...")
+    finally:
+        server.server_close()
+        if args.unix_socket and os.path.exists(args.unix_socket):
+            os.remove(args.unix_socket)
+
+
+if __name__ == "__main__":
+    main()
@@ -1,40 +1,63 @@
 import pandas as pd
 import numpy as np
-import joblib
-from tensorflow import keras
 import os
+from storage import get_storage
+from numpy_model import NumpyMLP
+from instrumentation import instrumented
+from solar_features import add_features, features_for_inputs, LATITUDE, LONGITUDE
 
 # Set path to outputs directory relative to this file location
 # Ustaw ścieżkę do katalogu outputs względem lokalizacji tego pliku
 current_dir = os.path.dirname(os.path.abspath(__file__))
 parent_dir = os.path.dirname(current_dir)
 outputs_dir = os.path.join(parent_dir, "outputs")
-os.makedirs(outputs_dir, exist_ok=True)
 
 class Predictor:
-    def __init__(self, model_path, scaler_path):
+    def __init__(self, model_path, scaler_path, verbose=True):
+        # verbose=False silences per-call messages (used by the prediction server)
+        # verbose=False wycisza komunikaty przy każdym wywołaniu (używane przez serwer predykcji)
+        self.verbose = verbose
         print(" Loading model and scaler...")  # Wczytuję model i skaler...
-        self.model = keras.models.load_model(model_path)
-        self.scaler = joblib.load(scaler_path)
+        if model_path.endswith(".npz"):
+            # NumPy backend - no TensorFlow needed, scaler is fused into the first layer
+            # Backend NumPy - bez TensorFlow, skaler jest wbudowany w pierwszą warstwę
+            self.model = NumpyMLP.load(model_path)
+            self.scaler = None
+        elif model_path.endswith(".joblib"):
+            # HistGBM / linear engine (model_engines.py) - takes raw features
+            # Silnik HistGBM / liniowy (model_engines.py) - przyjmuje surowe cechy
+            import joblib
+            self.model = joblib.load(model_path)
+            self.scaler = None
+        else:
+            import joblib
+            from tensorflow import keras
+            self.model = keras.models.load_model(model_path)
+            self.scaler = joblib.load(scaler_path)
         print(" Model and scaler loaded.")  # Model i skaler wczytane.
 
-    def prepare_forecast_data(self, df):
-        print(" Preparing forecast data...")  # Przygotowuję dane forecastu...
+        # Input features follow the loaded model: models trained before solar features take 4 inputs
+        # Cechy wejściowe zależą od wczytanego modelu: modele sprzed cech słonecznych mają 4 wejścia
+        n_inputs = self.scaler.n_features_in_ if self.scaler is not None else getattr(self.model, 'n_features_in_', 4)
+        self.features = features_for_inputs(n_inputs)
+
+        # Storage backend for outputs (CSV or Parquet, see storage.py)
+        # Backend magazynu dla wyników (CSV lub Parquet, patrz storage.py)
+        self.storage = get_storage()
+
+    def prepare_forecast_data(self, df, latitude=LATITUDE, longitude=LONGITUDE):
+        if self.verbose:
+            print(" Preparing forecast data...")  # Przygotowuję dane forecastu...
 
         # Convert period_end to datetime with UTC timezone
         # Konwersja period_end do datetime z UTC
         df['period_end'] = pd.to_datetime(df['period_end'], utc=True)
 
-        # Calculate decimal hour from timestamp
-        # Oblicz godziny dziesiętne z timestampu
-        df['hour_decimal'] = df['period_end'].dt.hour + df['period_end'].dt.minute / 60
-
-        # Add sine and cosine of hour to capture daily cyclicity
-        # Dodaj sinus i cosinus godziny dla modelowania cykliczności dobowej
-        df['sin_hour'] = np.sin(2 * np.pi * df['hour_decimal'] / 24)
-        df['cos_hour'] = np.cos(2 * np.pi * df['hour_decimal'] / 24)
+        # Time and solar features for the site (the same code as in training, see solar_features.py)
+        # Cechy czasowe i słoneczne dla instalacji (ten sam kod co w treningu, patrz solar_features.py)
+        add_features(df, 'period_end', latitude, longitude)
 
-        features = ['ghi', 'air_temp', 'sin_hour', 'cos_hour']  # cechy wejściowe / input features
+        features = self.features  # cechy wejściowe / input features
 
         # Check for missing columns in forecast data
         # Sprawdź brakujące kolumny w danych prognozy
@@ -42,28 +65,21 @@ class Predictor:
         if missing_cols:
             raise ValueError(f" Missing columns in forecast data: {missing_cols}")
 
-        print(" Forecast data prepared.")  # Dane forecastu przygotowane.
+        if self.verbose:
+            print(" Forecast data prepared.")  # Dane forecastu przygotowane.
 
         return df, features
 
+    @instrumented("predict")
     def predict(self, forecast_df):
         df, features = self.prepare_forecast_data(forecast_df)
 
-        # Extract feature matrix and scale it
-        # Pobierz macierz cech i skaluj ją
+        # Extract feature matrix
+        # Pobierz macierz cech
         X_pred = df[features].values
-        X_scaled = self.scaler.transform(X_pred)
 
         print(" Running prediction...")  # Uruchamiam predykcję...
-        y_pred = self.model.predict(X_scaled).flatten()
-
-        # Clip negative predictions to zero
-        # Zabezpieczenie przed wartościami ujemnymi
-        y_pred = np.clip(y_pred, 0, None)
-
-        # If GHI == 0 (no sun), predicted energy is also zero
-        # Jeśli GHI == 0 → energia też 0
-        y_pred[df['ghi'] == 0] = 0
+        y_pred = self.predict_features(X_pred)
 
         # Add prediction results as new column
         # Dodaj predykcję jako nową kolumnę
@@ -72,11 +88,32 @@ class Predictor:
         print(" Prediction finished.")  # Predykcja zakończona.
         return df
 
+    def predict_features(self, X_pred):
+        """
+        Runs the model on a raw feature matrix (columns: self.features, ghi first).
+        Uruchamia model na surowej macierzy cech (kolumny: self.features, ghi jako pierwsza).
+        """
+        # Scale features and predict
+        # Skaluj cechy i wykonaj predykcję
+        X_scaled = X_pred if self.scaler is None else self.scaler.transform(X_pred)
+        y_pred = self.model.predict(X_scaled, verbose=0).flatten()
+
+        # Clip negative predictions to zero
+        # Zabezpieczenie przed wartościami ujemnymi
+        y_pred = np.clip(y_pred, 0, None)
+
+        # If GHI == 0 (no sun), predicted energy is also zero
+        # Jeśli GHI == 0 → energia też 0
+        y_pred[X_pred[:, 0] == 0] = 0
+        return y_pred
+
     def save_prediction(self, df):
         print(" Saving forecast to outputs/forecast_with_prediction.csv...")  # Zapisuję prognozę do pliku...
-        df.to_csv(os.path.join(outputs_dir, "forecast_with_prediction.csv"), index=False)
+        os.makedirs(outputs_dir, exist_ok=True)
+        self.storage.write(df, os.path.join(outputs_dir, "forecast_with_prediction"), time_column='period_end')
         print(" Saved.")  # Zapisano.
 
+    @instrumented("aggregate")
     def aggregate_daily(self, df):
         print(" Aggregating daily forecast...")  # Agreguję prognozę dzienną...
 
@@ -99,7 +136,8 @@ class Predictor:
 
         # Save daily sum to CSV
         # Zapisz sumę dzienną do pliku CSV
-        df_sum.to_csv(os.path.join(outputs_dir, "forecast_daily_sum.csv"), index=False)
+        os.makedirs(outputs_dir, exist_ok=True)
+        self.storage.write(df_sum, os.path.join(outputs_dir, "forecast_daily_sum"))
 
         print(" Daily aggregation saved as outputs/forecast_daily_sum.csv.")  # Agregacja zapisana
         return df_sum
@@ -1,17 +1,60 @@
+"""
+Event-driven job scheduler: sleeps until the next due time of cron-like schedules and runs jobs in-process
+in a worker pool, with the Predictor kept warm between runs (reloaded only when the model file changes).
+Runs missed while the scheduler was stopped are caught up once after a restart; a job that is still running
+is not started again (overlap protection); every run is stored in the run history. Batch and retrain run in a
+child process that is killed at their timeout.
+
+Harmonogram zadań sterowany zdarzeniami: śpi do najbliższego terminu z harmonogramów w stylu cron i uruchamia
+zadania w procesie w puli wątków, z modelem Predictor trzymanym w pamięci między uruchomieniami (przeładowanie
+tylko po zmianie pliku modelu). Uruchomienia pominięte podczas zatrzymania są nadrabiane raz po restarcie;
+zadanie, które nadal działa, nie jest uruchamiane ponownie; każde uruchomienie trafia do historii. Zadania batch
+i retrain działają w procesie potomnym, zabijanym po przekroczeniu limitu czasu.
+
+Usage / Użycie:
+    python scheduler.py                  # run forever / działaj bez końca
+    python scheduler.py --list           # jobs and next due times / zadania i najbliższe terminy
+    python scheduler.py --run predict    # run one job now / uruchom zadanie teraz
+    python scheduler.py --history 20     # last runs / ostatnie uruchomienia
+"""
+
+import os
+import json
 import time
+import signal
+import argparse
 import datetime
-import subprocess
+import threading
 import traceback
-import os
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
+from dotenv import load_dotenv
 
-#  Scheduled test times: (hour, minute)
-#  Zaplanowane czasy uruchomienia (godzina, minuta)
-SCHEDULED_TIMES = [(12, 0), (20, 0), (4, 0)]
+load_dotenv()  # załaduj zmienne środowiskowe / load environment variables
 
 #  Set base directory of the project (where this file is located)
 #  Ustal katalog główny projektu (tam gdzie jest ten plik)
 BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_DIR = os.path.dirname(BASE_DIR)
 LOG_FILE = os.path.join(BASE_DIR, "log.txt")  # ścieżka do pliku logów / log file path
+STATE_FILE = os.path.join(PROJECT_DIR, "outputs", "scheduler_state.json")
+HISTORY_FILE = os.path.join(PROJECT_DIR, "outputs", "scheduler_history.jsonl")
+
+#  Cron schedules (minute hour day month weekday); empty disables a job
+#  Harmonogramy cron (minuta godzina dzień miesiąc dzień_tygodnia); pusty wyłącza zadanie
+SCHEDULES = {
+    "predict": os.getenv("SCHEDULE_PREDICT", "0 4,12,20 * * *"),
+    "batch": os.getenv("SCHEDULE_BATCH", ""),
+    "retrain": os.getenv("SCHEDULE_RETRAIN", ""),
+}
+TIMEOUTS = {
+    "predict": float(os.getenv("TIMEOUT_PREDICT_MIN", "15")) * 60,
+    "batch": float(os.getenv("TIMEOUT_BATCH_MIN", "30")) * 60,
+    "retrain": float(os.getenv("TIMEOUT_RETRAIN_MIN", "120")) * 60,
+}
+WORKERS = int(os.getenv("SCHEDULER_WORKERS", "2"))
+CATCHUP_HOURS = float(os.getenv("SCHEDULER_CATCHUP_HOURS", "12"))  # 0 = no catch-up / bez nadrabiania
+
 
 def log(text):
     """Log message with timestamp to console and log file"""
@@ -22,50 +65,354 @@ def log(text):
     with open(LOG_FILE, "a", encoding="utf-8") as f:
         f.write(line + "\n")
 
-def run_predict():
-    """Run the predict.py script and log output"""
-    # Uruchom skrypt predict.py i zapisz logi
-    try:
-        log(" Starting predict.py")
-        result = subprocess.run(["python", "predict.py"], capture_output=True, text=True)
 
-        if result.returncode == 0:
-            log(" predict.py completed successfully.")
+class CronExpression:
+    """
+    Five-field cron expression (minute hour day month weekday) with *, lists, ranges and steps.
+    Weekday 0 or 7 is Sunday; when both day and weekday are restricted, either one matches (as in cron).
+    Pięciopolowe wyrażenie cron z *, listami, zakresami i krokami. Dzień tygodnia 0 lub 7 to niedziela.
+    """
+    RANGES = [(0, 59), (0, 23), (1, 31), (1, 12), (0, 7)]
+
+    def __init__(self, expression):
+        fields = expression.split()
+        if len(fields) != 5:
+            raise ValueError(f" Invalid cron expression (5 fields expected): {expression!r}")
+        self.expression = expression
+        self.minutes, self.hours, self.days, self.months, weekdays = (
+            _parse_field(field, low, high) for field, (low, high) in zip(fields, self.RANGES))
+        self.weekdays = {day % 7 for day in weekdays}
+        self.any_day = fields[2] == "*"
+        self.any_weekday = fields[4] == "*"
+
+    def _day_matches(self, date):
+        day_ok = date.day in self.days
+        weekday_ok = (date.weekday() + 1) % 7 in self.weekdays  # cron: 0 = Sunday / 0 = niedziela
+        if self.any_day or self.any_weekday:
+            return day_ok and weekday_ok
+        return day_ok or weekday_ok
+
+    def next_after(self, moment):
+        """
+        First due time strictly after `moment` (naive local time, whole minutes).
+        Pierwszy termin ściśle po `moment` (naiwny czas lokalny, pełne minuty).
+        """
+        start = moment.replace(second=0, microsecond=0) + datetime.timedelta(minutes=1)
+        for offset in range(366 * 8):  # covers 29 February / obejmuje 29 lutego
+            date = start.date() + datetime.timedelta(days=offset)
+            if date.month not in self.months or not self._day_matches(date):
+                continue
+            for hour in sorted(self.hours):
+                if offset == 0 and hour < start.hour:
+                    continue
+                for minute in sorted(self.minutes):
+                    due = datetime.datetime.combine(date, datetime.time(hour, minute))
+                    if due >= start:
+                        return due
+        raise ValueError(f" Cron expression never matches: {self.expression!r}")
+
+
+def _parse_field(field, low, high):
+    values = set()
+    for part in field.split(","):
+        spec, _, step = part.partition("/")
+        if spec == "*":
+            first, last = low, high
+        elif "-" in spec:
+            first, last = (int(v) for v in spec.split("-"))
         else:
-            log(f" predict.py returned error (code: {result.returncode}).")
-            log(f" stdout:\n{result.stdout}")
-            log(f" stderr:\n{result.stderr}")
+            first = last = int(spec)
+            if step:
+                last = high
+        if not low <= first <= last <= high:
+            raise ValueError(f" Cron field out of range {low}-{high}: {part!r}")
+        values.update(range(first, last + 1, int(step) if step else 1))
+    return values
 
-    except Exception as e:
-        log(f" Exception while running predict.py: {e}")
-        log(traceback.format_exc())
 
-last_run = None  # store last run time to avoid duplicate runs in the same minute
+class WarmPredictor:
+    """
+    Keeps the Predictor loaded between runs; reloads it when the model file or its modification time changes.
+    Trzyma Predictor w pamięci między uruchomieniami; przeładowuje go po zmianie pliku modelu lub jego daty.
+    """
 
-while True:
-    now = datetime.datetime.now()
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.predictor = None
+        self.key = None
 
-    if (now.hour, now.minute) in SCHEDULED_TIMES:
-        current_time_str = f"{now.date()}-{now.hour}-{now.minute}"
+    def get(self):
+        from predict import load_predictor, models_dir
+        from numpy_model import resolve_model_path
 
-        if current_time_str != last_run:
-            log(f" Time to run predict.py at {now.hour:02d}:{now.minute:02d}")
-            run_predict()
-            last_run = current_time_str
+        model_path = resolve_model_path(models_dir)
+        key = (model_path, os.path.getmtime(model_path) if os.path.exists(model_path) else None)
+        with self.lock:
+            if key != self.key:
+                self.predictor = load_predictor()
+                self.key = key
+            return self.predictor
 
-            # Wait 61 seconds to avoid running twice within the same minute
-            # Poczekaj minutę, aby nie uruchomić skryptu dwa razy w tym samym czasie
-            time.sleep(61)
-        else:
-            # Log heartbeat every minute that the scheduler is alive
-            # Co minutę loguj, że program działa i czeka
-            if now.second % 60 == 0:
-                log(f" Waiting... ({now.hour:02d}:{now.minute:02d})")
-            time.sleep(10)
 
+warm_predictor = WarmPredictor()
+
+
+def job_predict():
+    from predict import run_prediction
+    run_prediction(predictor=warm_predictor.get())
+
+
+def job_batch():
+    from batch_forecast import run_batch
+    run_batch()
+
+
+def job_retrain():
+    # Ingest MQTT data collected since the last run and refresh the Solcast history, then warm-start
+    # retraining on data added since the last training (model_trainer.py)
+    # Wczytaj dane MQTT zebrane od ostatniego uruchomienia i odśwież historię Solcast, potem douczanie
+    # na danych dodanych od ostatniego treningu (model_trainer.py)
+    from data_cleaner import MQTTDataCleaner
+    from data_merger import DataMerger
+    from model_trainer import ModelTrainer
+
+    MQTTDataCleaner(os.path.join(PROJECT_DIR, "data", "mqtt_data.csv")).run_incremental()
+    solcast_path = os.path.join(PROJECT_DIR, "data", "solcast_history.csv")
+    if os.getenv("USE_DEMO", "0") == "1" or not os.getenv("SOLCAST_API_KEY"):
+        log(" retrain: DEMO mode or no SOLCAST_API_KEY - Solcast history not refreshed")
     else:
-        # Log heartbeat every minute when not in scheduled time
-        # Co minutę loguj, że program działa i czeka
-        if now.second % 60 == 0:
-            log(f" Waiting... ({now.hour:02d}:{now.minute:02d})")
-        time.sleep(10)
+        from solcast_history_downloader import update_solcast_history
+        update_solcast_history(solcast_path)
+
+    merger = DataMerger(os.path.join(PROJECT_DIR, "outputs", "inverter_data_plus_power.csv"), solcast_path)
+    training_data = merger.match_and_prepare_data()
+    if training_data.empty:
+        raise RuntimeError("No training data available")
+    ModelTrainer(training_data).retrain()
+
+
+JOBS = {"predict": job_predict, "batch": job_batch, "retrain": job_retrain}
+
+# Jobs run in a child process that is killed at the timeout; predict stays in a thread (warm Predictor)
+# Zadania uruchamiane w procesie potomnym, zabijanym po przekroczeniu limitu; predict zostaje w wątku
+PROCESS_JOBS = ("batch", "retrain")
+
+
+class JobProcessError(Exception):
+    # Error reported by a job process (message already includes the exception type)
+    # Błąd zgłoszony przez proces zadania (komunikat zawiera już typ wyjątku)
+    pass
+
+
+class JobTimeout(JobProcessError):
+    pass
+
+
+def _run_child(name, errors):
+    # Entry point of a job process: the error text is passed back to the scheduler
+    # Punkt wejścia procesu zadania: treść błędu jest przekazywana do harmonogramu
+    try:
+        JOBS[name]()
+    except Exception as e:
+        errors.put(f"{type(e).__name__}: {e}")
+        raise
+
+
+class Scheduler:
+    def __init__(self, schedules=SCHEDULES, timeouts=TIMEOUTS, workers=WORKERS, catchup_hours=CATCHUP_HOURS):
+        self.crons = {name: CronExpression(expr) for name, expr in schedules.items() if expr.strip()}
+        self.timeouts = timeouts
+        self.catchup = datetime.timedelta(hours=catchup_hours)
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="job")
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.running = {}  # job -> run record / zadanie -> rekord uruchomienia
+        self.state = _load_json(STATE_FILE) or {}
+
+    def run_forever(self):
+        log(" Scheduler started: " + ", ".join(f"{n} [{c.expression}]" for n, c in self.crons.items()))
+        now = datetime.datetime.now()
+        next_due = {name: self._first_due(name, cron, now) for name, cron in self.crons.items()}
+
+        while not self.stop_event.is_set():
+            now = datetime.datetime.now()
+            for name, due in next_due.items():
+                if due <= now:
+                    self.submit(name, due, catch_up=now - due > datetime.timedelta(minutes=1))
+                    next_due[name] = self.crons[name].next_after(max(due, now))
+            self._check_timeouts()
+
+            # Sleep until the next due time (or the nearest job deadline); a signal wakes the loop up
+            # Śpij do najbliższego terminu (lub najbliższego limitu czasu zadania); sygnał budzi pętlę
+            wake = min(next_due.values(), default=now + datetime.timedelta(hours=1))
+            with self.lock:
+                deadlines = [r["deadline"] for n, r in self.running.items() if n not in PROCESS_JOBS]
+            wait = (min([wake, *deadlines]) - datetime.datetime.now()).total_seconds()
+            self.stop_event.wait(max(0.0, min(wait, 3600)))
+
+        log(" Scheduler stopping - waiting for running jobs...")
+        self.pool.shutdown(wait=True)
+        log(" Scheduler stopped.")
+
+    def stop(self, *_):
+        self.stop_event.set()
+
+    def submit(self, name, scheduled, catch_up=False):
+        with self.lock:
+            if name in self.running:
+                # Overlap protection: the previous run is still active
+                # Ochrona przed nakładaniem: poprzednie uruchomienie nadal trwa
+                log(f" {name}: previous run still active - skipping run due {scheduled:%Y-%m-%d %H:%M}")
+                self._record({"job": name, "scheduled": scheduled.isoformat(), "status": "skipped",
+                              "error": "previous run still active"})
+                return None
+            record = {"job": name, "scheduled": scheduled.isoformat(), "catch_up": catch_up,
+                      "started": datetime.datetime.now().isoformat(timespec="seconds"),
+                      "deadline": datetime.datetime.now() + datetime.timedelta(seconds=self.timeouts.get(name, 3600))}
+            self.running[name] = record
+            self.state[name] = scheduled.isoformat()
+            _save_json(STATE_FILE, self.state)
+
+        log(f" {name}: starting" + (" (catch-up of a missed run)" if catch_up else ""))
+        future = self.pool.submit(self._execute, name, record)
+        return future
+
+    def _execute(self, name, record):
+        started = time.perf_counter()
+        try:
+            if name in PROCESS_JOBS:
+                self._run_process(name, record)
+            else:
+                JOBS[name]()
+            record["status"] = "ok"
+        except JobProcessError as e:
+            record["status"] = "timeout" if isinstance(e, JobTimeout) else "error"
+            record["error"] = str(e)
+            log(f" {name}: {e}")
+        except Exception as e:
+            record["status"] = "error"
+            record["error"] = f"{type(e).__name__}: {e}"
+            log(f" {name}: exception {e}")
+            log(traceback.format_exc())
+        record["seconds"] = round(time.perf_counter() - started, 2)
+        record["finished"] = datetime.datetime.now().isoformat(timespec="seconds")
+        if record.get("timed_out") and record["status"] == "ok":
+            record["status"] = "ok_after_timeout"
+        log(f" {name}: {record['status']} in {record['seconds']:.1f} s")
+        with self.lock:
+            # A timed-out thread job may finish after a newer run took its slot
+            # Zadanie w wątku po przekroczeniu limitu może skończyć się, gdy slot zajęło nowsze uruchomienie
+            if self.running.get(name) is record:
+                self.running.pop(name)
+            self._record(record)
+
+    def _run_process(self, name, record):
+        # "spawn" - TensorFlow nie działa poprawnie w procesach utworzonych przez fork
+        context = multiprocessing.get_context("spawn")
+        errors = context.Queue()
+        process = context.Process(target=_run_child, args=(name, errors), name=f"job-{name}")
+        process.start()
+        process.join(max(0.0, (record["deadline"] - datetime.datetime.now()).total_seconds()))
+
+        if process.is_alive():
+            process.terminate()
+            process.join(10)
+            if process.is_alive():
+                process.kill()
+                process.join()
+            raise JobTimeout(f"timeout - process killed after {self.timeouts.get(name, 3600) / 60:g} min")
+        if process.exitcode != 0:
+            error = errors.get() if not errors.empty() else f"job process exited with code {process.exitcode}"
+            raise JobProcessError(error)
+
+    def _check_timeouts(self):
+        # Threads cannot be killed: a timed-out thread job is reported and its slot is freed, so the next
+        # scheduled run starts; process jobs are killed at the deadline in _run_process
+        # Wątków nie da się przerwać: zadanie w wątku po przekroczeniu limitu jest zgłaszane, a jego slot
+        # zwalniany, więc kolejne uruchomienie startuje; zadania w procesach są zabijane w _run_process
+        now = datetime.datetime.now()
+        with self.lock:
+            for name, record in list(self.running.items()):
+                if name not in PROCESS_JOBS and now > record["deadline"]:
+                    record["timed_out"] = True
+                    self.running.pop(name)
+                    log(f" {name}: timeout - running longer than {self.timeouts.get(name, 3600) / 60:.0f} min")
+                    self._record({"job": name, "scheduled": record["scheduled"], "status": "timeout",
+                                  "started": record["started"]})
+
+    def _first_due(self, name, cron, now):
+        # Catch-up: a run missed while the scheduler was stopped (within CATCHUP_HOURS) is due immediately
+        # Nadrabianie: uruchomienie pominięte podczas zatrzymania (w ciągu CATCHUP_HOURS) jest wykonywane od razu
+        last = self.state.get(name)
+        if last and self.catchup:
+            missed = cron.next_after(datetime.datetime.fromisoformat(last))
+            if missed <= now and now - missed <= self.catchup:
+                latest = missed
+                while (following := cron.next_after(latest)) <= now:
+                    latest = following
+                return latest
+        return cron.next_after(now)
+
+    def _record(self, record):
+        record = {k: v for k, v in record.items() if k != "deadline"}
+        os.makedirs(os.path.dirname(HISTORY_FILE), exist_ok=True)
+        with open(HISTORY_FILE, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
+
+
+def _load_json(path):
+    if not os.path.exists(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_json(path, data):
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(path + ".tmp", path)
+
+
+def show_history(count):
+    if not os.path.exists(HISTORY_FILE):
+        print(" No runs recorded yet.")  # Brak zapisanych uruchomień
+        return
+    with open(HISTORY_FILE, encoding="utf-8") as f:
+        lines = f.readlines()[-count:]
+    for line in lines:
+        r = json.loads(line)
+        seconds = f"{r['seconds']:.1f} s" if "seconds" in r else ""
+        print(f" {r['scheduled'][:16]}  {r['job']:<8} {r['status']:<16} {seconds:>9}  {r.get('error', '')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Job scheduler / Harmonogram zadań")
+    parser.add_argument("--list", action="store_true", help="show jobs and their next due times")
+    parser.add_argument("--run", choices=list(JOBS), help="run one job now and exit")
+    parser.add_argument("--history", type=int, metavar="N", help="show the last N runs")
+    args = parser.parse_args()
+
+    if args.history:
+        show_history(args.history)
+        return
+
+    scheduler = Scheduler()
+    if args.list:
+        now = datetime.datetime.now()
+        for name, cron in scheduler.crons.items():
+            print(f" {name:<8} [{cron.expression}]  next: {cron.next_after(now):%Y-%m-%d %H:%M}")
+        return
+    if args.run:
+        now = datetime.datetime.now().replace(second=0, microsecond=0)
+        scheduler.submit(args.run, now).result()
+        scheduler.pool.shutdown()
+        return
+
+    signal.signal(signal.SIGTERM, scheduler.stop)
+    signal.signal(signal.SIGINT, scheduler.stop)
+    scheduler.run_forever()
+
+
+if __name__ == "__main__":
+    main()
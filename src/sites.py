@@ -0,0 +1,68 @@
+import os
+import json
+from numpy_model import resolve_model_path
+
+# Set base directory of the project (parent to src folder)
+# Ustal katalog główny projektu (nadrzędny względem folderu src)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SITES_FILE = os.path.join(BASE_DIR, "sites.json")
+
+REQUIRED_FIELDS = ("site_id", "latitude", "longitude")
+
+
+def load_sites(sites_file=None):
+    """
+    Loads the site registry (JSON list of PV installations) and fills in defaults.
+    Each site: site_id, latitude, longitude and optionally model_path, scaler_path, capacity_kW, timezone.
+    Relative paths are resolved against the project directory; without model_path the default
+    models/ model is used (the exported .npz when it is up to date).
+    Wczytuje rejestr instalacji (lista JSON instalacji PV) i uzupełnia wartości domyślne.
+    Ścieżki względne są liczone od katalogu projektu; bez model_path używany jest domyślny model z models/.
+    """
+    sites_file = sites_file or os.getenv("SITES_FILE", SITES_FILE)
+    if not os.path.exists(sites_file):
+        raise FileNotFoundError(f" Site registry not found: {sites_file} (copy sites.example.json to sites.json)")
+
+    with open(sites_file, encoding="utf-8") as f:
+        entries = json.load(f)
+
+    models_dir = os.path.join(BASE_DIR, "models")
+    sites = []
+    seen = set()
+    for entry in entries:
+        missing = [field for field in REQUIRED_FIELDS if field not in entry]
+        if missing:
+            raise ValueError(f" Site entry {entry} is missing fields: {missing}")
+        if entry["site_id"] in seen:
+            raise ValueError(f" Duplicate site_id in registry: {entry['site_id']}")
+        seen.add(entry["site_id"])
+
+        site = {
+            "site_id": str(entry["site_id"]),
+            "latitude": float(entry["latitude"]),
+            "longitude": float(entry["longitude"]),
+            "model_path": _project_path(entry.get("model_path")) or resolve_model_path(models_dir),
+            "scaler_path": _project_path(entry.get("scaler_path")) or os.path.join(models_dir, "production_scaler.pkl"),
+            "capacity_kW": float(entry["capacity_kW"]) if entry.get("capacity_kW") is not None else None,
+            "timezone": entry.get("timezone", "Europe/Warsaw"),
+        }
+        sites.append(site)
+
+    return sites
+
+
+def group_by_model(sites):
+    """
+    Groups sites sharing the same model and scaler: {(model_path, scaler_path): [site, ...]}.
+    Grupuje instalacje korzystające z tego samego modelu i skalera.
+    """
+    groups = {}
+    for site in sites:
+        groups.setdefault((site["model_path"], site["scaler_path"]), []).append(site)
+    return groups
+
+
+def _project_path(path):
+    if not path:
+        return None
+    return path if os.path.isabs(path) else os.path.join(BASE_DIR, path)
@@ -0,0 +1,172 @@
+"""
+Shared feature engineering for training (DataMerger) and inference (Predictor): hour-of-day and day-of-year
+terms, solar position (zenith, azimuth), clear-sky GHI (Haurwitz model) and clear-sky index, computed with
+vectorized NumPy for a site's latitude / longitude. Solar position and clear-sky arrays are cached per
+(site, timestamp grid), so repeated predictions and retraining in one process reuse them.
+
+Wspólne cechy dla treningu (DataMerger) i predykcji (Predictor): składowe godziny i dnia roku, położenie
+słońca (zenit, azymut), GHI przy bezchmurnym niebie (model Haurwitza) i indeks bezchmurności, liczone
+wektorowo w NumPy dla szerokości / długości geograficznej instalacji. Położenie słońca i GHI bezchmurne
+są buforowane dla każdej pary (instalacja, siatka czasu), więc kolejne predykcje i douczanie w jednym
+procesie używają ich ponownie.
+"""
+
+import os
+import threading
+from collections import OrderedDict
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+from download_forecast import LATITUDE, LONGITUDE
+
+load_dotenv()  # załaduj zmienne środowiskowe / load environment variables
+
+# Model inputs: the original features and the set with solar geometry (SOLAR_FEATURES=1 when training)
+# Wejścia modelu: pierwotne cechy i zestaw z geometrią słońca (SOLAR_FEATURES=1 przy treningu)
+BASE_FEATURES = ['ghi', 'air_temp', 'sin_hour', 'cos_hour']
+SOLAR_FEATURES = BASE_FEATURES + ['cos_zenith', 'clear_sky_ghi', 'clear_sky_index']
+FEATURES = SOLAR_FEATURES if os.getenv("SOLAR_FEATURES", "0") == "1" else BASE_FEATURES
+
+CACHE_SIZE = 32                 # cached (site, grid) entries / liczba buforowanych par (instalacja, siatka)
+MIN_CLEAR_SKY_GHI = 10.0        # W/m²; below it the clear-sky index is 0 (dawn, dusk) / poniżej indeks = 0
+MAX_CLEAR_SKY_INDEX = 2.0
+
+_cache = OrderedDict()
+_cache_lock = threading.Lock()
+
+
+def features_for_inputs(n_inputs):
+    """
+    Feature list of a trained model with n_inputs inputs (models trained before solar features have 4).
+    Lista cech wytrenowanego modelu o n_inputs wejściach (modele sprzed cech słonecznych mają 4).
+    """
+    for features in (BASE_FEATURES, SOLAR_FEATURES):
+        if len(features) == n_inputs:
+            return features
+    raise ValueError(f" Model expects {n_inputs} inputs - no matching feature set "
+                     f"({len(BASE_FEATURES)} basic or {len(SOLAR_FEATURES)} with solar features)")
+
+
+def solar_position(times, latitude, longitude):
+    """
+    Solar zenith and azimuth [degrees, azimuth clockwise from north] for UTC times, from the low-precision
+    astronomical almanac formulas (accurate to ~0.1° between 1950 and 2050).
+    Zenit i azymut słońca [stopnie, azymut zgodnie z ruchem wskazówek zegara od północy] dla czasów UTC,
+    według uproszczonych wzorów rocznika astronomicznego (dokładność ~0,1° w latach 1950-2050).
+    """
+    seconds = pd.DatetimeIndex(times).as_unit('ns').asi8 / 1e9
+    n = seconds / 86400.0 + 2440587.5 - 2451545.0          # days since J2000.0 / dni od J2000.0
+
+    mean_longitude = np.radians((280.460 + 0.9856474 * n) % 360)
+    mean_anomaly = np.radians((357.528 + 0.9856003 * n) % 360)
+    ecliptic_longitude = (mean_longitude + np.radians(1.915) * np.sin(mean_anomaly)
+                          + np.radians(0.020) * np.sin(2 * mean_anomaly))
+    obliquity = np.radians(23.439 - 0.0000004 * n)
+
+    right_ascension = np.arctan2(np.cos(obliquity) * np.sin(ecliptic_longitude), np.cos(ecliptic_longitude))
+    declination = np.arcsin(np.sin(obliquity) * np.sin(ecliptic_longitude))
+    sidereal_hours = (18.697374558 + 24.06570982441908 * n) % 24
+    hour_angle = np.radians(sidereal_hours * 15 + longitude) - right_ascension
+
+    lat = np.radians(latitude)
+    cos_zenith = (np.sin(lat) * np.sin(declination)
+                  + np.cos(lat) * np.cos(declination) * np.cos(hour_angle))
+    zenith = np.degrees(np.arccos(np.clip(cos_zenith, -1, 1)))
+    azimuth = np.degrees(np.arctan2(-np.sin(hour_angle),
+                                    np.tan(declination) * np.cos(lat) - np.sin(lat) * np.cos(hour_angle))) % 360
+    return zenith, azimuth
+
+
+def clear_sky_ghi(zenith):
+    """
+    Clear-sky GHI [W/m²] from the Haurwitz model: 1098 · cos z · exp(-0.057 / cos z), 0 below the horizon.
+    GHI przy bezchmurnym niebie [W/m²] z modelu Haurwitza, 0 poniżej horyzontu.
+    """
+    cos_zenith = np.cos(np.radians(zenith))
+    safe = np.where(cos_zenith > 0, cos_zenith, 1.0)
+    return np.where(cos_zenith > 0, 1098.0 * cos_zenith * np.exp(-0.057 / safe), 0.0)
+
+
+def solar_arrays(times, latitude=LATITUDE, longitude=LONGITUDE):
+    """
+    Cached zenith, azimuth and clear-sky GHI for one site and timestamp grid (read-only arrays).
+    Buforowane zenit, azymut i GHI bezchmurne dla jednej instalacji i siatki czasu (tablice tylko do odczytu).
+    """
+    ticks = pd.DatetimeIndex(times).as_unit('ns').asi8
+    key = (round(float(latitude), 4), round(float(longitude), 4), _grid_key(ticks))
+    with _cache_lock:
+        if key in _cache:
+            _cache.move_to_end(key)
+            return _cache[key]
+
+    zenith, azimuth = solar_position(times, latitude, longitude)
+    arrays = {"solar_zenith": zenith, "solar_azimuth": azimuth, "clear_sky_ghi": clear_sky_ghi(zenith)}
+    for array in arrays.values():
+        array.setflags(write=False)
+
+    with _cache_lock:
+        _cache[key] = arrays
+        while len(_cache) > CACHE_SIZE:
+            _cache.popitem(last=False)
+    return arrays
+
+
+def _grid_key(ticks):
+    # A regular grid is identified by start, step and length; any other by a hash of its values
+    # Regularna siatka jest identyfikowana przez początek, krok i długość; inna przez skrót wartości
+    if len(ticks) > 1:
+        steps = np.diff(ticks)
+        if (steps == steps[0]).all():
+            return ("regular", int(ticks[0]), int(steps[0]), len(ticks))
+    return ("values", len(ticks), hash(ticks.tobytes()))
+
+
+def add_time_features(df, time_column):
+    """
+    Adds to df (in place) hour_decimal, sin_hour, cos_hour and day_of_year of its UTC time column.
+    Dodaje do df (w miejscu) hour_decimal, sin_hour, cos_hour i day_of_year na podstawie kolumny czasu UTC.
+    """
+    times = df[time_column]
+
+    # Add sine and cosine of hour to capture daily cyclicity
+    # Dodaj sinus i cosinus godziny dla modelowania cykliczności dobowej
+    df['hour_decimal'] = times.dt.hour + times.dt.minute / 60
+    df['day_of_year'] = times.dt.dayofyear
+    df['sin_hour'] = np.sin(2 * np.pi * df['hour_decimal'] / 24)
+    df['cos_hour'] = np.cos(2 * np.pi * df['hour_decimal'] / 24)
+    return df
+
+
+def add_solar_features(df, time_column, latitude=LATITUDE, longitude=LONGITUDE):
+    """
+    Adds to df (in place) sin_doy, cos_doy, solar_zenith, solar_azimuth, cos_zenith, clear_sky_ghi and,
+    when df has ghi, clear_sky_index = ghi / clear_sky_ghi for the site at latitude / longitude.
+    Dodaje do df (w miejscu) sin_doy, cos_doy, solar_zenith, solar_azimuth, cos_zenith, clear_sky_ghi oraz,
+    gdy df ma ghi, clear_sky_index = ghi / clear_sky_ghi dla instalacji o podanych współrzędnych.
+    """
+    times = df[time_column]
+    day_of_year = times.dt.dayofyear
+    df['sin_doy'] = np.sin(2 * np.pi * day_of_year / 365.25)
+    df['cos_doy'] = np.cos(2 * np.pi * day_of_year / 365.25)
+
+    arrays = solar_arrays(times, latitude, longitude)
+    df['solar_zenith'] = arrays['solar_zenith']
+    df['solar_azimuth'] = arrays['solar_azimuth']
+    df['cos_zenith'] = np.clip(np.cos(np.radians(arrays['solar_zenith'])), 0, None)
+    df['clear_sky_ghi'] = arrays['clear_sky_ghi']
+
+    if 'ghi' in df.columns:
+        clear = arrays['clear_sky_ghi']
+        ratio = np.divide(df['ghi'].to_numpy(dtype=float), clear, out=np.zeros(len(df)),
+                          where=clear >= MIN_CLEAR_SKY_GHI)
+        df['clear_sky_index'] = np.clip(np.nan_to_num(ratio), 0, MAX_CLEAR_SKY_INDEX)
+    return df
+
+
+def add_features(df, time_column, latitude=LATITUDE, longitude=LONGITUDE):
+    """
+    Adds all time and solar features (add_time_features + add_solar_features) to df in place.
+    Dodaje do df (w miejscu) wszystkie cechy czasowe i słoneczne (add_time_features + add_solar_features).
+    """
+    add_time_features(df, time_column)
+    return add_solar_features(df, time_column, latitude, longitude)
@@ -0,0 +1,227 @@
+"""
+Shared Solcast API client: pooled HTTP session, timeouts, retries with exponential backoff and jitter
+on 429/5xx, token-bucket rate limiting, bounded concurrency and per-request latency / quota statistics.
+
+Wspólny klient API Solcast: sesja HTTP z pulą połączeń, limity czasu, ponowienia z wykładniczym
+opóźnieniem i losowym rozrzutem przy 429/5xx, limiter typu token bucket, ograniczona współbieżność
+oraz statystyki opóźnień i wykorzystania limitu zapytań.
+
+SOLCAST_BASE_URL can point to a local stub server for testing.
+SOLCAST_BASE_URL może wskazywać na lokalny serwer zastępczy do testów.
+"""
+
+import os
+import time
+import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
+import numpy as np
+import requests
+from requests.adapters import HTTPAdapter
+from dotenv import load_dotenv
+
+load_dotenv()  # załaduj zmienne środowiskowe / load environment variables
+
+BASE_URL = os.getenv("SOLCAST_BASE_URL", "https://api.solcast.com.au")
+TIMEOUT = float(os.getenv("SOLCAST_TIMEOUT", "30"))            # seconds per request / sekundy na zapytanie
+MAX_RETRIES = int(os.getenv("SOLCAST_MAX_RETRIES", "5"))
+RATE_PER_MINUTE = float(os.getenv("SOLCAST_RATE_PER_MINUTE", "30"))
+MAX_CONCURRENCY = int(os.getenv("SOLCAST_MAX_CONCURRENCY", "4"))
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+
+
+class SolcastError(Exception):
+    """
+    Raised when a request fails permanently (non-retriable status, retries exhausted or quota used up).
+    Zgłaszany, gdy zapytanie nie powiodło się ostatecznie (błąd bez ponowień, wyczerpane ponowienia lub limit).
+    """
+
+    def __init__(self, message, status=None, body=None):
+        super().__init__(message)
+        self.status = status
+        self.body = body
+
+
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` tokens per second, at most `capacity` stored.
+    Bezpieczny wątkowo token bucket: `rate` żetonów na sekundę, maksymalnie `capacity` w zapasie.
+    """
+
+    def __init__(self, rate, capacity):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self.lock = threading.Lock()
+
+    def acquire(self):
+        # Returns the time spent waiting for a token
+        # Zwraca czas oczekiwania na żeton
+        waited = 0.0
+        while True:
+            with self.lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return waited
+                delay = (1 - self.tokens) / self.rate
+            time.sleep(delay)
+            waited += delay
+
+
+class SolcastClient:
+    def __init__(self, api_key=None, base_url=BASE_URL, timeout=TIMEOUT, max_retries=MAX_RETRIES,
+                 rate_per_minute=RATE_PER_MINUTE, max_concurrency=MAX_CONCURRENCY,
+                 backoff_base=1.0, backoff_max=60.0):
+        self.api_key = api_key or os.getenv("SOLCAST_API_KEY")
+        if not self.api_key:
+            raise ValueError(" Missing API key. Set the SOLCAST_API_KEY environment variable or create a .env file")
+
+        self.base_url = base_url.rstrip("/")
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self.max_concurrency = max_concurrency
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+
+        # One pooled session shared by all threads (keep-alive, connection reuse)
+        # Jedna sesja z pulą połączeń współdzielona przez wszystkie wątki (keep-alive, ponowne użycie połączeń)
+        self.session = requests.Session()
+        self.session.headers["Authorization"] = f"Bearer {self.api_key}"
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max_concurrency)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+
+        self.bucket = TokenBucket(rate_per_minute / 60, capacity=max(1, max_concurrency))
+        self.slots = threading.BoundedSemaphore(max_concurrency)
+
+        # Statistics / Statystyki
+        self.lock = threading.Lock()
+        self.latencies = []
+        self.status_counts = {}
+        self.retries = 0
+        self.throttle_wait = 0.0
+        self.quota = {"limit": None, "remaining": None, "reset": None}
+
+    def get(self, path, params=None):
+        """
+        GET request returning decoded JSON; retries 429/5xx and connection errors with backoff.
+        Zapytanie GET zwracające zdekodowany JSON; ponawia 429/5xx i błędy połączenia z opóźnieniem.
+        """
+        url = f"{self.base_url}/{path.lstrip('/')}"
+        for attempt in range(self.max_retries + 1):
+            if self.quota["remaining"] == 0 and self.quota["reset"] and time.time() < self.quota["reset"]:
+                raise SolcastError(f" Solcast API quota used up until {time.ctime(self.quota['reset'])}", status=429)
+
+            waited = self.bucket.acquire()
+            start = time.perf_counter()
+            try:
+                with self.slots:
+                    response = self.session.get(url, params=params, timeout=self.timeout)
+            except (requests.ConnectionError, requests.Timeout) as e:
+                self._record(time.perf_counter() - start, "error", waited)
+                if attempt == self.max_retries:
+                    raise SolcastError(f" Solcast request failed: {e}") from e
+                self._backoff(attempt)
+                continue
+
+            self._record(time.perf_counter() - start, response.status_code, waited)
+            self._update_quota(response.headers)
+
+            if response.status_code == 200:
+                return response.json()
+            if response.status_code not in RETRY_STATUS or attempt == self.max_retries:
+                raise SolcastError(f" Solcast request failed with status {response.status_code}",
+                                   status=response.status_code, body=response.text)
+            self._backoff(attempt, response.headers.get("Retry-After"))
+
+    def forecast(self, latitude, longitude, output_parameters="ghi,air_temp", period="PT15M"):
+        data = self.get("data/forecast/radiation_and_weather", {
+            "latitude": latitude, "longitude": longitude,
+            "output_parameters": output_parameters, "format": "json", "period": period,
+        })
+        return data.get("forecasts", [])
+
+    def live(self, latitude, longitude, hours=168, output_parameters="ghi,dni,air_temp", period="PT15M"):
+        data = self.get("data/live/radiation_and_weather", {
+            "latitude": latitude, "longitude": longitude, "hours": hours,
+            "output_parameters": output_parameters, "format": "json", "period": period,
+        })
+        return data.get("estimated_actuals", [])
+
+    def map(self, func, items):
+        """
+        Runs func(item) for all items with at most max_concurrency requests in flight; returns results in order.
+        Uruchamia func(item) dla wszystkich elementów przy co najwyżej max_concurrency równoległych zapytaniach.
+        """
+        with ThreadPoolExecutor(max_workers=self.max_concurrency) as pool:
+            return list(pool.map(func, items))
+
+    def stats(self):
+        with self.lock:
+            latencies = np.array(self.latencies) * 1000
+            return {
+                "requests": len(self.latencies),
+                "retries": self.retries,
+                "status": dict(self.status_counts),
+                "latency_ms_p50": round(float(np.percentile(latencies, 50)), 1) if len(latencies) else None,
+                "latency_ms_p95": round(float(np.percentile(latencies, 95)), 1) if len(latencies) else None,
+                "latency_ms_max": round(float(latencies.max()), 1) if len(latencies) else None,
+                "throttle_wait_s": round(self.throttle_wait, 2),
+                "quota_limit": self.quota["limit"],
+                "quota_remaining": self.quota["remaining"],
+            }
+
+    def print_stats(self):
+        stats = self.stats()
+        print(f" Solcast: {stats['requests']} requests, {stats['retries']} retries, status {stats['status']}")
+        if stats["requests"]:
+            print(f" Solcast latency [ms]: p50 {stats['latency_ms_p50']}, p95 {stats['latency_ms_p95']}, "
+                  f"max {stats['latency_ms_max']}; rate-limit wait {stats['throttle_wait_s']} s")
+        if stats["quota_limit"] is not None:
+            print(f" Solcast quota: {stats['quota_remaining']} of {stats['quota_limit']} requests left")
+
+    def _record(self, latency, status, waited):
+        with self.lock:
+            self.latencies.append(latency)
+            self.status_counts[status] = self.status_counts.get(status, 0) + 1
+            self.throttle_wait += waited
+
+    def _update_quota(self, headers):
+        # Solcast reports the API quota in x-rate-limit-* headers
+        # Solcast podaje limit zapytań w nagłówkach x-rate-limit-*
+        with self.lock:
+            for key in ("limit", "remaining", "reset"):
+                value = headers.get(f"x-rate-limit-{key}")
+                if value is not None and value.isdigit():
+                    self.quota[key] = int(value)
+
+    def _backoff(self, attempt, retry_after=None):
+        # Exponential backoff with full jitter; Retry-After (seconds) is respected as a minimum
+        # Wykładnicze opóźnienie z losowym rozrzutem; Retry-After (sekundy) jest minimalnym opóźnieniem
+        delay = random.uniform(0, min(self.backoff_max, self.backoff_base * 2 ** attempt))
+        if retry_after is not None and retry_after.isdigit():
+            delay = max(delay, float(retry_after))
+        with self.lock:
+            self.retries += 1
+        time.sleep(delay)
+
+
+_client = None
+_client_lock = threading.Lock()
+
+
+def get_client():
+    """
+    Returns the process-wide shared client (created on first use).
+    Zwraca współdzielonego klienta procesu (tworzonego przy pierwszym użyciu).
+    """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = SolcastClient()
+        return _client
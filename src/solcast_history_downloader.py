@@ -1,52 +1,92 @@
 # solcast_history_fetcher.py
 # Script to fetch historical data from Solcast API (user must provide API key)
+# update_solcast_history() merges the last 7 days into data/solcast_history (used by the scheduler's retrain job)
 
-import requests
 import pandas as pd
 from datetime import datetime
 import os
+from storage import get_storage, dataset_name
+from solcast_client import SolcastClient, SolcastError
 
 # Your location data (latitude, longitude)
 latitude = 51.334660
 longitude = 16.860879
 
-# Load API key from environment variable
-API_KEY = os.getenv("SOLCAST_API_KEY")
-
-if not API_KEY:
-    raise ValueError("No SOLCAST_API_KEY found in environment variables. Please set your API key.")
-
-# Endpoint for last 7 days data (168 hours)
-url = (
-    f"https://api.solcast.com.au/data/live/radiation_and_weather"
-    f"?latitude={latitude}&longitude={longitude}"
-    f"&hours=168"  # 7 days  24 hours
-    f"&output_parameters=ghi,dni,air_temp"
-    f"&period=PT15M"
-    f"&format=json"
-)
-
-headers = {
-    "Authorization": f"Bearer {API_KEY}"
-}
-
-response = requests.get(url, headers=headers)
-
-if response.status_code == 200:
-    data = response.json()
-    estimated = data.get("estimated_actuals", [])
-    
-    if estimated:
-        df = pd.DataFrame(estimated)
-        df['period_end'] = pd.to_datetime(df['period_end'])
+# History file used for training (see main.py)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+HISTORY_PATH = os.path.join(BASE_DIR, "data", "solcast_history.csv")
+
+
+def fetch_estimated_actuals(client, hours=168):
+    # Endpoint for last 7 days data (168 hours)
+    try:
+        estimated = client.live(latitude, longitude, hours=hours)  # 7 days  24 hours
+    except SolcastError as e:
+        print(f"? Error: {e.status}")
+        print(e.body if e.body is not None else e)
+        return None
+
+    if not estimated:
+        print("?? No data found in response.")
+        return None
+    df = pd.DataFrame(estimated)
+    df['period_end'] = pd.to_datetime(df['period_end'], utc=True)
+    return df.sort_values('period_end')
+
+
+def update_solcast_history(history_path=HISTORY_PATH, hours=168):
+    """
+    Downloads the last `hours` of estimated actuals and merges them into the training history
+    (newer values replace older ones for the same period_end). Returns the number of new periods.
+    Pobiera ostatnie `hours` godzin danych rzeczywistych i dołącza je do historii treningowej
+    (nowsze wartości zastępują starsze dla tego samego period_end). Zwraca liczbę nowych okresów.
+    """
+    api_key = os.getenv("SOLCAST_API_KEY")
+    if not api_key:
+        raise ValueError(" No SOLCAST_API_KEY found in environment variables. Please set your API key.")
+
+    client = SolcastClient(api_key)
+    df = fetch_estimated_actuals(client, hours)
+    client.print_stats()
+    if df is None:
+        return 0
+
+    storage = get_storage()
+    dataset = dataset_name(history_path)
+    if storage.exists(dataset):
+        history = storage.read(dataset)
+        history['period_end'] = pd.to_datetime(history['period_end'], utc=True)
+        known = history['period_end'].isin(df['period_end'])
+        added = len(df) - int(known.sum())
+        df = pd.concat([history[~known], df[history.columns.intersection(df.columns)]], ignore_index=True)
         df = df.sort_values('period_end')
-        
-        filename = f"solcast_history_{datetime.now().date()}.csv"
-        df.to_csv(filename, index=False)
-        print(f"? Data saved to file: {filename}")
-        print(df.head())
     else:
-        print("?? No data found in response.")
-else:
-    print(f"? Error: {response.status_code}")
-    print(response.text)
\ No newline at end of file
+        added = len(df)
+
+    storage.write(df, dataset, time_column='period_end')
+    print(f" Solcast history updated: {added} new periods, {len(df)} total in {storage.path(dataset)}")
+    return added
+
+
+def main():
+    api_key = os.getenv("SOLCAST_API_KEY")
+    if not api_key:
+        raise ValueError("No SOLCAST_API_KEY found in environment variables. Please set your API key.")
+
+    # Shared client: timeouts, retries on 429/5xx, rate limit (see solcast_client.py)
+    client = SolcastClient(api_key)
+    df = fetch_estimated_actuals(client)
+
+    if df is not None:
+        # Save as CSV or Parquet, depending on STORAGE_BACKEND
+        storage = get_storage()
+        dataset = os.path.join(BASE_DIR, "data", f"solcast_history_{datetime.now().date()}")
+        storage.write(df, dataset, time_column='period_end')
+        print(f"? Data saved to file: {storage.path(dataset)}")
+        print(df.head())
+
+    client.print_stats()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,58 @@
+# startup_profile.py
+# Pomiar czasu importu modułów przy starcie skryptu (flaga --profile-startup)
+# Per-module import time at script startup (--profile-startup flag)
+
+import sys
+import time
+import atexit
+import builtins
+
+_original_import = builtins.__import__
+_started = time.perf_counter()
+_stack = []
+_timings = {}
+
+
+def _timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+    # Only first imports of absolute modules are timed; time is charged to the top-level package
+    # without its nested imports of other packages (those are charged to themselves)
+    # Mierzone są tylko pierwsze importy modułów absolutnych; czas liczony jest pakietowi najwyższego
+    # poziomu bez zagnieżdżonych importów innych pakietów (te liczone są osobno)
+    top = name.partition(".")[0]
+    if level != 0 or name in sys.modules or (_stack and _stack[-1][0] == top):
+        return _original_import(name, globals, locals, fromlist, level)
+
+    frame = [top, 0.0]  # package, time spent in nested packages / pakiet, czas w zagnieżdżonych pakietach
+    _stack.append(frame)
+    start = time.perf_counter()
+    try:
+        return _original_import(name, globals, locals, fromlist, level)
+    finally:
+        elapsed = time.perf_counter() - start
+        _stack.pop()
+        _timings[top] = _timings.get(top, 0.0) + elapsed - frame[1]
+        if _stack:
+            _stack[-1][1] += elapsed
+
+
+def report():
+    total = time.perf_counter() - _started
+    imports = sum(_timings.values())
+    print("\n=== STARTUP PROFILE ===")
+    print(f" {'module':<24}{'import [ms]':>12}")
+    # Modules below 2 ms are summed up in the "all imports" line
+    # Moduły poniżej 2 ms są wliczone tylko do wiersza "all imports"
+    for module, seconds in sorted(_timings.items(), key=lambda item: -item[1]):
+        if seconds >= 0.002:
+            print(f" {module:<24}{seconds * 1000:>12.1f}")
+    print(f" {'all imports':<24}{imports * 1000:>12.1f}")
+    print(f" {'total run':<24}{total * 1000:>12.1f}")
+
+
+def enable():
+    """
+    Starts recording import times of top-level modules and prints a report at exit.
+    Zaczyna mierzyć czas importu modułów najwyższego poziomu i wypisuje raport przy wyjściu.
+    """
+    builtins.__import__ = _timed_import
+    atexit.register(report)
@@ -0,0 +1,501 @@
+import os
+import io
+import sys
+import glob
+import json
+import zlib
+import shutil
+import numpy as np
+import pandas as pd
+from dotenv import load_dotenv
+
+load_dotenv()  # załaduj zmienne środowiskowe, w tym STORAGE_BACKEND / load environment variables, including STORAGE_BACKEND
+
+# Set base directory of the project (parent to src folder)
+# Ustal katalog główny projektu (nadrzędny względem folderu src)
+BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Name of the hive-style partition column (one partition per day)
+# Nazwa kolumny partycji w stylu hive (jedna partycja na dzień)
+PARTITION_COLUMN = "partition_date"
+
+# Float columns kept as float64 in Parquet - cumulative counters lose precision in float32
+# Kolumny zmiennoprzecinkowe zostawione jako float64 w Parquet - liczniki narastające tracą precyzję w float32
+FLOAT64_COLUMNS = {"Total_Power_P_ALL", "value"}
+
+# Time column of each dataset kind, used by the migration command
+# Kolumna czasu dla każdego rodzaju zbioru danych, używana przez polecenie migracji
+TIME_COLUMNS = ["timestamp", "period_end"]
+
+
+class CSVStorage:
+    """
+    Stores each dataset as a single CSV file: <dataset>.csv
+    A sidecar time index <dataset>.csv.manifest.json keeps min/max timestamps and byte offsets per day,
+    so range checks do not read the file and time-range reads seek straight to the matching days.
+    Przechowuje każdy zbiór danych jako jeden plik CSV: <dataset>.csv
+    Indeks czasu obok pliku <dataset>.csv.manifest.json przechowuje min/max czasu i offsety bajtowe dla każdego dnia,
+    więc sprawdzanie zakresów nie czyta pliku, a odczyt zakresu czasu przeskakuje od razu do właściwych dni.
+    """
+    partitioned = False
+
+    def path(self, dataset):
+        return dataset + ".csv"
+
+    def manifest_path(self, dataset):
+        return self.path(dataset) + ".manifest.json"
+
+    def exists(self, dataset):
+        return os.path.isfile(self.path(dataset))
+
+    def read(self, dataset, time_column=None, start=None, end=None, columns=None, names=None):
+        byte_range = None
+        if time_column is not None and (start is not None or end is not None):
+            byte_range = _select_days(self.time_index(dataset, time_column, names), start, end)
+
+        if byte_range is None:
+            df = pd.read_csv(self.path(dataset), usecols=columns, header=None if names else 'infer', names=names)
+        else:
+            # Read the header line plus only the byte range of the selected days
+            # Wczytaj linię nagłówka i tylko zakres bajtów wybranych dni
+            with open(self.path(dataset), 'rb') as f:
+                header = b"" if names else f.readline()
+                f.seek(byte_range[0])
+                data = f.read(byte_range[1] - byte_range[0])
+            if header + data:
+                df = pd.read_csv(io.BytesIO(header + data), usecols=columns,
+                                 header=None if names else 'infer', names=names)
+            else:
+                df = pd.DataFrame(columns=columns or names)
+
+        if time_column is not None:
+            df[time_column] = _to_datetime(df[time_column])
+            df = _filter_time_range(df, time_column, start, end)
+        return df
+
+    def write(self, df, dataset, time_column=None):
+        # A dataset without a directory part lives in the current directory
+        # Zbiór danych bez katalogu w ścieżce jest zapisywany w bieżącym katalogu
+        directory = os.path.dirname(self.path(dataset))
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        df.to_csv(self.path(dataset), index=False)
+        if os.path.exists(self.manifest_path(dataset)):
+            os.remove(self.manifest_path(dataset))
+        if time_column is not None:
+            self.time_index(dataset, time_column)
+
+    def delete(self, dataset):
+        for path in (self.path(dataset), self.manifest_path(dataset)):
+            if os.path.exists(path):
+                os.remove(path)
+
+    def truncate(self, dataset, offset):
+        """
+        Truncates the CSV file at a byte offset and drops index entries from the day containing it.
+        Obcina plik CSV na offsecie bajtowym i usuwa wpisy indeksu od dnia, który go zawiera.
+        """
+        path = self.path(dataset)
+        with open(path, 'r+b' if os.path.exists(path) else 'wb') as f:
+            f.truncate(offset)
+
+        manifest = _load_json(self.manifest_path(dataset))
+        if manifest is None:
+            return
+        if offset == 0 or offset < manifest.get('size', 0) and not manifest['sorted']:
+            os.remove(self.manifest_path(dataset))
+            return
+        if offset < manifest['size']:
+            cut_days = [d for d, entry in manifest['days'].items() if entry['end'] > offset]
+            manifest['size'] = min([manifest['days'][d]['start'] for d in cut_days] + [offset])
+            for d in cut_days:
+                del manifest['days'][d]
+        _stamp_manifest(path, manifest)
+        _save_json(self.manifest_path(dataset), manifest)
+
+    def time_range(self, dataset, time_column, names=None):
+        """
+        Returns (min, max, rows) of time_column from the time index, without reading the data.
+        Zwraca (min, max, liczba wierszy) kolumny time_column z indeksu czasu, bez czytania danych.
+        """
+        return _manifest_range(self.time_index(dataset, time_column, names))
+
+    def time_index(self, dataset, time_column, names=None):
+        """
+        Loads the time index, scanning only lines appended since it was built (full scan if the file was rewritten).
+        Wczytuje indeks czasu, skanując tylko linie dopisane od jego utworzenia (pełny skan, jeśli plik nadpisano).
+        """
+        path = self.path(dataset)
+        stat = os.stat(path)
+        manifest = _load_json(self.manifest_path(dataset))
+        # Only appends keep the index valid: the head and the end of the indexed part are unchanged and,
+        # without new lines, the file was not modified at all (a same-size rewrite changes the mtime)
+        # Indeks pozostaje ważny tylko przy dopisywaniu: początek i koniec zindeksowanej części są bez zmian,
+        # a bez nowych linii plik nie był modyfikowany (nadpisanie o tym samym rozmiarze zmienia mtime)
+        if manifest is not None and (manifest.get('time_column') != time_column or
+                                     stat.st_size < manifest['size'] or
+                                     _head_crc(path) != manifest['head_crc'] or
+                                     _tail_crc(path, manifest['size']) != manifest.get('tail_crc') or
+                                     stat.st_size == manifest['size'] and
+                                     stat.st_mtime_ns != manifest.get('mtime_ns')):
+            manifest = None
+
+        if manifest is not None and stat.st_size == manifest['size']:
+            return manifest
+
+        manifest = _scan_csv(path, time_column, names, manifest)
+        _save_json(self.manifest_path(dataset), manifest)
+        return manifest
+
+
+class ParquetStorage:
+    """
+    Stores each dataset as a Parquet directory partitioned by day: <dataset>.parquet/partition_date=YYYY-MM-DD/
+    Timestamps stay typed and float columns are stored as float32, so nothing is re-parsed on load.
+    Przechowuje każdy zbiór danych jako katalog Parquet podzielony na dni: <dataset>.parquet/partition_date=RRRR-MM-DD/
+    Znaczniki czasu zachowują typ, a kolumny zmiennoprzecinkowe są zapisywane jako float32, więc nic nie jest ponownie parsowane.
+    """
+    partitioned = True
+
+    def __init__(self):
+        try:
+            import pyarrow  # noqa: F401
+        except ImportError:
+            raise ImportError(" STORAGE_BACKEND=parquet requires pyarrow. Install it with: pip install pyarrow")
+
+    def path(self, dataset):
+        return dataset + ".parquet"
+
+    def manifest_path(self, dataset):
+        # Files starting with "_" are skipped by Parquet dataset discovery
+        # Pliki zaczynające się od "_" są pomijane przy wykrywaniu plików zbioru Parquet
+        return os.path.join(self.path(dataset), "_manifest.json")
+
+    def exists(self, dataset):
+        return os.path.isdir(self.path(dataset))
+
+    def read(self, dataset, time_column=None, start=None, end=None, columns=None):
+        # Fall back to CSV for files that were not migrated yet
+        # Dla plików jeszcze niezmigrowanych użyj CSV
+        if not self.exists(dataset) and CSVStorage().exists(dataset):
+            return CSVStorage().read(dataset, time_column, start, end, columns)
+        if columns is not None and time_column is not None and time_column not in columns:
+            columns = [time_column] + list(columns)
+
+        # Time range filters are pushed down to partition pruning and row-group statistics
+        # Filtry zakresu czasu są przekazywane do pomijania partycji i statystyk grup wierszy
+        # (partitions get one day of margin, as they may be cut in a different time zone than start/end)
+        # (partycje mają zapas jednego dnia, bo mogą być wyznaczone w innej strefie czasowej niż start/end)
+        filters = []
+        if time_column is not None and start is not None:
+            start = pd.Timestamp(start)
+            filters.append((PARTITION_COLUMN, ">=", (start - pd.Timedelta(days=1)).strftime("%Y-%m-%d")))
+            filters.append((time_column, ">=", start))
+        if time_column is not None and end is not None:
+            end = pd.Timestamp(end)
+            filters.append((PARTITION_COLUMN, "<=", (end + pd.Timedelta(days=1)).strftime("%Y-%m-%d")))
+            filters.append((time_column, "<=", end))
+
+        df = pd.read_parquet(self.path(dataset), columns=columns, filters=filters or None)
+        df = df.drop(columns=[PARTITION_COLUMN], errors="ignore")
+        # Parquet may keep timestamps in us - use ns like CSV, so both backends merge with each other
+        # Parquet może przechowywać czasy w us - użyj ns jak CSV, aby dane z obu backendów dało się łączyć
+        for column in df.select_dtypes(include=["datetime", "datetimetz"]).columns:
+            df[column] = df[column].dt.as_unit("ns")
+        if time_column is not None:
+            df = df.sort_values(time_column, kind="stable").reset_index(drop=True)
+        return df
+
+    def write(self, df, dataset, time_column=None):
+        # Replace the whole dataset
+        # Zastąp cały zbiór danych
+        self.delete(dataset)
+        self.write_partitions(df, dataset, time_column)
+
+    def delete(self, dataset):
+        if os.path.isdir(self.path(dataset)):
+            shutil.rmtree(self.path(dataset))
+
+    def write_partitions(self, df, dataset, time_column=None):
+        # Replace only the day partitions present in df
+        # Zastąp tylko partycje dni obecne w df
+        df = _downcast_floats(df)
+        if time_column is None:
+            groups = [("all", df)]
+        else:
+            dates = pd.to_datetime(df[time_column]).dt.strftime("%Y-%m-%d")
+            groups = df.groupby(dates, sort=True)
+
+        # Keep min/max/rows of each partition in the manifest
+        # Zapisuj min/max/liczbę wierszy każdej partycji w manifeście
+        manifest = _load_json(self.manifest_path(dataset)) if self.exists(dataset) else None
+        if manifest is None or manifest.get('time_column') != time_column:
+            manifest = {'time_column': time_column, 'days': {}}
+
+        for date, part in groups:
+            part_dir = os.path.join(self.path(dataset), f"{PARTITION_COLUMN}={date}")
+            os.makedirs(part_dir, exist_ok=True)
+            part.to_parquet(os.path.join(part_dir, "part-0.parquet"), index=False)
+            if time_column is not None and len(part):
+                times = pd.to_datetime(part[time_column])
+                manifest['days'][date] = {'min': times.min().isoformat(), 'max': times.max().isoformat(),
+                                          'rows': len(part)}
+
+        if time_column is not None:
+            _save_json(self.manifest_path(dataset), manifest)
+
+    def time_range(self, dataset, time_column, names=None):
+        """
+        Returns (min, max, rows) of time_column from the partition manifest, without reading the data.
+        Zwraca (min, max, liczba wierszy) kolumny time_column z manifestu partycji, bez czytania danych.
+        """
+        if not self.exists(dataset) and CSVStorage().exists(dataset):
+            return CSVStorage().time_range(dataset, time_column, names)
+
+        manifest = _load_json(self.manifest_path(dataset))
+        if manifest is None or manifest.get('time_column') != time_column:
+            # Build the manifest once from the time column only
+            # Zbuduj manifest jednorazowo tylko z kolumny czasu
+            times = self.read(dataset, columns=[time_column])[time_column]
+            days = times.dt.strftime("%Y-%m-%d")
+            manifest = {'time_column': time_column, 'days': {
+                date: {'min': t.min().isoformat(), 'max': t.max().isoformat(), 'rows': len(t)}
+                for date, t in times.groupby(days)
+            }}
+            _save_json(self.manifest_path(dataset), manifest)
+        return _manifest_range(manifest)
+
+    def replace_from(self, df, dataset, time_column, start):
+        """
+        Replaces all rows with time_column >= start by df (used for incremental appends).
+        Zastępuje wszystkie wiersze z time_column >= start przez df (używane przy dopisywaniu przyrostowym).
+        """
+        start = pd.Timestamp(start)
+        if self.exists(dataset):
+            first_day = self.read(dataset, time_column, start=start.normalize(), end=start)
+            df = pd.concat([first_day[first_day[time_column] < start], df], ignore_index=True)
+        self.write_partitions(df, dataset, time_column)
+
+    def export_csv(self, dataset, csv_file):
+        # Keep CSV output available for compatibility with other tools
+        # Zachowaj możliwość zapisu CSV dla zgodności z innymi narzędziami
+        self.read(dataset).to_csv(csv_file, index=False)
+
+
+def get_storage(backend=None):
+    """
+    Returns storage backend chosen by argument or STORAGE_BACKEND env variable (csv / parquet).
+    Zwraca backend magazynu wybrany argumentem lub zmienną środowiskową STORAGE_BACKEND (csv / parquet).
+    """
+    backend = backend or os.getenv("STORAGE_BACKEND", "csv")
+    if backend == "csv":
+        return CSVStorage()
+    if backend == "parquet":
+        return ParquetStorage()
+    raise ValueError(f" Unknown storage backend: {backend} (use csv or parquet)")
+
+
+def dataset_name(file_path):
+    # Dataset name is the file path without extension
+    # Nazwa zbioru danych to ścieżka pliku bez rozszerzenia
+    return os.path.splitext(file_path)[0]
+
+
+def read_raw_mqtt(file_path):
+    """
+    Loads raw MQTT records (timestamp, topic, value) from headerless CSV or a migrated Parquet dataset.
+    Wczytuje surowe rekordy MQTT (timestamp, topic, value) z CSV bez nagłówka lub ze zmigrowanego zbioru Parquet.
+    """
+    if file_path.endswith(".parquet"):
+        return ParquetStorage().read(dataset_name(file_path), time_column='timestamp')
+    return pd.read_csv(file_path, header=None, names=['timestamp', 'topic', 'value'])
+
+
+def _to_datetime(values):
+    try:
+        return pd.to_datetime(values)
+    except ValueError:
+        # Mixed UTC offsets (e.g. summer/winter time) - convert to UTC
+        # Mieszane przesunięcia UTC (np. czas letni/zimowy) - konwertuj do UTC
+        return pd.to_datetime(values, format="mixed", utc=True)
+
+
+def _load_json(path):
+    if not os.path.isfile(path):
+        return None
+    with open(path, encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_json(path, data):
+    tmp_file = path + ".tmp"
+    with open(tmp_file, "w", encoding="utf-8") as f:
+        json.dump(data, f, indent=2)
+    os.replace(tmp_file, path)
+
+
+def _head_crc(path, size=4096):
+    # Fingerprint of the beginning of the file - changes when the file is rewritten, not when appended
+    # Odcisk początku pliku - zmienia się przy nadpisaniu pliku, a nie przy dopisywaniu
+    with open(path, "rb") as f:
+        return zlib.crc32(f.read(size))
+
+
+def _tail_crc(path, end, size=4096):
+    # Fingerprint of the last bytes before `end` - unchanged by appends after `end`
+    # Odcisk ostatnich bajtów przed `end` - nie zmienia się przy dopisywaniu za `end`
+    with open(path, "rb") as f:
+        f.seek(max(0, end - size))
+        return zlib.crc32(f.read(end - max(0, end - size)))
+
+
+def _stamp_manifest(path, manifest):
+    # File state the manifest describes: modification time and the end of the indexed part
+    # Stan pliku opisany przez manifest: czas modyfikacji i koniec zindeksowanej części
+    manifest['mtime_ns'] = os.stat(path).st_mtime_ns
+    manifest['tail_crc'] = _tail_crc(path, manifest['size'])
+
+
+def _scan_csv(path, time_column, names=None, manifest=None):
+    """
+    Builds (or extends with appended lines) the per-day time index of a CSV file.
+    Buduje (lub rozszerza o dopisane linie) dzienny indeks czasu pliku CSV.
+    """
+    if manifest is None:
+        manifest = {'time_column': time_column, 'columns': names, 'header': names is None,
+                    'size': 0, 'sorted': True, 'days': {}}
+
+    with open(path, "rb") as f:
+        f.seek(manifest['size'])
+        data = f.read()
+    data = data[:data.rfind(b"\n") + 1]
+    offset = manifest['size']
+
+    if manifest['size'] == 0 and manifest['header']:
+        header_length = data.index(b"\n") + 1
+        manifest['columns'] = pd.read_csv(io.BytesIO(data[:header_length])).columns.tolist()
+        data = data[header_length:]
+        offset = header_length
+    manifest['head_crc'] = _head_crc(path)
+    manifest['size'] = offset + len(data)
+    _stamp_manifest(path, manifest)
+    if not data:
+        return manifest
+
+    # Byte offsets of lines, aligned with parsed rows (blank lines are kept as NaN rows)
+    # Offsety bajtowe linii, zgodne z wczytanymi wierszami (puste linie zostają jako wiersze NaN)
+    line_lengths = np.array([len(line) for line in data.splitlines(keepends=True)])
+    line_starts = offset + np.concatenate([[0], np.cumsum(line_lengths)[:-1]])
+    times = pd.read_csv(io.BytesIO(data), header=None, names=manifest['columns'], usecols=[time_column],
+                        skip_blank_lines=False)[time_column]
+    times = _to_datetime(times)
+    valid = times.notna().to_numpy()
+    times, line_starts, line_ends = times[valid], line_starts[valid], (line_starts + line_lengths)[valid]
+    if times.empty:
+        return manifest
+
+    # Byte ranges per day are only meaningful if the file is sorted by time
+    # Zakresy bajtów dla dni mają sens tylko, jeśli plik jest posortowany po czasie
+    last_max = _manifest_range(manifest)[1] if manifest['days'] else None
+    manifest['sorted'] = bool(manifest['sorted'] and times.is_monotonic_increasing and
+                              (last_max is None or times.iloc[0] >= last_max))
+
+    days = times.dt.strftime("%Y-%m-%d").to_numpy()
+    for date in pd.unique(days):
+        mask = days == date
+        day_times = times[mask]
+        entry = {'start': int(line_starts[mask][0]), 'end': int(line_ends[mask][-1]),
+                 'min': day_times.min().isoformat(), 'max': day_times.max().isoformat(),
+                 'rows': int(mask.sum())}
+        previous = manifest['days'].get(date)
+        if previous is not None:
+            entry = {'start': min(previous['start'], entry['start']), 'end': max(previous['end'], entry['end']),
+                     'min': min(pd.Timestamp(previous['min']), day_times.min()).isoformat(),
+                     'max': max(pd.Timestamp(previous['max']), day_times.max()).isoformat(),
+                     'rows': previous['rows'] + entry['rows']}
+        manifest['days'][date] = entry
+    return manifest
+
+
+def _manifest_range(manifest):
+    days = manifest['days'].values()
+    if not days:
+        return None, None, 0
+    return (min(pd.Timestamp(d['min']) for d in days),
+            max(pd.Timestamp(d['max']) for d in days),
+            sum(d['rows'] for d in days))
+
+
+def _select_days(manifest, start, end):
+    """
+    Returns the byte range covering days between start and end (with one day of margin), or None if unknown.
+    Zwraca zakres bajtów obejmujący dni od start do end (z zapasem jednego dnia) lub None, jeśli nieznany.
+    """
+    if not manifest['sorted']:
+        return None
+    days = [d for d in manifest['days']
+            if (start is None or d >= (pd.Timestamp(start) - pd.Timedelta(days=1)).strftime("%Y-%m-%d")) and
+               (end is None or d <= (pd.Timestamp(end) + pd.Timedelta(days=1)).strftime("%Y-%m-%d"))]
+    if not days:
+        return (0, 0)
+    return (min(manifest['days'][d]['start'] for d in days), max(manifest['days'][d]['end'] for d in days))
+
+
+def _filter_time_range(df, time_column, start, end):
+    if start is not None:
+        df = df[df[time_column] >= pd.Timestamp(start)]
+    if end is not None:
+        df = df[df[time_column] <= pd.Timestamp(end)]
+    return df
+
+
+def _downcast_floats(df):
+    float_cols = [c for c in df.columns if df[c].dtype == "float64" and c not in FLOAT64_COLUMNS]
+    return df.astype({c: "float32" for c in float_cols})
+
+
+def migrate(directories=("data", "predictions", "outputs")):
+    """
+    Converts existing CSV files in data/, predictions/ and outputs/ to partitioned Parquet datasets.
+    Raw MQTT files (mqtt_data*.csv) are skipped: the collector keeps appending to them and the cleaner,
+    incremental ingest and nowcast replay read them directly, so a Parquet copy would never be used.
+    Konwertuje istniejące pliki CSV z data/, predictions/ i outputs/ do partycjonowanych zbiorów Parquet.
+    Surowe pliki MQTT (mqtt_data*.csv) są pomijane: kolektor stale do nich dopisuje, a cleaner, wczytywanie
+    przyrostowe i odtwarzanie nowcastu czytają je bezpośrednio, więc kopia Parquet nie byłaby używana.
+    """
+    storage = ParquetStorage()
+    for directory in directories:
+        for csv_file in sorted(glob.glob(os.path.join(BASE_DIR, directory, "*.csv"))):
+            dataset = dataset_name(csv_file)
+
+            if os.path.basename(csv_file).startswith("mqtt_data"):
+                print(f" Skipped raw MQTT file {csv_file} (stays CSV)")
+                continue
+            df = pd.read_csv(csv_file)
+
+            time_column = next((c for c in TIME_COLUMNS if c in df.columns), None)
+            if time_column is not None:
+                try:
+                    df[time_column] = pd.to_datetime(df[time_column], format="mixed")
+                except ValueError:
+                    # Mixed UTC offsets (e.g. summer/winter time) - store as UTC
+                    # Mieszane przesunięcia UTC (np. czas letni/zimowy) - zapisz jako UTC
+                    df[time_column] = pd.to_datetime(df[time_column], format="mixed", utc=True)
+
+            storage.write(df, dataset, time_column)
+            print(f" Migrated {csv_file} -> {storage.path(dataset)} ({len(df)} records)")
+
+
+if __name__ == "__main__":
+    # Usage / Użycie:
+    #   python storage.py migrate                       - convert data/, predictions/, outputs/ CSV files
+    #   python storage.py export <dataset.parquet> <file.csv> - export a Parquet dataset to CSV
+    command = sys.argv[1] if len(sys.argv) > 1 else "migrate"
+    if command == "migrate":
+        migrate()
+    elif command == "export" and len(sys.argv) == 4:
+        ParquetStorage().export_csv(dataset_name(sys.argv[2]), sys.argv[3])
+        print(f" Exported {sys.argv[2]} -> {sys.argv[3]}")
+    else:
+        print(" Usage: python storage.py migrate | export <dataset.parquet> <file.csv>")
+        sys.exit(1)
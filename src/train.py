@@ -1,8 +1,27 @@
 from data_merger import DataMerger
 from model_trainer import ModelTrainer
 import pandas as pd
+import argparse
 
 def main():
+    parser = argparse.ArgumentParser(description="Train the PV model / Trenowanie modelu PV")
+    parser.add_argument("--search", action="store_true",
+                        help="hyperparameter search with time-series CV before training / przeszukiwanie hiperparametrów")
+    parser.add_argument("--trials", type=int, help="random search: number of trials sampled from the grid")
+    parser.add_argument("--folds", type=int, default=5, help="time-series CV folds")
+    parser.add_argument("--workers", type=int, help="parallel trial processes (default: CPU count)")
+    parser.add_argument("--engine", choices=["keras", "hgb", "linear"], default="keras",
+                        help="model engine to train / silnik modelu (see model_engines.py)")
+    parser.add_argument("--compare-engines", action="store_true",
+                        help="report fit time, latency and MAE/RMSE/R² of all engines (no model saved)")
+    parser.add_argument("--warm-start", action="store_true",
+                        help="fine-tune the existing model on data added since the last training / douczanie")
+    parser.add_argument("--fast", action="store_true",
+                        help="fast training: large batches, tf.data pipeline, LR schedule / szybki trening")
+    parser.add_argument("--compare-fast", action="store_true",
+                        help="compare standard and fast training on the same split (no model saved)")
+    args = parser.parse_args()
+
     print(" Starting training...")  # Start treningu...
 
     #  Merge historical data from inverter output and Solcast history
@@ -17,7 +36,21 @@ def main():
     #  Train the model with prepared training data
     #  Trenowanie modelu na przygotowanych danych
     trainer = ModelTrainer(training_data)
-    trainer.train()
+    if args.compare_engines:
+        trainer.compare_engines()
+        return
+    if args.compare_fast:
+        trainer.compare_fast()
+        return
+    if args.search:
+        # Search, then train and save the winner / Przeszukaj, potem wytrenuj i zapisz najlepszy model
+        trainer.search(n_trials=args.trials, n_splits=args.folds, workers=args.workers)
+    elif args.warm_start:
+        trainer.retrain()
+    elif args.engine != "keras":
+        trainer.train_engine(args.engine)
+    else:
+        trainer.train(fast=args.fast or None)
 
     print(" Training completed successfully.")  # Trening zakończony pomyślnie.
 
@@ -1,5 +1,6 @@
 import pandas as pd
 import sys
+from storage import get_storage, dataset_name
 
 def check_data_ranges(inverter_file, solcast_file):
     """
@@ -7,16 +8,17 @@ def check_data_ranges(inverter_file, solcast_file):
     Sprawdź, czy zakresy dat w danych z falownika i Solcast się pokrywają.
     """
     try:
-        df_inverter = pd.read_csv(inverter_file)
-        df_solcast = pd.read_csv(solcast_file)
-
-        # Convert timestamps to datetime
-        # Konwersja kolumn czasowych na datetime
-        df_inverter['timestamp'] = pd.to_datetime(df_inverter['timestamp'])
-        df_solcast['period_end'] = pd.to_datetime(df_solcast['period_end'])
-
-        min_inv, max_inv = df_inverter['timestamp'].min(), df_inverter['timestamp'].max()
-        min_sol, max_sol = df_solcast['period_end'].min(), df_solcast['period_end'].max()
+        # Read min/max timestamps from the time index instead of loading the files
+        # Odczytaj min/max czasu z indeksu czasu zamiast wczytywać pliki
+        storage = get_storage()
+        min_inv, max_inv, _ = storage.time_range(dataset_name(inverter_file), 'timestamp')
+        min_sol, max_sol, _ = storage.time_range(dataset_name(solcast_file), 'period_end')
+
+        # Inverter timestamps are local time, Solcast timestamps are UTC
+        # Czas falownika jest lokalny, czas Solcast jest w UTC
+        if min_inv.tzinfo is None:
+            min_inv = min_inv.tz_localize('Europe/Warsaw')
+            max_inv = max_inv.tz_localize('Europe/Warsaw')
 
         print("\n===========================")
         print(" CHECKING DATA RANGES")
@@ -1,89 +1,141 @@
 import pandas as pd
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.backends.backend_pdf import PdfPages
 from datetime import datetime
+from instrumentation import instrumented
+
+# matplotlib is imported inside save_days - it is slow to import and only needed for plotting
+# matplotlib jest importowany w save_days - wolno się importuje i jest potrzebny tylko do wykresów
+
+
+def hourly_sums(times, power):
+    """
+    Hourly bars: for every full hour H of the data, the sum of the first 4 values in (H-30 min, H+30 min];
+    hours with fewer than 4 values are skipped. All windows are found at once with searchsorted on the
+    sorted times, so the cost is O(rows + hours) instead of one mask over the day per hour.
+    Słupki godzinowe: dla każdej pełnej godziny H suma pierwszych 4 wartości w (H-30 min, H+30 min];
+    godziny z mniej niż 4 wartościami są pomijane. Wszystkie okna są wyznaczane naraz przez searchsorted
+    na posortowanych czasach, więc koszt to O(wiersze + godziny) zamiast maski dnia dla każdej godziny.
+    """
+    times = pd.DatetimeIndex(times)
+    if len(times) == 0:
+        return pd.DataFrame(columns=['period_end', 'power_1h_sum_kW'])
+    hours = pd.date_range(start=times.min().ceil('h'), end=times.max().floor('h'), freq='1h')
+    half_hour = pd.Timedelta(minutes=30)
+
+    first = times.searchsorted(hours - half_hour, side='right')
+    last = times.searchsorted(hours + half_hour, side='right')
+    # nancumsum: a missing value counts as 0, like pandas sum, instead of spoiling every later hour
+    # nancumsum: brakująca wartość liczy się jako 0, jak w sumie pandas, zamiast psuć wszystkie kolejne godziny
+    cumulative = np.concatenate([[0.0], np.nancumsum(np.asarray(power, dtype=float))])
+    sums = cumulative[np.minimum(first + 4, last)] - cumulative[first]
+
+    full = last - first >= 4
+    return pd.DataFrame({'period_end': hours[full], 'power_1h_sum_kW': sums[full]})
+
 
 class Visualizer:
-    def __init__(self):
-        pass
+    def __init__(self, timezone='Europe/Warsaw'):
+        self.timezone = timezone
 
     def save_best_day(self, df, output_file):
         """
         Creates a plot for the day with the most data points and saves it as a PDF.
         Tworzy wykres dla dnia z największą liczbą danych i zapisuje go jako PDF.
         """
+        self.save_days(df, output_file, days="best")
 
-        df['period_end'] = pd.to_datetime(df['period_end'], utc=True).dt.tz_convert('Europe/Warsaw')
-        df['date'] = df['period_end'].dt.date
-        counts = df['date'].value_counts().sort_index()
-
-        if counts.empty:
+    @instrumented("plot")
+    def save_days(self, df, output_file, days="all", group_column=None):
+        """
+        Saves one PDF page per forecast day (days="all") or only the day with the most data points
+        (days="best"); with group_column (e.g. site_id) this is done for every group, so many sites
+        go to one multi-page PDF. One figure is reused for all pages.
+        Zapisuje jedną stronę PDF na każdy dzień prognozy (days="all") albo tylko dzień z największą
+        liczbą danych (days="best"); z group_column (np. site_id) dla każdej grupy, więc wiele instalacji
+        trafia do jednego wielostronicowego PDF. Jedna figura jest używana dla wszystkich stron.
+        """
+        # No pyplot: its global figure state is not thread-safe and save_days also runs in the
+        # scheduler's worker threads, so the figure gets its own Agg canvas
+        # Bez pyplot: jego globalny stan figur nie jest bezpieczny wątkowo, a save_days działa też
+        # w wątkach harmonogramu, więc figura dostaje własne płótno Agg
+        from matplotlib.figure import Figure
+        from matplotlib.backends.backend_agg import FigureCanvasAgg
+        from matplotlib.backends.backend_pdf import PdfPages
+
+        # Only the needed columns are copied - the caller's DataFrame is not modified
+        # Kopiowane są tylko potrzebne kolumny - DataFrame wywołującego nie jest modyfikowany
+        data = pd.DataFrame({
+            'period_end': pd.to_datetime(df['period_end'], utc=True).dt.tz_convert(self.timezone),
+            'power': df['energy_15min_pred_kWh'].to_numpy(),
+            'group': df[group_column].to_numpy() if group_column else '',
+        }).sort_values(['group', 'period_end'], kind='stable')
+        data['date'] = data['period_end'].dt.date
+
+        if data.empty:
             print(" No data available to plot.")
             return
 
-        best_date = counts.idxmax()
-        print(f" Plotting data for day: {best_date} (records: {counts.max()})")
-
-        start = pd.Timestamp(str(best_date) + ' 00:00').tz_localize('Europe/Warsaw')
-        end = start + pd.Timedelta(days=1)
-        df_day = df[(df['period_end'] >= start) & (df['period_end'] < end)].copy()
-
-        if df_day.empty:
-            print(" No data for the selected day.")
-            return
-
-        df_day['current_power_kW'] = df_day['energy_15min_pred_kWh']
-
-        hours = pd.date_range(
-            start=df_day['period_end'].min().ceil('h'),
-            end=df_day['period_end'].max().floor('h'),
-            freq='1h'
-        )
-
-        results = []
-        for hour in hours:
-            mask = (df_day['period_end'] > hour - pd.Timedelta(minutes=30)) & \
-                   (df_day['period_end'] <= hour + pd.Timedelta(minutes=30))
-            fragment = df_day.loc[mask].sort_values('period_end')
-            if len(fragment) >= 4:
-                power_sum = fragment['current_power_kW'].iloc[:4].sum()
-                results.append({'period_end': hour, 'power_1h_sum_kW': power_sum})
-
-        df_hourly = pd.DataFrame(results)
-        total_energy = df_day['energy_15min_pred_kWh'].sum()
+        pages = data.groupby(['group', 'date'], sort=True).size()
+        if days == "best":
+            pages = pages.loc[pages.groupby(level='group').idxmax()]
+        # Row ranges of each (group, day) in the sorted data / Zakresy wierszy każdej pary (grupa, dzień)
+        offsets = data.groupby(['group', 'date'], sort=True).indices
+
+        # The figure, axes and line are created once and only their data changes per page -
+        # clearing the axes would rebuild ticks and texts, which dominates the rendering time
+        # Figura, osie i linia są tworzone raz i na każdej stronie zmieniają się tylko dane -
+        # czyszczenie osi odbudowuje podziałki i teksty, co dominuje czas renderowania
+        fig = Figure(figsize=(12, 6))
+        FigureCanvasAgg(fig)
+        ax = fig.subplots()
+        ax.set_xlabel('Time')
+        ax.set_ylabel('Power [kW]')
+        ax.grid(True)
+        ax.tick_params(axis='x', labelrotation=45)
+        # Fixed margins instead of tight_layout, which makes every following savefig slower
+        # Stałe marginesy zamiast tight_layout, który spowalnia każde kolejne savefig
+        fig.subplots_adjust(left=0.06, right=0.98, top=0.94, bottom=0.2)  # zostaw miejsce pod tekst
+        total_text = fig.text(0.5, 0.01, "", ha="center", fontsize=12)
+        line, bars = None, None
 
         with PdfPages(output_file) as pdf:
-            plt.figure(figsize=(12, 6))
-
-            plt.plot(df_day['period_end'], df_day['current_power_kW'],
-                     marker='o', linestyle='-', label='Every 15 minutes')
-
-            if not df_hourly.empty:
-                plt.bar(df_hourly['period_end'], df_hourly['power_1h_sum_kW'],
-                        width=0.03, alpha=0.6, label='Sum 1h (4×)')
-            else:
-                print(" No data for hourly bars.")
-
-            plt.title(f'Production PV – {best_date}')
-            plt.xlabel('Time')
-            plt.ylabel('Power [kW]')
-            plt.legend()
-            plt.grid(True)
-            plt.xticks(rotation=45)
-
-            # Dodaj tekst sumy produkcji pod wykresem:
-            plt.figtext(0.5, 0.01, f"Total predicted energy: {total_energy:.2f} kWh", ha="center", fontsize=12)
-
-            plt.tight_layout(rect=[0, 0.03, 1, 1])  # zostaw miejsce pod tekst
-
-            pdf.savefig()
-            plt.close()
-
-        print(f" Total predicted energy on {best_date}: {total_energy:.2f} kWh")
-        if not df_hourly.empty:
-            max_power = df_hourly['power_1h_sum_kW'].max()
-            print(f" Max 1h power sum: {max_power:.2f} kW")
-        else:
-            print(" No hourly sums calculated.")
-
+            for (group, date), count in pages.items():
+                df_day = data.iloc[offsets[(group, date)]]
+                df_hourly = hourly_sums(df_day['period_end'], df_day['power'])
+                total_energy = df_day['power'].sum()
+                if days == "best":
+                    print(f" Plotting data for day: {date} (records: {count})")
+
+                if line is None:
+                    line, = ax.plot(df_day['period_end'], df_day['power'],
+                                    marker='o', linestyle='-', label='Every 15 minutes')
+                else:
+                    line.set_data(df_day['period_end'], df_day['power'])
+                if bars is not None:
+                    bars.remove()
+                    bars = None
+                if not df_hourly.empty:
+                    bars = ax.bar(df_hourly['period_end'], df_hourly['power_1h_sum_kW'],
+                                  width=0.03, alpha=0.6, color='C1', label='Sum 1h (4×)')
+                elif days == "best":
+                    print(" No data for hourly bars.")
+                ax.relim()
+                ax.autoscale_view()
+                ax.legend(handles=[line] + ([bars] if bars is not None else []))
+                ax.set_title(f'Production PV – {f"{group} – " if group != "" else ""}{date}')
+
+                # Dodaj tekst sumy produkcji pod wykresem:
+                total_text.set_text(f"Total predicted energy: {total_energy:.2f} kWh")
+
+                pdf.savefig(fig)
+
+                if days == "best":
+                    print(f" Total predicted energy on {date}: {total_energy:.2f} kWh")
+                    if not df_hourly.empty:
+                        max_power = df_hourly['power_1h_sum_kW'].max()
+                        print(f" Max 1h power sum: {max_power:.2f} kW")
+                    else:
+                        print(" No hourly sums calculated.")
+
+        if days != "best":
+            print(f" Saved {len(pages)} pages to {output_file}")  # Zapisano strony do pliku PDF